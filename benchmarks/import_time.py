@@ -0,0 +1,48 @@
+"""
+Import time of kopimiko in a fresh interpreter, compared with netmiko.
+
+    python benchmarks/import_time.py [-n RUNS]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY = ('netmiko', 'paramiko', 'cryptography')
+
+PROBE = f"""
+import sys
+import {{module}}
+print(','.join(m for m in {HEAVY!r} if m in sys.modules))
+"""
+
+
+def measure(module: str, runs: int) -> tuple[float, str]:
+    timings, loaded = [], ''
+    for _ in range(runs):
+        start = time.perf_counter()
+        loaded = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module)],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    baseline, _ = measure('sys', args.runs)
+    for module in ('kopimiko', 'netmiko'):
+        elapsed, loaded = measure(module, args.runs)
+        print(
+            f"{module:10} {(elapsed - baseline) * 1000:8.1f} ms "
+            f"(heavy modules loaded: {loaded or 'none'})"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Per call overhead of obfuscated logging with many threads: each call enters
+logfuscated and logs one message to a sink discarding it.
+
+    python benchmarks/log_obfuscation.py [-t THREADS] [-n CALLS]
+"""
+import argparse
+import threading
+import time
+
+from loguru import logger
+
+from kopimiko.utils.logs import logfuscated, secret_keeper
+
+
+def log_call(n: int):
+    logger.info(f"cmd 10.0.0.{n % 256} show running-config -> Sup3r-S3cret-Pa55")
+
+
+def run(func, threads: int, calls: int) -> float:
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for n in range(calls):
+            func(n)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.join()
+    return (time.perf_counter() - start) / (threads * calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-t', '--threads', type=int, default=64)
+    parser.add_argument('-n', '--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(lambda message: None, level='INFO')
+    secret_keeper.add_secret('Sup3r-S3cret-Pa55')
+    for name, func in (('plain', log_call), ('logfuscated', logfuscated(log_call))):
+        per_call = run(func, args.threads, args.calls)
+        print(f"{name:12} {per_call * 1e6:8.2f} us/call ({args.threads} threads)")
+
+
+if __name__ == '__main__':
+    main()
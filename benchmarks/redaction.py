@@ -0,0 +1,80 @@
+"""
+Throughput of storing a configuration with the redaction stage, compared
+with a plain copy and with the hard link of runner.store_file.
+
+    python benchmarks/redaction.py [-l LINES] [-n RUNS]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from kopimiko.platforms._cisco_base import redactor
+from kopimiko.runner import store_file
+
+# an interface block, with a secret every few blocks
+BLOCK = """interface GigabitEthernet0/0/{n}
+ description uplink {n}
+ ip address 10.{a}.{b}.1 255.255.255.0
+ ip ospf message-digest-key 1 md5 7 0822455D0A16
+ no shutdown
+!
+"""
+SECRETS = """username admin{n} privilege 15 secret 9 $9$abcdefghijklmnop
+snmp-server community public{n} RO
+"""
+
+
+def make_config(path: str, lines: int):
+    written = 0
+    with open(path, 'w') as f:
+        n = 0
+        while written < lines:
+            text = BLOCK.format(n=n, a=n // 256 % 256, b=n % 256)
+            if n % 10 == 0:
+                text += SECRETS.format(n=n)
+            f.write(text)
+            written += text.count('\n')
+            n += 1
+
+
+def measure(func, runs: int, target: str) -> float:
+    timings = []
+    for _ in range(runs):
+        # the previous run may have linked target to the source
+        if os.path.exists(target):
+            os.unlink(target)
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-l', '--lines', type=int, default=500_000)
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'retrieved')
+        target = os.path.join(tmp, 'r1.cfg')
+        make_config(source, args.lines)
+        size = os.path.getsize(source) / 2**20
+        print(f"{args.lines} lines, {size:.1f} MiB")
+        for name, store in (
+                ('copy', lambda: shutil.copyfile(source, target)),
+                ('link', lambda: store_file(source, target, link=True)),
+                ('redacted', lambda: store_file(source, target, redactor)),
+        ):
+            elapsed = measure(store, args.runs, target)
+            print(
+                f"{name:10} {elapsed * 1000:8.1f} ms "
+                f"{size / elapsed:8.1f} MiB/s"
+            )
+
+
+if __name__ == '__main__':
+    main()
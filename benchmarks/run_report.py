@@ -0,0 +1,77 @@
+"""
+Memory and aggregation time of the results of a large run, kept as
+BackupResult instances or in a RunReport.
+
+    python benchmarks/run_report.py [-d DEVICES]
+"""
+import argparse
+import math
+import time
+import tracemalloc
+from collections import defaultdict
+
+from kopimiko.report import RunReport
+from kopimiko.runner import BackupResult
+
+PLATFORMS = ('cisco_ios', 'cisco_xr', 'juniper_junos', 'aruba_os')
+METHODS = ('scp', 'sftp', 'scrape', 'pull_transfer')
+
+
+def make_results(devices: int):
+    for n in range(devices):
+        ok = n % 50 != 0
+        yield BackupResult(
+            host=f"10.{n // 65536}.{n // 256 % 256}.{n % 256}",
+            platform=PLATFORMS[n % len(PLATFORMS)],
+            ok=ok,
+            method=METHODS[n % len(METHODS)] if ok else None,
+            size=20_000 + n % 5000,
+            duration=(n % 997) / 10,
+            error=None if ok else 'ReadTimeout: Pattern not detected',
+        )
+
+
+def p95_of_results(results: list[BackupResult]) -> dict:
+    durations = defaultdict(list)
+    for result in results:
+        durations[result.method].append(result.duration)
+    return {
+        method: sorted(values)[max(math.ceil(0.95 * len(values)), 1) - 1]
+        for method, values in durations.items()
+    }
+
+
+def measure(build, aggregate, devices: int) -> tuple[float, float]:
+    tracemalloc.start()
+    kept = build(make_results(devices))
+    memory = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    start = time.perf_counter()
+    aggregate(kept)
+    return memory, time.perf_counter() - start
+
+
+def build_report(results) -> RunReport:
+    report = RunReport()
+    for result in results:
+        report.add(result)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-d', '--devices', type=int, default=100_000)
+    args = parser.parse_args()
+
+    for name, build, aggregate in (
+            ('results', list, p95_of_results),
+            ('report', build_report, lambda r: r.percentile(95, by='method')),
+    ):
+        memory, elapsed = measure(build, aggregate, args.devices)
+        print(
+            f"{name:8} {memory:8.1f} MiB  p95 per method "
+            f"{elapsed * 1000:8.1f} ms ({args.devices} devices)")
+
+
+if __name__ == '__main__':
+    main()
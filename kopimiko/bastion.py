@@ -0,0 +1,157 @@
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    import paramiko
+
+BastionKey = tuple[str, int, Optional[str]]
+
+
+class BastionError(Exception):
+    pass
+
+
+@dataclass
+class Bastion:
+    host: str
+    port: int = 22
+    username: Optional[str] = None
+    password: Optional[str] = field(default=None, repr=False)
+    key_filename: Optional[str] = None
+    max_channels: int = 10
+    channel_timeout: Optional[float] = 60.0
+    strict_host_key: bool = False
+
+    def __post_init__(self):
+        self.port = int(self.port)
+        self.max_channels = int(self.max_channels)
+
+    @property
+    def key(self) -> BastionKey:
+        return self.host, self.port, self.username
+
+    @classmethod
+    def from_spec(cls, spec: Union[str, dict[str, Any]]) -> 'Bastion':
+        """ Bastion from a `[user@]host[:port]` string or a dict of fields """
+        if isinstance(spec, dict):
+            return cls(**spec)
+        username, _, address = spec.rpartition('@')
+        host, _, port = address.partition(':')
+        return cls(host=host, port=int(port or 22), username=username or None)
+
+
+class PooledChannel:
+    """
+    Channel to a device over a bastion transport, used by netmiko as its
+    socket; closing it gives the channel slot back to the bastion.
+    """
+    def __init__(self, channel: 'paramiko.Channel', release):
+        self._channel = channel
+        self._release = release
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+    def close(self):
+        try:
+            self._channel.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _Connection:
+    def __init__(self, bastion: Bastion):
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(bastion.max_channels)
+        self.client: Optional['paramiko.SSHClient'] = None
+
+    def transport(self, bastion: Bastion) -> 'paramiko.Transport':
+        with self.lock:
+            transport = self.client and self.client.get_transport()
+            if transport is None or not transport.is_active():
+                self.client = self._connect(bastion)
+                transport = self.client.get_transport()
+            return transport
+
+    @staticmethod
+    def _connect(bastion: Bastion) -> 'paramiko.SSHClient':
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.load_system_host_keys()
+        if not bastion.strict_host_key:
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            bastion.host,
+            port=bastion.port,
+            username=bastion.username,
+            password=bastion.password,
+            key_filename=bastion.key_filename,
+            look_for_keys=bastion.password is None,
+            allow_agent=bastion.password is None,
+        )
+        client.get_transport().set_keepalive(30)
+        logger.info(f"connected to bastion {bastion.host}:{bastion.port}")
+        return client
+
+    def close(self):
+        with self.lock:
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+
+
+class BastionPool:
+    """
+    One authenticated SSH transport per bastion, shared by the device
+    sessions opened as `direct-tcpip` channels over it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections: dict[BastionKey, _Connection] = {}
+
+    def _connection(self, bastion: Bastion) -> _Connection:
+        with self._lock:
+            connection = self._connections.get(bastion.key)
+            if connection is None:
+                connection = self._connections[bastion.key] = _Connection(
+                    bastion)
+            return connection
+
+    def open_channel(
+            self,
+            bastion: Bastion,
+            host: str,
+            port: int = 22
+    ) -> PooledChannel:
+        """
+        Open a channel to host:port through the bastion, waiting for a free
+        slot when the bastion already carries max_channels sessions.
+        """
+        connection = self._connection(bastion)
+        if not connection.slots.acquire(timeout=bastion.channel_timeout):
+            raise BastionError(f"no free channel on bastion {bastion.host}")
+        try:
+            transport = connection.transport(bastion)
+            channel = transport.open_channel(
+                'direct-tcpip', (host, int(port)), ('127.0.0.1', 0),
+                timeout=bastion.channel_timeout,
+            )
+        except Exception:
+            connection.slots.release()
+            raise
+        return PooledChannel(channel, connection.slots.release)
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for connection in connections.values():
+            connection.close()
+
+
+bastion_pool = BastionPool()
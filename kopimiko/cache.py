@@ -0,0 +1,56 @@
+import json
+import os
+import threading
+from collections.abc import MutableMapping
+from typing import Any, Iterator, Union
+
+from loguru import logger
+
+
+class JsonCache(MutableMapping):
+    """
+    Thread-safe dict kept in a JSON file between runs, written on save().
+    """
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+        self._lock = threading.Lock()
+        self._data: dict[str, Any] = {}
+        self.dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"ignoring unreadable cache {self.path}: {e}")
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __setitem__(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self.dirty = True
+
+    def __delitem__(self, key: str):
+        with self._lock:
+            del self._data[key]
+            self.dirty = True
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            partial_file = f"{self.path}.part"
+            with open(partial_file, 'w') as f:
+                json.dump(self._data, f)
+            os.replace(partial_file, self.path)
+            self.dirty = False
@@ -0,0 +1,440 @@
+"""
+Back up the configuration of every device of an inventory.
+
+Exit status: 0 all devices backed up, 1 some devices failed,
+2 usage or inventory error, 3 all devices failed, 130 interrupted.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Sequence, TextIO
+
+from loguru import logger
+
+from .bastion import bastion_pool
+from .cache import JsonCache
+from .file_transfer import (
+    DestinationLayout, PooledTransferSpec, ProtoTransferParam,
+    TransferDestination
+)
+from .inventory import InventoryError, load_groups, read_inventory
+from .journal import RunJournal
+from .preflight import PREFLIGHT_TTL, ReachabilityCache
+from .report import RunReport
+from .runner import (
+    BackupResult, backup_filename, cleanup_stale, run_backups
+)
+from .utils.logs import (
+    DEFAULT_PAYLOAD_LIMIT, AsyncSink, intercepting, logfuscator,
+    secret_keeper
+)
+
+EXIT_OK = 0
+EXIT_PARTIAL = 1
+EXIT_USAGE = 2
+EXIT_FAILED = 3
+EXIT_INTERRUPTED = 130
+
+TRANSFER_PASSWORD_ENV = 'KOPIMIKO_TRANSFER_PASSWORD'
+LOG_LEVELS = ('WARNING', 'INFO', 'DEBUG')
+MAX_LISTED_FAILURES = 20
+# log messages waiting for the log writer, less important ones are dropped
+# rather than stalling the backups when it falls behind
+LOG_QUEUE_SIZE = 10_000
+# digests of the configurations saved with --persist-if-needed, per host
+PERSIST_DIGESTS_FILE = '.persist-digests.json'
+# configuration fingerprints of the backups, per host
+FINGERPRINTS_FILE = '.fingerprints.json'
+# results of --preflight, reused by a run retried within PREFLIGHT_TTL
+REACHABILITY_FILE = '.reachability.json'
+# log messages of the failed devices, per host
+DEVICE_LOGS_DIR = '.logs'
+# --layout -> directories of the transferred files below the volumes
+LAYOUTS = {
+    'flat': None,
+    'date': dict(hash_width=0),
+    'hash': dict(date_format=''),
+    'date-hash': dict(),
+}
+
+
+class Progress:
+    def __init__(
+            self,
+            stream: TextIO,
+            interval: float = 1.0,
+            enabled: bool = True,
+    ):
+        self.stream = stream
+        self.enabled = enabled
+        self.interactive = stream.isatty()
+        self.interval = interval if self.interactive else 30 * interval
+        self.start = self.last_shown = time.monotonic()
+        self.succeeded = 0
+        self.failures: list[BackupResult] = []
+        self.methods = Counter()
+        self.changed = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.device_logs: Optional[str] = None
+
+    @property
+    def done(self) -> int:
+        return self.succeeded + len(self.failures)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def update(self, result: BackupResult):
+        if result.ok:
+            self.succeeded += 1
+            if result.unchanged:
+                self.unchanged += 1
+            else:
+                self.methods[result.method] += 1
+            if result.diff is not None and result.diff.changed:
+                self.changed += 1
+        else:
+            self.failures.append(result)
+        now = time.monotonic()
+        if self.enabled and now - self.last_shown >= self.interval:
+            self.last_shown = now
+            self.show()
+
+    def status(self) -> str:
+        rate = self.done / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{self.done} done, {self.succeeded} ok, "
+            f"{len(self.failures)} failed, {rate:.1f} devices/s"
+        )
+
+    def show(self):
+        if self.interactive:
+            self.stream.write(f"\r{self.status()}")
+        else:
+            self.stream.write(f"{self.status()}\n")
+        self.stream.flush()
+
+    def summary(self) -> str:
+        lines = [
+            f"{self.done} devices in {self.elapsed:.1f}s: "
+            f"{self.succeeded} succeeded, {len(self.failures)} failed"
+        ]
+        if self.skipped:
+            lines.append(f"{self.skipped} devices finished by earlier attempts")
+        if self.changed:
+            lines.append(f"{self.changed} configurations changed")
+        if self.unchanged:
+            lines.append(
+                f"{self.unchanged} configurations unchanged, not retrieved")
+        for method, count in self.methods.most_common():
+            lines.append(f"  {method or 'unknown'}: {count}")
+        for result in self.failures[:MAX_LISTED_FAILURES]:
+            error = (result.error or '').strip().partition('\n')[0]
+            lines.append(f"  FAILED {result.host}: {error}")
+        if len(self.failures) > MAX_LISTED_FAILURES:
+            more = len(self.failures) - MAX_LISTED_FAILURES
+            lines.append(f"  ... and {more} more failures")
+        if self.failures and self.device_logs:
+            lines.append(f"logs of the failed devices in {self.device_logs}")
+        return '\n'.join(lines)
+
+    def exit_code(self) -> int:
+        if not self.failures:
+            return EXIT_OK
+        return EXIT_PARTIAL if self.succeeded else EXIT_FAILED
+
+
+def transfer_spec(
+        transfers: Sequence[str],
+        username: Optional[str],
+) -> Optional[PooledTransferSpec]:
+    pools: dict[str, list[TransferDestination]] = {}
+    for transfer in transfers:
+        proto, sep, destination = transfer.partition('=')
+        destination, *options = destination.split(',')
+        if not sep or not destination:
+            raise ValueError(f"invalid transfer `{transfer}`")
+        dst_ip, _, dst_volume = destination.partition(':')
+        password = os.environ.get(TRANSFER_PASSWORD_ENV)
+        secret_keeper.add_secret(password)
+        param = ProtoTransferParam(
+            dst_ip=dst_ip,
+            dst_volume=dst_volume or None,
+            username=username,
+            password=password,
+        )
+        kwargs = {}
+        for option in options:
+            key, _, value = option.partition('=')
+            if key not in ('weight', 'site') or not value:
+                raise ValueError(f"invalid transfer option `{option}`")
+            kwargs[key] = value
+        try:
+            weight = float(kwargs.pop('weight', 1))
+        except ValueError:
+            raise ValueError(f"invalid transfer `{transfer}`") from None
+        if weight <= 0:
+            raise ValueError(f"invalid transfer weight in `{transfer}`")
+        pools.setdefault(proto, []).append(
+            TransferDestination(param, weight=weight, **kwargs))
+    return PooledTransferSpec(pools) if pools else None
+
+
+def write_device_log(directory: str, result: BackupResult) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = backup_filename(directory, result.host, 'log')
+    with open(path, 'w') as f:
+        f.writelines(f"{line}\n" for line in result.log)
+    return path
+
+
+def destination_layout(
+        name: str,
+        spec: Optional[PooledTransferSpec],
+) -> Optional[DestinationLayout]:
+    """
+    Layout of the run, its directories created below the local volumes of
+    the transfer destinations
+    """
+    if LAYOUTS[name] is None:
+        return None
+    layout = DestinationLayout(date=datetime.now(), **LAYOUTS[name])
+    volumes = {
+        destination.param.dst_volume
+        for pool in (spec.pools.values() if spec else ())
+        for destination in pool
+    }
+    for volume in volumes:
+        if volume and os.path.isdir(volume):
+            layout.create(volume)
+    return layout
+
+
+def artifact_names(artifacts: str) -> Optional[list[str]]:
+    if artifacts.strip() == 'all':
+        return None
+    return [name.strip() for name in artifacts.split(',') if name.strip()]
+
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog='kopimiko',
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    p.add_argument(
+        'inventory', help='CSV, JSON Lines or YAML device inventory')
+    p.add_argument(
+        '-g', '--groups',
+        help='JSON or YAML file with the defaults of each device group')
+    p.add_argument(
+        '-o', '--output-dir', default='.',
+        help='directory the backups are stored in (default: .)')
+    p.add_argument(
+        '-j', '--jobs', type=int, default=10,
+        help='number of devices backed up in parallel (default: 10)')
+    p.add_argument(
+        '-t', '--timeout', type=float, default=None,
+        help='per device connection and channel timeout in seconds')
+    p.add_argument(
+        '--deadline', type=float, default=None, metavar='SECONDS',
+        help='total time the retrieval from a device may take, transfer '
+             'methods it leaves no time for are skipped')
+    p.add_argument(
+        '--preflight', type=float, default=None, metavar='SECONDS',
+        help='probe the SSH or telnet port of every device first, at once, with '
+             'connections of SECONDS; unreachable devices fail without '
+             f'waiting for the connection timeout, for {PREFLIGHT_TTL}s '
+             'on a retry')
+    p.add_argument(
+        '--transfer', action='append', default=[],
+        metavar='PROTO=DST_IP[:DST_VOLUME][,weight=W][,site=SITE]',
+        help='destination of a transfer protocol, e.g. '
+             'scp=10.0.0.5:/srv/backups; repeated, the transfers are spread '
+             'over the destinations of the protocol, preferring those of '
+             'the site of the device; the password is read from '
+             f'${TRANSFER_PASSWORD_ENV}')
+    p.add_argument('--transfer-username', help='transfer server username')
+    p.add_argument(
+        '--layout', choices=LAYOUTS, default='flat',
+        help='directories the transferred files are spread over below the '
+             'destination volumes: by date (YYYY/MM/DD), by hash of the host '
+             '(2 hex digits) or both (default: flat)')
+    p.add_argument(
+        '--run-id',
+        help='journal the run under this id; rerunning with the same id '
+             'skips the devices already backed up')
+    p.add_argument(
+        '--journal-dir',
+        help='directory of the run journals (default: OUTPUT_DIR/.runs)')
+    p.add_argument(
+        '--artifacts', default='',
+        help='comma separated artifacts to collect besides the running '
+             'configuration, e.g. startup,version, or `all`')
+    p.add_argument(
+        '--persist-if-needed', action='store_true',
+        help='save the configuration on devices only when it differs from '
+             'the startup configuration')
+    p.add_argument(
+        '--full', action='store_true',
+        help='retrieve every configuration, also those whose fingerprint '
+             'is unchanged since the previous backup')
+    p.add_argument(
+        '--chunked', action='store_true',
+        help='scrape configurations section by section where supported '
+             '(IOS-XR, Junos), resuming after a broken session')
+    p.add_argument(
+        '--redact', action='store_true',
+        help='remove passwords, keys and SNMP communities from the stored '
+             'configurations')
+    p.add_argument(
+        '--diff', action='store_true',
+        help='compare each configuration with the previous backup')
+    p.add_argument(
+        '--payload-log-limit', type=int, default=None, metavar='CHARS',
+        help='characters of device output per debug log message, 0 leaves '
+             f'it out (default: {DEFAULT_PAYLOAD_LIMIT})')
+    p.add_argument(
+        '--device-log', type=int, default=200, metavar='MESSAGES',
+        help='log messages kept per device, whatever the log level, and '
+             f'written to OUTPUT_DIR/{DEVICE_LOGS_DIR} when it fails; '
+             '0 keeps none (default: 200)')
+    p.add_argument(
+        '--report', metavar='PATH',
+        help='write the outcome of every device to PATH, as JSON Lines when '
+             'it ends with .jsonl, otherwise as CSV')
+    p.add_argument(
+        '--record', metavar='DIR',
+        help='record the device sessions into DIR to replay them offline; '
+             'the device credentials are obfuscated, the configurations are '
+             'only redacted with --redact')
+    p.add_argument(
+        '-q', '--quiet', action='store_true', help='do not show progress')
+    p.add_argument(
+        '-v', '--verbose', action='count', default=0,
+        help='log more details, repeat for debug logging')
+    return p
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    arg_parser = parser()
+    args = arg_parser.parse_args(argv)
+    if args.jobs < 1:
+        arg_parser.error('--jobs must be at least 1')
+    if args.deadline is not None and args.deadline <= 0:
+        arg_parser.error('--deadline must be positive')
+    if args.preflight is not None and args.preflight <= 0:
+        arg_parser.error('--preflight must be positive')
+    try:
+        spec = transfer_spec(args.transfer, args.transfer_username)
+    except ValueError as e:
+        arg_parser.error(str(e))
+
+    logger.remove()
+    level = LOG_LEVELS[min(args.verbose, len(LOG_LEVELS) - 1)]
+    log_sink = AsyncSink(sys.stderr, maxsize=LOG_QUEUE_SIZE)
+    logger.add(log_sink, level=level, colorize=sys.stderr.isatty())
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # systemd and most schedulers stop jobs with SIGTERM; signal handlers
+    # can only be set in the main thread
+    main_thread = threading.current_thread() is threading.main_thread()
+    if main_thread:
+        sigterm = signal.signal(signal.SIGTERM, signal.default_int_handler)
+    progress = Progress(sys.stderr, enabled=not args.quiet)
+    report = RunReport()
+    if args.device_log > 0:
+        progress.device_logs = os.path.join(args.output_dir, DEVICE_LOGS_DIR)
+    journal = None
+    persist_digests = fingerprints = reachability = None
+    try:
+        groups = load_groups(args.groups) if args.groups else None
+        if args.run_id:
+            journal_dir = args.journal_dir or os.path.join(
+                args.output_dir, '.runs')
+            journal = RunJournal(journal_dir, args.run_id)
+            progress.skipped = len(journal.finished)
+        if args.persist_if_needed:
+            persist_digests = JsonCache(
+                os.path.join(args.output_dir, PERSIST_DIGESTS_FILE))
+        fingerprints = JsonCache(
+            os.path.join(args.output_dir, FINGERPRINTS_FILE))
+        if args.full:
+            fingerprints.clear()
+        if args.preflight:
+            reachability = ReachabilityCache(store=JsonCache(
+                os.path.join(args.output_dir, REACHABILITY_FILE)))
+            reachability.expire()
+        layout = destination_layout(args.layout, spec)
+        with logfuscator(), intercepting():
+            if journal:
+                pending = cleanup_stale(
+                    read_inventory(args.inventory, groups),
+                    journal,
+                    jobs=args.jobs,
+                )
+                if pending:
+                    logger.warning(f"{pending} devices still need cleanup")
+            results = run_backups(
+                read_inventory(args.inventory, groups),
+                jobs=args.jobs,
+                journal=journal,
+                output_dir=args.output_dir,
+                timeout=args.timeout,
+                proto_transfer_spec=spec,
+                diff=args.diff,
+                artifacts=artifact_names(args.artifacts),
+                persist_if_needed=args.persist_if_needed,
+                persist_digests=persist_digests,
+                fingerprints=fingerprints,
+                chunked_retrieval=args.chunked,
+                redact=args.redact,
+                payload_log_limit=args.payload_log_limit,
+                capture_log=args.device_log,
+                destination_layout=layout,
+                deadline=args.deadline,
+                record_dir=args.record,
+                preflight=args.preflight,
+                reachability=reachability,
+            )
+            for result in results:
+                progress.update(result)
+                report.add(result)
+                if result.log:
+                    write_device_log(progress.device_logs, result)
+    except (InventoryError, OSError) as e:
+        print(f"kopimiko: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        print(f"\ninterrupted\n{progress.summary()}", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    finally:
+        if main_thread:
+            # None when not set from Python
+            signal.signal(signal.SIGTERM, sigterm or signal.SIG_DFL)
+        bastion_pool.close()
+        if reachability is not None:
+            reachability.store.save()
+        for cache in (persist_digests, fingerprints):
+            if cache is not None:
+                cache.save()
+        log_sink.close()
+        if journal:
+            journal.close()
+        if args.report and len(report):
+            try:
+                report.write(args.report)
+            except OSError as e:
+                print(f"kopimiko: report not written: {e}", file=sys.stderr)
+    if progress.enabled and progress.interactive:
+        progress.show()
+        sys.stderr.write('\n')
+    print(progress.summary())
+    return progress.exit_code()
@@ -1,18 +1,32 @@
+from __future__ import annotations
+
 import re
 from dataclasses import dataclass
 from io import StringIO
 from pathlib import Path
-from typing import Callable, Collection, Optional, Sequence, TextIO, Union
+from typing import (
+    TYPE_CHECKING, Callable, Collection, Optional, Sequence, TextIO, Union
+)
 
 from loguru import logger
-from netmiko import ConnectHandler
 
-from .file_transfer import FileTransferInfo
+from .file_transfer import FileTransferError, FileTransferInfo
+from .utils.logs import payload
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
 
 
 Prompt = Callable[[str], str] | Exception | type[Exception]
 Prompts = dict[str | Collection[str], str | Prompt]
 MatchedValue = str | Exception | type[Exception]
+Reconnect = Callable[['ConnectHandler'], None]
+
+# replies of a device to a command it does not know or accept
+re_command_error = re.compile(
+    r'^\s*(%|\^|error:|syntax error|unknown command|invalid input)',
+    re.I | re.M,
+)
 
 
 class PromptMatcher:
@@ -35,7 +49,8 @@ class PromptMatcher:
         elif isinstance(k, str):
             match = k in prompt
         if match:
-            logger.info(f"== `{k}` found in `{repr(prompt)}`")
+            logger.opt(lazy=True).debug(
+                "== `{}` found in {}", lambda: k, lambda: payload(prompt))
             answer = self._get_value(prompt, v) if callable(v) else v
             if self.fti:
                 answer = self.fti.format(answer)
@@ -72,7 +87,7 @@ class PromptCommand:
         command = fti.format(self.command)
         logger.info(f">> {command}")
         reply = connection.send_command_timing(command)
-        logger.info(f"<< {repr(reply)}")
+        logger.opt(lazy=True).debug("<< {}", lambda: payload(reply))
         output = reply
         matcher = PromptMatcher(fti, self.prompts or {})
         while reply:
@@ -80,9 +95,10 @@ class PromptCommand:
             if answer is not None:
                 logger.info(f">> {repr(answer)}")
                 reply = connection.send_command_timing(answer)
-                logger.info(f"<< {reply}")
+                logger.opt(lazy=True).debug("<< {}", lambda: payload(reply))
                 output += reply
-        logger.info(f'output from `{self.command}`: {repr(output)}')
+        logger.opt(lazy=True).debug(
+            "output from `{}`: {}", lambda: self.command, lambda: payload(output))
         valid = self.validate_response(fti, output)
         return output if valid else None
 
@@ -114,27 +130,33 @@ class ScrapeCommand:
     ignore_patterns: Optional[Sequence[Union[str, re.Pattern]]] = None
 
     def is_ignored_line(self, line):
-        for ignore in self.ignore_patterns:
+        for ignore in self.ignore_patterns or ():
             if isinstance(ignore, str):
                 if ignore in line:
                     return True
-            else:
-                return re.search(ignore, line)
+            elif re.search(ignore, line):
+                return True
+        return False
+
+    def write_filtered(self, dest: TextIO, content: str) -> int:
+        """ Write content without its ignored lines, return their number """
+        counter = 0
+        with StringIO(content) as source:
+            for source_line in source:
+                line = source_line.strip()
+                if self.ignore_patterns and self.is_ignored_line(line):
+                    counter += 1
+                else:
+                    dest.write(source_line)
+        return counter
 
     def save_filtered_config(
             self,
-            file: Union[str, Path, int, TextIO],
+            file: Union[str, Path, int],
             content: str,
     ):
-        counter = 0
-        with StringIO(content) as source:
-            with open(file, 'w') as dest:
-                for source_line in source:
-                    line = source_line.strip()
-                    if self.ignore_patterns and self.is_ignored_line(line):
-                        counter += 1
-                    else:
-                        dest.write(source_line)
+        with open(file, 'w') as dest:
+            counter = self.write_filtered(dest, content)
         logger.info(f"{counter} matching lines have been deleted.")
 
     def transfer(
@@ -143,9 +165,105 @@ class ScrapeCommand:
         fti: FileTransferInfo,
     ):
         local_file = fti.destination_filename
+        fti.make_destination_directory()
         Path(local_file).unlink(missing_ok=True)
         response = ch.send_command(self.command)
         self.save_filtered_config(local_file, response)
         result = fti.check_destination()
         logger.info("File transferred using scraping")
         return result
+
+
+@dataclass
+class ChunkedScrapeCommand(ScrapeCommand):
+    """
+    ScrapeCommand reading the configuration one top-level section at a time,
+    so the read timeout bounds a section rather than the whole configuration.
+    When the session breaks, it is reopened and the retrieval resumed with
+    the section that failed; the sections read are already on disk.
+
+    The sections are taken from the sections_command output, in the order
+    they appear, and have to cover the whole configuration. When the device
+    rejects the command of a section, the configuration is scraped whole.
+    """
+    sections_command: str = ''
+    # lines of the sections_command output naming a section
+    section_pattern: Union[str, re.Pattern] = r'^(?P<section>\S+)'
+    section_command: str = '{command} {section}'
+    # written after the sections, e.g. the `end` closing the configuration
+    trailer: str = ''
+    chunk_read_timeout: float = 60.0
+    max_resumes: int = 3
+
+    def sections(self, ch: ConnectHandler) -> list[str]:
+        output = ch.send_command(
+            self.sections_command, read_timeout=self.chunk_read_timeout)
+        sections = {}
+        for line in output.splitlines():
+            match = re.match(self.section_pattern, line)
+            if match:
+                sections.setdefault(match['section'])
+        return list(sections)
+
+    def read_section(self, ch: ConnectHandler, section: str) -> str:
+        command = self.section_command.format(
+            command=self.command, section=section)
+        output = ch.send_command(command, read_timeout=self.chunk_read_timeout)
+        if re_command_error.search(output):
+            raise FileTransferError(f"cannot read `{command}`: {output}")
+        return output
+
+    def transfer(
+        self,
+        ch: ConnectHandler,
+        fti: FileTransferInfo,
+        reconnect: Optional[Reconnect] = None,
+    ):
+        """
+        :param ch: opened netmiko ConnectHandler
+        :param fti: file transfer information
+        :param reconnect: reopens the session of ch after it broke,
+            without it a broken session fails the transfer
+        """
+        from netmiko import NetmikoBaseException
+
+        sections = self.sections(ch)
+        if not sections:
+            logger.warning(f"no sections in `{self.sections_command}`")
+            return super().transfer(ch, fti)
+        local_file = fti.destination_filename
+        fti.make_destination_directory()
+        done = resumes = counter = 0
+        with open(local_file, 'w') as dest:
+            while done < len(sections):
+                try:
+                    output = self.read_section(ch, sections[done])
+                except FileTransferError as e:
+                    rejected = e
+                    break
+                except (NetmikoBaseException, OSError, EOFError) as e:
+                    if reconnect is None or resumes >= self.max_resumes:
+                        raise
+                    resumes += 1
+                    logger.warning(
+                        f"reading `{sections[done]}` failed, resuming after "
+                        f"{done} of {len(sections)} sections: {e}")
+                    reconnect(ch)
+                    continue
+                if not output.endswith('\n'):
+                    # send_command strips the line break before the prompt
+                    output += '\n'
+                counter += self.write_filtered(dest, output)
+                dest.flush()
+                done += 1
+            else:
+                rejected = None
+                dest.write(self.trailer)
+        if rejected is not None:
+            logger.warning(f"{rejected}, scraping the whole configuration")
+            return super().transfer(ch, fti)
+        logger.info(f"{counter} matching lines have been deleted.")
+        result = fti.check_destination()
+        logger.info(
+            f"File transferred using scraping of {len(sections)} sections")
+        return result
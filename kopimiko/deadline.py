@@ -0,0 +1,83 @@
+import inspect
+import time
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Optional
+
+# shortest read timeout set by a deadline, netmiko takes 0 as no timeout
+MIN_TIMEOUT = 0.5
+# netmiko ConnectHandler methods reading the channel up to a read_timeout
+READ_METHODS = (
+    'send_command', 'send_command_timing', 'read_until_pattern',
+    'read_channel_timing',
+)
+
+
+class DeadlineError(Exception):
+    pass
+
+
+@dataclass
+class Deadline:
+    """
+    Point in time, of time.monotonic, by which a device backup has to be
+    done; the timeouts of its steps are bounded by the time remaining.
+    """
+    at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> 'Deadline':
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    def bound(self, timeout: Optional[float] = None) -> float:
+        """ timeout shortened to the time remaining, never below MIN_TIMEOUT """
+        remaining = self.remaining()
+        if timeout is not None:
+            remaining = min(timeout, remaining)
+        return max(remaining, MIN_TIMEOUT)
+
+    def check(self, step: str) -> None:
+        if self.remaining() <= 0:
+            raise DeadlineError(f"deadline exceeded before {step}")
+
+
+def _capped(method: Callable, cap: Callable[[], Optional[float]]) -> Callable:
+    signature = inspect.signature(method)
+    default = signature.parameters['read_timeout'].default
+
+    @wraps(method)
+    def call(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        timeout = bound.arguments.get('read_timeout', default)
+        limit = cap()
+        # netmiko reads without a timeout, 0, get the cap too
+        if limit is not None and (not timeout or timeout > limit):
+            bound.arguments['read_timeout'] = limit
+        return method(*bound.args, **bound.kwargs)
+
+    call.capped = True
+    return call
+
+
+def cap_read_timeouts(ch: Any, cap: Callable[[], Optional[float]]) -> None:
+    """
+    Shorten the read timeout of every read of the netmiko connection ch,
+    its own or the default of the method, to cap() when that is shorter;
+    cap() is asked at each read, None leaves the timeout as it is.
+
+    Unlike read_timeout_override of netmiko, which replaces the timeouts,
+    this never lengthens a read.
+    """
+    for name in READ_METHODS:
+        method = getattr(ch, name, None)
+        if method is None or getattr(method, 'capped', False):
+            continue
+        try:
+            parameters = inspect.signature(method).parameters
+        except (TypeError, ValueError):
+            continue
+        if 'read_timeout' in parameters:
+            setattr(ch, name, _capped(method, cap))
@@ -0,0 +1,256 @@
+import os
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from itertools import islice
+from typing import Callable, Iterator, Optional, Union
+
+LineFilter = Callable[[str], bool]
+PathLike = Union[str, os.PathLike]
+Opcode = tuple[str, int, int, int, int]
+
+DEFAULT_CONTEXT = 3
+DEFAULT_MAX_DIFF_LINES = 1000
+# regions without unique anchor lines are handed over to difflib,
+# but only when both sides are small enough to keep it cheap
+FALLBACK_AREA = 40_000
+
+
+@dataclass
+class ConfigDiff:
+    added: int = 0
+    removed: int = 0
+    diff: str = ''
+    truncated: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def _lines(path: PathLike, is_ignored: Optional[LineFilter]) -> Iterator[str]:
+    with open(path, errors='replace') as f:
+        for line in f:
+            if is_ignored and is_ignored(line.strip()):
+                continue
+            yield line.rstrip('\r\n')
+
+
+def _hashes(path: PathLike, is_ignored: Optional[LineFilter]) -> array:
+    return array('q', (hash(line) for line in _lines(path, is_ignored)))
+
+
+def _unique_anchors(a, alo, ahi, b, blo, bhi) -> list[tuple[int, int]]:
+    """
+    Pairs of lines appearing exactly once on both sides of the region,
+    reduced to their longest common subsequence (patience sorting).
+    """
+    counts_a = Counter(a[alo:ahi])
+    index_b: dict[int, int] = {}
+    counts_b = Counter()
+    for j in range(blo, bhi):
+        h = b[j]
+        if counts_a.get(h) == 1:
+            counts_b[h] += 1
+            index_b[h] = j
+    pairs = [
+        (i, index_b[a[i]]) for i in range(alo, ahi)
+        if counts_b.get(a[i]) == 1
+    ]
+    if not pairs:
+        return []
+
+    tails: list[int] = []
+    tail_pos: list[int] = []
+    back: list[int] = [-1] * len(pairs)
+    for pos, (_, j) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo:
+            back[pos] = tail_pos[lo - 1]
+        if lo == len(tails):
+            tails.append(j)
+            tail_pos.append(pos)
+        else:
+            tails[lo] = j
+            tail_pos[lo] = pos
+
+    result = []
+    pos = tail_pos[-1]
+    while pos >= 0:
+        result.append(pairs[pos])
+        pos = back[pos]
+    result.reverse()
+    return result
+
+
+def matching_pairs(a: array, b: array) -> list[tuple[int, int]]:
+    """
+    Indices of lines of `a` matched to lines of `b`, in increasing order.
+
+    Common heads and tails are matched directly, the remaining regions are
+    split around lines unique to both sides, so the cost stays close to
+    linear in the number of lines.
+    """
+    matched: list[tuple[int, int]] = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matched.append((alo, blo))
+            alo, blo = alo + 1, blo + 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi, bhi = ahi - 1, bhi - 1
+            matched.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, alo, ahi, b, blo, bhi)
+        if anchors:
+            for i, j in anchors:
+                matched.append((i, j))
+                stack.append((alo, i, blo, j))
+                alo, blo = i + 1, j + 1
+            stack.append((alo, ahi, blo, bhi))
+        elif (ahi - alo) * (bhi - blo) <= FALLBACK_AREA:
+            sm = SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for i, j, size in sm.get_matching_blocks():
+                matched.extend((alo + i + k, blo + j + k) for k in range(size))
+    matched.sort()
+    return matched
+
+
+def opcodes(a: array, b: array) -> list[Opcode]:
+    result: list[Opcode] = []
+    i = j = 0
+    for mi, mj in [*matching_pairs(a, b), (len(a), len(b))]:
+        if i < mi or j < mj:
+            tag = 'replace' if i < mi and j < mj else (
+                'delete' if i < mi else 'insert')
+            result.append((tag, i, mi, j, mj))
+        if mi < len(a):
+            if result and result[-1][0] == 'equal':
+                tag, i1, _, j1, _ = result.pop()
+                result.append((tag, i1, mi + 1, j1, mj + 1))
+            else:
+                result.append(('equal', mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return result
+
+
+def grouped_opcodes(codes: list[Opcode], n: int) -> Iterator[list[Opcode]]:
+    """ Same grouping as difflib.SequenceMatcher.get_grouped_opcodes """
+    if not codes:
+        codes = [('equal', 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    nn = n + n
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+class _Cursor:
+    """ Forward-only random access over the filtered lines of a file """
+    def __init__(self, lines: Iterator[str]):
+        self.lines = lines
+        self.pos = 0
+
+    def take(self, start: int, stop: int) -> list[str]:
+        skip = start - self.pos
+        result = list(islice(self.lines, skip, skip + stop - start))
+        self.pos = stop
+        return result
+
+
+def _range(start: int, stop: int) -> str:
+    length = stop - start
+    first = start + 1 if length else start
+    return str(first) if length == 1 else f"{first},{length}"
+
+
+def unified_diff(
+        previous: PathLike,
+        current: PathLike,
+        codes: list[Opcode],
+        is_ignored: Optional[LineFilter] = None,
+        context: int = DEFAULT_CONTEXT,
+        max_lines: int = DEFAULT_MAX_DIFF_LINES,
+) -> tuple[str, bool]:
+    out = [f"--- {previous}", f"+++ {current}"]
+    limit = len(out) + max_lines
+    truncated = False
+    old_lines = _lines(previous, is_ignored)
+    new_lines = _lines(current, is_ignored)
+    try:
+        old, new = _Cursor(old_lines), _Cursor(new_lines)
+        for group in grouped_opcodes(codes, context):
+            if len(out) >= limit:
+                truncated = True
+                break
+            _, i1, _, j1, _ = group[0]
+            _, _, i2, _, j2 = group[-1]
+            out.append(f"@@ -{_range(i1, i2)} +{_range(j1, j2)} @@")
+            for tag, i1, i2, j1, j2 in group:
+                removed, added = old.take(i1, i2), new.take(j1, j2)
+                if tag == 'equal':
+                    out.extend(f" {line}" for line in removed)
+                    continue
+                out.extend(f"-{line}" for line in removed)
+                out.extend(f"+{line}" for line in added)
+    finally:
+        old_lines.close()
+        new_lines.close()
+    if len(out) > limit:
+        truncated, out = True, out[:limit]
+    return '\n'.join(out) + '\n', truncated
+
+
+def diff_config_files(
+        previous: PathLike,
+        current: PathLike,
+        is_ignored: Optional[LineFilter] = None,
+        context: int = DEFAULT_CONTEXT,
+        max_lines: int = DEFAULT_MAX_DIFF_LINES,
+) -> ConfigDiff:
+    """
+    Compare the current configuration file with the previous backup.
+
+    Lines are compared by hash, only the hashes are held in memory and the
+    unified diff is produced by a second pass over both files.
+
+    :param previous: path of the previous backup
+    :param current: path of the newly retrieved configuration
+    :param is_ignored: predicate for lines to leave out of the comparison
+    :param context: number of context lines in the unified diff
+    :param max_lines: cap on the number of unified diff lines
+    :return: ConfigDiff with the counts of added and removed lines
+    """
+    a = _hashes(previous, is_ignored)
+    b = _hashes(current, is_ignored)
+    codes = opcodes(a, b)
+    result = ConfigDiff()
+    for tag, i1, i2, j1, j2 in codes:
+        if tag != 'equal':
+            result.removed += i2 - i1
+            result.added += j2 - j1
+    if result.changed:
+        result.diff, result.truncated = unified_diff(
+            previous, current, codes, is_ignored, context, max_lines)
+    return result
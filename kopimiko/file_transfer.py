@@ -1,9 +1,15 @@
+import hashlib
 import os
+import posixpath
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import asdict, dataclass
-from typing import Callable, Optional
+from datetime import datetime
+from typing import Callable, Iterator, Optional, Sequence
 from uuid import uuid4
 
-from netmiko import log as netmiko_log
+from loguru import logger
 
 from .utils.logs import secret_keeper
 
@@ -12,9 +18,6 @@ class FileTransferError(Exception):
     pass
 
 
-netmiko_log.addFilter(secret_keeper)
-
-
 @dataclass
 class ProtoTransferParam:
     dst_ip: str = None
@@ -35,13 +38,188 @@ class SimpleTransferSpec:
         return self.ptp.get(proto)
 
 
+@dataclass(frozen=True)
+class DestinationLayout:
+    """
+    Directories below dst_volume the transferred files are spread over, so
+    no directory holds the files of every backup, e.g. `2026/10/19/3f`:
+    the date, by date_format, then a prefix of hash_width hex digits of the
+    sha1 of the host. Either part is left out when empty or 0.
+
+    The directories are relative paths with `/` separators, as the device
+    side transfer commands use dst_file.
+    """
+    date_format: str = '%Y/%m/%d'
+    hash_width: int = 2
+    # date of the directories, the time of the call when None
+    date: Optional[datetime] = None
+
+    def __post_init__(self):
+        if not 0 <= self.hash_width <= 3:
+            raise ValueError('hash_width has to be between 0 and 3')
+
+    def _date_directory(self) -> str:
+        if not self.date_format:
+            return ''
+        return (self.date or datetime.now()).strftime(self.date_format)
+
+    def _hash_prefixes(self) -> list[str]:
+        if not self.hash_width:
+            return ['']
+        return [
+            f"{n:0{self.hash_width}x}" for n in range(16 ** self.hash_width)]
+
+    def directory(self, host: str) -> str:
+        prefix = hashlib.sha1(host.encode()).hexdigest()[:self.hash_width]
+        return posixpath.join(self._date_directory(), prefix).strip('/')
+
+    def path(self, host: str, filename: str) -> str:
+        return posixpath.join(self.directory(host), filename)
+
+    def directories(self) -> Iterator[str]:
+        """ Every directory of the date """
+        date_directory = self._date_directory()
+        for prefix in self._hash_prefixes():
+            directory = posixpath.join(date_directory, prefix).strip('/')
+            if directory:
+                yield directory
+
+    def create(self, volume: str) -> int:
+        """
+        Create the directories of the date below volume ahead of the
+        transfers, e.g. for TFTP servers not creating directories
+        """
+        count = 0
+        for directory in self.directories():
+            os.makedirs(os.path.join(volume, directory), exist_ok=True)
+            count += 1
+        return count
+
+
+@dataclass
+class TransferDestination:
+    """ Destination of a PooledTransferSpec and its load and health """
+    param: ProtoTransferParam
+    weight: float = 1.0
+    site: Optional[str] = None
+    in_flight: int = 0
+    assigned: int = 0
+    # consecutive failed transfers, the destination is left out for a
+    # while after PooledTransferSpec.max_failures of them
+    failures: int = 0
+    down_until: float = 0.0
+
+    def load(self) -> tuple[float, float]:
+        return (self.in_flight + 1) / self.weight, self.assigned / self.weight
+
+
+class PooledTransferSpec:
+    """
+    ProtoTransferSpec spreading the transfers of a protocol over a pool of
+    destinations, picked by least in-flight transfers relative to their
+    weight, among those of the site of the device when there are any.
+
+    A destination failing max_failures transfers in a row is left out for
+    retry_after seconds, unless every destination of the pool is out.
+
+        spec = PooledTransferSpec({'scp': [
+            TransferDestination(ProtoTransferParam('10.0.0.5', '/srv')),
+            TransferDestination(ProtoTransferParam('10.1.0.5', '/srv'),
+                                site='ams'),
+        ]})
+        with spec.lease('scp', site='ams') as param:
+            ...
+    """
+    def __init__(
+            self,
+            pools: dict[str, Sequence[TransferDestination]],
+            max_failures: int = 3,
+            retry_after: float = 300.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.pools = {proto: list(pool) for proto, pool in pools.items()}
+        self.max_failures = max_failures
+        self.retry_after = retry_after
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def pick(
+            self,
+            proto: str,
+            site: Optional[str] = None,
+    ) -> Optional[TransferDestination]:
+        pool = self.pools.get(proto)
+        if not pool:
+            return None
+        now = self.clock()
+        candidates = [d for d in pool if d.down_until <= now] or pool
+        if site is not None:
+            candidates = [d for d in candidates if d.site == site] or candidates
+        return min(candidates, key=TransferDestination.load)
+
+    def __call__(self, proto: str) -> Optional[ProtoTransferParam]:
+        destination = self.pick(proto)
+        return destination.param if destination else None
+
+    @contextmanager
+    def lease(
+            self,
+            proto: str,
+            site: Optional[str] = None,
+    ) -> Iterator[Optional[ProtoTransferParam]]:
+        """
+        Destination of one transfer, counted in flight within the context.
+        The transfer failed when the context is left with a
+        FileTransferError, of the transfer or of its destination check;
+        other errors, e.g. of the session with the device, leave the health
+        of the destination as it is.
+        """
+        with self._lock:
+            destination = self.pick(proto, site)
+            if destination is not None:
+                destination.in_flight += 1
+                destination.assigned += 1
+        if destination is None:
+            yield None
+            return
+        ok: Optional[bool] = None
+        try:
+            yield destination.param
+            ok = True
+        except FileTransferError:
+            ok = False
+            raise
+        finally:
+            with self._lock:
+                destination.in_flight -= 1
+                if ok is not None:
+                    self._update_health(destination, ok)
+
+    def _update_health(self, destination: TransferDestination, ok: bool):
+        if ok:
+            destination.failures = 0
+            return
+        destination.failures += 1
+        if destination.failures >= self.max_failures:
+            destination.down_until = self.clock() + self.retry_after
+            destination.failures = 0
+            logger.warning(
+                f"transfer destination {destination.param.dst_ip} left out "
+                f"for {self.retry_after:.0f}s after {self.max_failures} "
+                f"failures")
+
+
 @dataclass
 class FileTransferInfo(ProtoTransferParam):
     persisted: bool = False
+    # saved once the configuration is retrieved, see save_configuration
+    save_deferred: bool = False
     src_file: str = None
     dst_file: str = None
     src_ip: str = None
     src_volume: str = None
+    # directory of dst_file on the transfer destinations, see set_destination
+    dst_directory: str = None
 
     def __post_init__(self):
         secret_keeper.add_secret(self.password)
@@ -74,6 +252,29 @@ class FileTransferInfo(ProtoTransferParam):
         result = os.path.join(self.dst_volume or '', self.dst_file)
         return result
 
+    @property
+    def dst_name(self) -> str:
+        """ dst_file without its directories, e.g. for device storage """
+        return posixpath.basename(self.dst_file)
+
+    def set_destination(self, param: ProtoTransferParam):
+        """
+        Transfer to the destination of param, dst_file moved into
+        dst_directory there; local retrievals stay out of it
+        """
+        self.__dict__.update(asdict(param))
+        if self.dst_directory:
+            self.dst_file = posixpath.join(self.dst_directory, self.dst_file)
+            self.dst_directory = None
+        self.make_destination_directory()
+
+    def make_destination_directory(self):
+        """ Create the directory of dst_file, unless dst_volume is remote """
+        directory = os.path.dirname(self.destination_filename)
+        remote = self.dst_volume and not os.path.isdir(self.dst_volume)
+        if directory and not remote:
+            os.makedirs(directory, exist_ok=True)
+
     def check_destination(self):
         target = self.destination_filename
         if os.path.isfile(target) is False:
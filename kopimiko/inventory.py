@@ -0,0 +1,189 @@
+import csv
+import json
+import os
+from typing import Any, Callable, Iterable, Iterator, Mapping, Optional, Union
+
+DeviceSpec = dict[str, Any]
+GroupDefaults = Mapping[str, Mapping[str, Any]]
+PathLike = Union[str, os.PathLike]
+
+# device spec keys which may hold a credential reference, e.g. `env:NAME`
+CREDENTIAL_KEYS = ('password', 'secret', 'passphrase')
+GROUP_KEYS = ('group', 'groups')
+
+
+class InventoryError(Exception):
+    pass
+
+
+def _read_csv(path: str) -> Iterator[DeviceSpec]:
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield {k: v for k, v in row.items() if v not in (None, '')}
+
+
+def _read_jsonl(path: str) -> Iterator[DeviceSpec]:
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise InventoryError(f"{path}:{lineno}: {e}") from e
+
+
+def _yaml():
+    try:
+        import yaml
+    except ImportError as e:
+        raise InventoryError('PyYAML is required for YAML inventories') from e
+    return yaml
+
+
+def _read_yaml(path: str) -> Iterator[DeviceSpec]:
+    """
+    Devices of a YAML stream; documents are loaded one at a time, so large
+    inventories should be split into documents of one or a few devices.
+    """
+    yaml = _yaml()
+    with open(path) as f:
+        try:
+            for document in yaml.safe_load_all(f):
+                if isinstance(document, Mapping):
+                    yield dict(document)
+                elif isinstance(document, list):
+                    yield from document
+                elif document is not None:
+                    raise InventoryError(f"{path}: unexpected {document!r}")
+        except yaml.YAMLError as e:
+            raise InventoryError(f"{path}: {e}") from e
+
+
+READERS = {
+    '.csv': _read_csv,
+    '.jsonl': _read_jsonl,
+    '.ndjson': _read_jsonl,
+    '.yaml': _read_yaml,
+    '.yml': _read_yaml,
+}
+
+
+def load_groups(path: PathLike) -> dict[str, dict[str, Any]]:
+    """ Group defaults from a JSON or YAML mapping of group name to spec """
+    path = os.fspath(path)
+    with open(path) as f:
+        if path.endswith('.json'):
+            groups = json.load(f)
+        else:
+            groups = _yaml().safe_load(f)
+    if not isinstance(groups, Mapping):
+        raise InventoryError(f"{path}: groups must be a mapping")
+    return dict(groups)
+
+
+def device_host(spec: DeviceSpec) -> Optional[str]:
+    return spec.get('host') or spec.get('ip')
+
+
+def device_groups(spec: DeviceSpec) -> list[str]:
+    groups = []
+    for key in GROUP_KEYS:
+        value = spec.get(key) or []
+        if isinstance(value, str):
+            value = [g.strip() for g in value.split(',')]
+        groups.extend(g for g in value if g)
+    return groups
+
+
+def apply_defaults(
+        spec: DeviceSpec,
+        groups: Optional[GroupDefaults] = None,
+        defaults: Optional[Mapping[str, Any]] = None,
+) -> DeviceSpec:
+    """
+    Merge a device spec over the defaults of its groups, later groups
+    taking precedence over earlier ones and the device over all groups.
+    """
+    result = dict(defaults or {})
+    for group in device_groups(spec):
+        if groups is None or group not in groups:
+            raise InventoryError(f"unknown group `{group}` of {spec}")
+        result.update(groups[group])
+    result.update(spec)
+    for key in GROUP_KEYS:
+        result.pop(key, None)
+    return result
+
+
+def read_inventory(
+        path: PathLike,
+        groups: Optional[GroupDefaults] = None,
+        defaults: Optional[Mapping[str, Any]] = None,
+) -> Iterator[DeviceSpec]:
+    """
+    Read device specs, i.e. the netmiko connection arguments of each device,
+    one at a time from a CSV, JSON Lines or YAML file.
+
+    Credential references are left as they are, see resolve_credentials.
+
+    :param path: inventory file, the format is taken from its extension
+    :param groups: defaults per group, applied to the devices listing the
+        group in their `group` or `groups`
+    :param defaults: defaults applied to every device
+    """
+    path = os.fspath(path)
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise InventoryError(f"unsupported inventory format: {path}")
+    for spec in reader(path):
+        if not isinstance(spec, Mapping):
+            raise InventoryError(f"unexpected device in {path}: {spec!r}")
+        spec = apply_defaults(spec, groups, defaults)
+        if not device_host(spec):
+            raise InventoryError(f"device without host in {path}: {spec}")
+        yield spec
+
+
+def _from_env(name: str) -> str:
+    try:
+        return os.environ[name]
+    except KeyError:
+        raise InventoryError(f"environment variable {name} not set") from None
+
+
+def _from_file(name: str) -> str:
+    try:
+        with open(name) as f:
+            return f.read().rstrip('\r\n')
+    except OSError as e:
+        raise InventoryError(f"cannot read credential file: {e}") from e
+
+
+CredentialResolver = Callable[[str], str]
+
+# `scheme:reference` -> resolver, extend for e.g. vault lookups
+CREDENTIAL_RESOLVERS: dict[str, CredentialResolver] = {
+    'env': _from_env,
+    'file': _from_file,
+}
+
+
+def resolve_credentials(
+        spec: DeviceSpec,
+        keys: Iterable[str] = CREDENTIAL_KEYS,
+) -> DeviceSpec:
+    """
+    Copy of the device spec with its credential references resolved,
+    meant to be called only when the device is about to be backed up.
+    """
+    result = dict(spec)
+    for key in keys:
+        value = result.get(key)
+        if not isinstance(value, str):
+            continue
+        scheme, sep, reference = value.partition(':')
+        resolver = CREDENTIAL_RESOLVERS.get(scheme)
+        if sep and resolver is not None:
+            result[key] = resolver(reference)
+    return result
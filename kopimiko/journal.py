@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from typing import Any, Optional, TextIO
+
+from loguru import logger
+
+# file transfer info fields needed to remove a persisted configuration
+PERSISTED_FIELDS = ('src_file', 'src_volume', 'dst_file')
+
+
+class RunJournal:
+    """
+    Append-only JSON Lines record of a backup run, `{directory}/{run_id}.jsonl`.
+
+    Each line is an event of one device: `persisted` when a configuration
+    copy is about to be left on the device, `cleaned` once it has been
+    removed and `done` when the backup finished. Reopening the journal of
+    a run restores which devices are finished and the copies still to be
+    removed from each device.
+    """
+    def __init__(self, directory: str, run_id: str, sync: bool = False):
+        self.run_id = run_id
+        self.path = os.path.join(directory, f"{run_id}.jsonl")
+        self.sync = sync
+        self.finished: set[str] = set()
+        self.pending_cleanup: dict[str, list[dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            self._replay()
+        self._file: Optional[TextIO] = open(self.path, 'a')
+
+    def _replay(self):
+        with open(self.path) as f:
+            for lineno, line in enumerate(f, 1):
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # most likely the last line, cut short by a kill
+                    logger.warning(f"{self.path}:{lineno} skipped")
+                    continue
+                self._apply(event)
+        logger.info(
+            f"run {self.run_id}: {len(self.finished)} devices finished, "
+            f"{sum(map(len, self.pending_cleanup.values()))} cleanups pending"
+        )
+
+    def _apply(self, event: dict[str, Any]):
+        host, kind = event.get('host'), event.get('event')
+        if kind == 'persisted':
+            fti = event.get('fti', {})
+            pending = self.pending_cleanup.setdefault(host, [])
+            if fti not in pending:
+                pending.append(fti)
+        elif kind == 'cleaned':
+            # without src_file, as journaled by earlier versions: all of them
+            src_file = event.get('src_file')
+            pending = [
+                fti for fti in self.pending_cleanup.get(host, ())
+                if src_file is not None and fti.get('src_file') != src_file
+            ]
+            if pending:
+                self.pending_cleanup[host] = pending
+            else:
+                self.pending_cleanup.pop(host, None)
+        elif kind == 'done' and event.get('ok'):
+            self.finished.add(host)
+
+    def _write(self, **event):
+        line = json.dumps(event) + '\n'
+        with self._lock:
+            self._apply(event)
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+
+    def persisted(self, host: str, fti_fields: dict[str, Any]):
+        fields = {k: fti_fields.get(k) for k in PERSISTED_FIELDS}
+        self._write(host=host, event='persisted', fti=fields)
+
+    def cleaned(self, host: str, src_file: Optional[str] = None):
+        self._write(host=host, event='cleaned', src_file=src_file)
+
+    def done(self, host: str, ok: bool, **details):
+        self._write(host=host, event='done', ok=ok, **details)
+
+    def is_finished(self, host: str) -> bool:
+        return host in self.finished
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,27 +1,60 @@
+from __future__ import annotations
+
+import hashlib
 import importlib
 import inspect
 import os
+import re
+import shutil
 from contextlib import contextmanager, suppress
-from dataclasses import asdict
+from dataclasses import dataclass, field
+from functools import partial
 import time
 from typing import (
-    Any, Callable, Iterator, Optional, Sequence, Tuple, Type, cast
+    TYPE_CHECKING, Any, Callable, Collection, Iterator, MutableMapping,
+    Optional, Sequence, Type, Union
 )
+from uuid import uuid4
 
 from loguru import logger
-from netmiko import ConnectHandler, NetmikoBaseException
 
-from ..comm import PromptCommand, Prompts, ScrapeCommand, TransferCommand  # noqa
+from ..bastion import Bastion, bastion_pool
+from ..comm import (  # noqa
+    ChunkedScrapeCommand, PromptCommand, Prompts, ScrapeCommand,
+    TransferCommand, re_command_error
+)
+from ..deadline import Deadline, DeadlineError, cap_read_timeouts
+from ..diff import ConfigDiff, diff_config_files
 from ..file_transfer import (
-    FileTransferError, FileTransferInfo, ProtoTransferSpec
+    DestinationLayout, FileTransferError, FileTransferInfo, ProtoTransferSpec
+)
+from ..journal import RunJournal
+from ..recording import (
+    RecordingChannel, ReplayError, record_session, recording_header,
+    replay_connection
 )
-from ..utils.logs import secret_keeper
+from ..redact import Redactor
+from ..utils.logs import payload, payload_logging, secret_keeper
+
+if TYPE_CHECKING:
+    from importlib.metadata import EntryPoint
+    from netmiko import ConnectHandler
 
 CTRL_C = '\x03'
+RUNNING_CONFIG = 'running'
+DEFAULT_READ_TIMEOUT = 10.0
+
+# netmiko connection arguments obfuscated in the logs
+SECRET_KWARGS = ('password', 'secret', 'passphrase')
+# netmiko connection timeouts bounded by the deadline of a backup
+CONNECT_TIMEOUT_KWARGS = (
+    'conn_timeout', 'auth_timeout', 'banner_timeout', 'timeout')
 
-TransferMethod = Callable[[ConnectHandler, FileTransferInfo], Any]
+TransferMethod = Callable[['ConnectHandler', FileTransferInfo], Any]
 TransferMethods = Sequence[TransferMethod]
 TransferResult = dict[str, bool]
+Commands = Sequence[Union[str, tuple[str, Optional[float]]]]
+CommandBatch = list[tuple[str, Optional[float]]]
 RemoteTransferParamSetter = Callable[[FileTransferInfo, str], None]
 
 
@@ -30,35 +63,337 @@ def reset_channel(ch):
     time.sleep(0.25)
 
 
+def transfer_method_name(method: TransferMethod) -> str:
+    if isinstance(method, partial):
+        if 'cmd' not in method.keywords:
+            return transfer_method_name(method.func)
+        cmd = method.keywords['cmd']
+        return cmd.proto or cmd.command
+    if isinstance(getattr(method, '__self__', None), ScrapeCommand):
+        return 'scrape'
+    return getattr(method, '__name__', str(method))
+
+
+def config_digest(
+        config: str,
+        is_ignored: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """ sha256 of a configuration, leaving out the ignored lines """
+    digest = hashlib.sha256()
+    for line in config.splitlines():
+        if is_ignored is None or not is_ignored(line):
+            digest.update(line.rstrip().encode())
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+@dataclass
+class ArtifactBundle:
+    files: dict[str, str] = field(default_factory=dict)
+    errors: dict[str, str] = field(default_factory=dict)
+    transfer_method: Optional[str] = None
+    # fingerprint of the device configuration, see PlatformHandler.fingerprint
+    fingerprint: Optional[str] = None
+    # running configuration not retrieved, its fingerprint is unchanged
+    unchanged: bool = False
+
+
 class PlatformHandler:
     proto_copy_templates = None
+    scraper: Optional[ScrapeCommand] = None
+    # removes secrets from the configurations when they are stored
+    redactor: Optional[Redactor] = None
+    # scraper reading large configurations section by section
+    chunked_scraper: Optional[ChunkedScrapeCommand] = None
+    # artifacts collected besides the running configuration
+    collection: dict[str, ScrapeCommand] = {}
+    # artifacts equal to the running configuration once it is persisted
+    persisted_artifacts: tuple[str, ...] = ()
+    # commands queued on the device at once by exec_commands, platforms
+    # with a reliable type-ahead buffer may raise it
+    pipeline_depth = 1
+    # lines of the running configuration changing without a configuration
+    # change, e.g. timestamps, left out of its digest
+    volatile_patterns: Sequence[Union[str, re.Pattern]] = ()
+    # the transfers read the saved configuration, saved before them then
+    saved_configuration_retrieved = False
+    # command whose output changes with every configuration change, e.g.
+    # the last commit, so unchanged configurations are not retrieved
+    fingerprint_command: Optional[str] = None
+    # lines of its output changing anyway, e.g. the time of day
+    fingerprint_ignore_patterns: Sequence[Union[str, re.Pattern]] = ()
+    # path of the persisted configuration on the SFTP server of the device,
+    # formatted with the file transfer information, see pull_transfer
+    pull_path: Optional[str] = None
+    # seconds a transfer method needs at least, it and the later methods
+    # are skipped when the deadline of the backup leaves less
+    min_transfer_time = 10.0
+    # seconds kept from the deadline to remove a persisted copy
+    cleanup_time = 15.0
 
     def __init__(
             self,
             fti_class: Type[FileTransferInfo] = None,
             proto_transfer_spec: ProtoTransferSpec = None,
+            journal: Optional[RunJournal] = None,
+            bastion: Optional[Bastion] = None,
+            persist_if_needed: bool = False,
+            persist_digests: Optional[MutableMapping[str, str]] = None,
+            fingerprints: Optional[MutableMapping[str, str]] = None,
+            chunked_retrieval: bool = False,
+            payload_log_limit: Optional[int] = None,
+            site: Optional[str] = None,
+            destination_layout: Optional[DestinationLayout] = None,
+            record_dir: Optional[str] = None,
+            replay: Optional[str] = None,
+            replay_speed: float = 1.0,
+            redact_recordings: bool = False,
             **netmiko_connection_kwargs
     ):
         self.fti_class = fti_class or FileTransferInfo
         self.proto_transfer_spec = proto_transfer_spec
+        self.journal = journal
+        self.bastion = bastion
+        self.persist_if_needed = persist_if_needed
+        self.persist_digests = persist_digests
+        self.fingerprints = fingerprints
+        self.chunked_retrieval = chunked_retrieval
+        # characters of device output logged, see utils.logs.payload
+        self.payload_log_limit = payload_log_limit
+        # site of the device, for the affinity of transfer destinations
+        self.site = site
+        self.destination_layout = destination_layout
+        # sessions are recorded into record_dir, or replayed from the
+        # recording replay instead of opened, see recording
+        self.record_dir = record_dir
+        self.replay = replay
+        self.replay_speed = replay_speed
+        # the device output of recordings is redacted by the redactor
+        self.redact_recordings = redact_recordings
+        # deadline of the running collect, see collect, and the seconds of
+        # it kept from reads and given to them at least, see bound_reads
+        self.deadline: Optional[Deadline] = None
+        self.read_limits = (0.0, 0.0)
         self.netmiko_kw = netmiko_connection_kwargs
-        secret_keeper.add_secret(netmiko_connection_kwargs.get('password'))
+        self.transfer_method: Optional[str] = None
+        self.secrets = tuple(filter(None, (
+            *(netmiko_connection_kwargs.get(key) for key in SECRET_KWARGS),
+            bastion and bastion.password,
+        )))
+        for secret in self.secrets:
+            secret_keeper.add_secret(secret)
+
+    def release_secrets(self):
+        """ Stop obfuscating the secrets of this handler in the logs """
+        secrets, self.secrets = self.secrets, ()
+        for secret in secrets:
+            secret_keeper.remove_secret(secret)
+
+    @property
+    def host(self) -> Optional[str]:
+        return self.netmiko_kw.get('host') or self.netmiko_kw.get('ip')
+
+    @property
+    def leaves_persisted_configuration(self) -> bool:
+        """ Whether persist_configuration leaves a copy to be removed """
+        method = type(self).remove_persisted_configuration
+        return method is not PlatformHandler.remove_persisted_configuration
+
+    def get_ssh_handler(
+            self,
+            enabled: bool = False,
+            recorded: Optional[dict[str, Any]] = None,
+            **kw
+    ) -> ConnectHandler:
+        """
+        :param recorded: header fields of the recording of the session
+        :param kw: netmiko connection arguments overriding those of the handler
+        """
+        from netmiko import BaseConnection, ConnectHandler
 
-    def get_ssh_handler(self, enabled: bool = False, **kw) -> ConnectHandler:
         kwargs = self.netmiko_kw.copy()
         kwargs.update(kw)
-        handler = ConnectHandler(**kwargs)
+        if self.replay is not None:
+            return replay_connection(self.replay, self.replay_speed, **kwargs)
+        if self.deadline is not None:
+            self.deadline.check(f"connecting to {self.host}")
+            defaults = inspect.signature(BaseConnection.__init__).parameters
+            for key in CONNECT_TIMEOUT_KWARGS:
+                # shortened, never set when netmiko leaves it unset
+                timeout = kwargs.get(key, defaults[key].default)
+                if timeout is not None:
+                    kwargs[key] = self.deadline.bound(timeout)
+        sock = None
+        if self.bastion is not None and kwargs.get('sock') is None:
+            port = kwargs.get('port') or 22
+            sock = bastion_pool.open_channel(self.bastion, self.host, port)
+            kwargs['sock'] = sock
+        try:
+            handler = ConnectHandler(**kwargs)
+        except Exception:
+            if sock is not None:
+                sock.close()
+            raise
+        self.bound_reads(handler)
+        if self.record_dir is not None:
+            self.record(handler, **recorded or {})
         if enabled and not handler.check_enable_mode():
             handler.enable()
         return handler
 
+    def record(self, ch: ConnectHandler, **header: Any) -> None:
+        """ Record the session of ch as `{record_dir}/{host}-{time}.jsonl` """
+        os.makedirs(self.record_dir, exist_ok=True)
+        host = str(self.host).replace(os.sep, '_').replace(':', '_')
+        name = f"{host}-{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:6]}"
+        path = os.path.join(self.record_dir, f"{name}.jsonl")
+        redactor = self.redactor if self.redact_recordings else None
+        record_session(ch, path, redactor, **header)
+        logger.info(f"recording the session of {self.host} to {path}")
+
+    @contextmanager
+    def budget(self, seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+        """ Deadline of the steps within the context, seconds from now """
+        previous = self.deadline
+        if seconds:
+            self.deadline = Deadline.after(seconds)
+        try:
+            yield self.deadline
+        finally:
+            self.deadline = previous
+
+    def bound_reads(
+            self,
+            ch: ConnectHandler,
+            reserve: float = 0.0,
+            floor: float = 0.0,
+    ) -> None:
+        """
+        Cap the read timeouts of ch by the deadline less reserve seconds
+        kept for later steps, though not below floor seconds
+        """
+        self.read_limits = (reserve, floor)
+        if self.deadline is not None:
+            cap_read_timeouts(ch, self.read_timeout_cap)
+
+    def read_timeout_cap(self) -> Optional[float]:
+        """ Longest read the deadline leaves time for, None without one """
+        if self.deadline is None:
+            return None
+        reserve, floor = self.read_limits
+        remaining = self.deadline.bound(self.deadline.remaining() - reserve)
+        return max(remaining, floor)
+
+    def reconnect(self, ch: ConnectHandler) -> None:
+        """ Reopen the session of a ConnectHandler after it broke """
+        if self.replay is not None:
+            # the recording holds no second session, nor is the device to
+            # be reached
+            raise ReplayError(f"cannot reconnect to {self.host} in a replay")
+        with suppress(Exception):
+            ch.disconnect()
+        if self.deadline is not None:
+            self.deadline.check(f"reconnecting to {self.host}")
+        if self.bastion is not None:
+            port = self.netmiko_kw.get('port') or 22
+            ch.sock = bastion_pool.open_channel(self.bastion, self.host, port)
+        recording = ch.channel if isinstance(
+            ch.channel, RecordingChannel) else None
+        # what ConnectHandler does to open the session in the first place
+        ch._open()
+        if recording is not None:
+            ch.channel = RecordingChannel(ch.channel, recording.recorder)
+        logger.info(f"reconnected to {self.host}")
+
     def send_command(self, command: str) -> str:
-        with self.get_ssh_handler() as ch:
+        with (
+            payload_logging(self.payload_log_limit),
+            self.get_ssh_handler() as ch,
+        ):
             # TODO: investigate how to handle exceptions
             result = ch.send_command(command)
-            logger.info(f'cmd {self} {command} -> {result}')
+            logger.info(f"cmd {self.host} {command}")
+            logger.opt(lazy=True).debug(
+                "{} -> {}", lambda: command, lambda: payload(result))
             return result
 
+    def exec_commands(
+            self,
+            ch: ConnectHandler,
+            commands: Commands,
+            read_timeout: Optional[float] = None,
+    ) -> Iterator[tuple[str, str]]:
+        """
+        Run commands on an open session, yielding (command, output) pairs
+        as the outputs arrive.
+
+        :param ch: opened netmiko ConnectHandler
+        :param commands: commands, or (command, read timeout) pairs
+        :param read_timeout: read timeout of commands without their own
+        """
+        batch = [
+            (c, read_timeout) if isinstance(c, str) else tuple(c)
+            for c in commands
+        ]
+        if self.pipeline_depth > 1 and len(batch) > 1:
+            outputs = self._exec_pipelined(ch, batch)
+        else:
+            outputs = self._exec_sequential(ch, batch)
+        for command, output in outputs:
+            logger.info(f"cmd {self.host} {command}")
+            logger.opt(lazy=True).debug(
+                "{} -> {}", lambda: command, lambda: payload(output))
+            yield command, output
+
+    @staticmethod
+    def _exec_sequential(ch, batch: CommandBatch):
+        for command, timeout in batch:
+            kwargs = {} if timeout is None else {'read_timeout': timeout}
+            yield command, ch.send_command(command, **kwargs)
+
+    def _exec_pipelined(self, ch, batch: CommandBatch):
+        """
+        Keep up to pipeline_depth commands queued on the device, splitting
+        the replies on the prompt, so there is no idle round trip between
+        commands.
+        """
+        prompt = ch.find_prompt()
+        pattern = f"^{re.escape(prompt)}"
+        queued = 0
+        for index, (command, timeout) in enumerate(batch):
+            while queued < len(batch) and queued - index < self.pipeline_depth:
+                ch.write_channel(ch.normalize_cmd(batch[queued][0]))
+                queued += 1
+            reply = ch.read_until_pattern(
+                pattern=pattern,
+                read_timeout=timeout or DEFAULT_READ_TIMEOUT,
+                re_flags=re.M,
+            )
+            output = ch.normalize_linefeeds(reply)
+            output = ch.strip_command(command, output)
+            output = ch.strip_prompt(output)
+            yield command, output
+
+    def iter_commands(
+            self,
+            commands: Commands,
+            read_timeout: Optional[float] = None,
+    ) -> Iterator[tuple[str, str]]:
+        """ exec_commands over a session of its own """
+        with (
+            payload_logging(self.payload_log_limit),
+            self.get_ssh_handler() as ch,
+        ):
+            yield from self.exec_commands(ch, commands, read_timeout)
+
+    def send_commands(
+            self,
+            commands: Commands,
+            read_timeout: Optional[float] = None,
+    ) -> list[str]:
+        """ Outputs of the commands, all run over a single session """
+        return [out for _, out in self.iter_commands(commands, read_timeout)]
+
     def __str__(self):
         return f"{self.__class__.__name__} for {self.netmiko_kw}"
 
@@ -70,10 +405,36 @@ class PlatformHandler:
         if callable(self.proto_transfer_spec):
             spec = self.proto_transfer_spec(proto)
             if spec:
-                fti.__dict__.update(asdict(spec))
+                fti.set_destination(spec)
                 return True
         return None
 
+    def has_transfer_destination(self, proto: str) -> bool:
+        spec = self.proto_transfer_spec
+        if hasattr(spec, 'pick'):
+            return spec.pick(proto, self.site) is not None
+        return callable(spec) and bool(spec(proto))
+
+    @contextmanager
+    def transfer_destination(
+            self,
+            proto: str,
+            fti: FileTransferInfo
+    ) -> Iterator[bool]:
+        """
+        Set the destination of proto in fti for one transfer, yields whether
+        there is one. Pooled specs lease it, the transfer failed when the
+        context is left with a FileTransferError.
+        """
+        spec = self.proto_transfer_spec
+        if not hasattr(spec, 'lease'):
+            yield bool(self.setup_proto_transfer(proto, fti))
+            return
+        with spec.lease(proto, site=self.site) as param:
+            if param:
+                fti.set_destination(param)
+            yield bool(param)
+
     def command_transfer(
             self,
             ch: ConnectHandler,
@@ -91,17 +452,83 @@ class PlatformHandler:
         :param cmd: command to execute to transfer the file
         :return: destination file when success, None otherwise
         """
-        if not self.setup_proto_transfer(cmd.proto, fti):
+        if not self.has_transfer_destination(cmd.proto):
             return None
-        if not fti.persisted and cmd.indirect_source:
-            self.persist_configuration(ch, fti)
-            fti.persisted = True
-        output = cmd.exec_prompt_command(ch, fti)
-        if output is None:
-            raise fti.fail()
-        if output is not None:
+        # persisted before leasing the destination, its failures are not
+        # those of the destination
+        if cmd.indirect_source:
+            self.ensure_persisted(ch, fti)
+        with self.transfer_destination(cmd.proto, fti) as ready:
+            if not ready:
+                return None
+            output = cmd.exec_prompt_command(ch, fti)
+            if output is None:
+                raise fti.fail()
             return fti.check_destination()
-        return None
+
+    def ensure_persisted(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        """
+        Persist the configuration, unless it has been already. A copy left
+        on the device is journaled before it is made, so a run killed while
+        making it still removes it.
+        """
+        if fti.persisted:
+            return
+        journaled = bool(self.journal) and self.leaves_persisted_configuration
+        if journaled:
+            self.locate_persisted_configuration(fti)
+            self.journal.persisted(self.host, fti.dict())
+        try:
+            self.persist_configuration(ch, fti)
+        except Exception:
+            if journaled:
+                # the copy may have been made before the failure
+                self.cleanup_persisted_configuration(ch, fti)
+            raise
+        fti.persisted = True
+
+    def pull_transfer(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> Optional[str]:
+        """
+        Persist the configuration and fetch it from pull_path over SFTP, on
+        a new channel of the SSH session of ch: no transfer server and no
+        second login.
+
+        :return: destination file, None without pull_path or SSH session
+        """
+        import paramiko
+
+        get_transport = getattr(ch.remote_conn, 'get_transport', None)
+        transport = get_transport() if get_transport else None
+        if self.pull_path is None or transport is None:
+            return None
+        self.ensure_persisted(ch, fti)
+        remote_file = fti.format(self.pull_path)
+        local_file = fti.destination_filename
+        fti.make_destination_directory()
+        try:
+            with paramiko.SFTPClient.from_transport(transport) as sftp:
+                if self.deadline is not None:
+                    sftp.get_channel().settimeout(self.deadline.bound())
+                sftp.get(remote_file, local_file)
+        except (paramiko.SSHException, OSError) as e:
+            raise FileTransferError(f"pulling {remote_file} failed: {e}")
+        logger.info(f"{remote_file} pulled over SFTP")
+        return fti.check_destination()
+
+    def scrape_transfer(self) -> TransferMethod:
+        """ Transfer of the scraper, chunked if enabled and supported """
+        if self.chunked_retrieval and self.chunked_scraper is not None:
+            return partial(
+                self.chunked_scraper.transfer, reconnect=self.reconnect)
+        return self.scraper.transfer
 
     def transfer_methods(self, fti: FileTransferInfo) -> TransferMethods:
         """
@@ -112,13 +539,40 @@ class PlatformHandler:
         return []
 
     def file_transfer(self, ch: ConnectHandler, fti: FileTransferInfo):
+        from netmiko import NetmikoBaseException
+
+        reserve = self.cleanup_time if self.leaves_persisted_configuration else 0
         for transfer in self.transfer_methods(fti):
-            with suppress(FileTransferError, NetmikoBaseException):
-                return transfer(ch, fti)
-            reset_channel(ch)
+            name = transfer_method_name(transfer)
+            if self.deadline is not None:
+                remaining = self.deadline.remaining() - reserve
+                if remaining < self.min_transfer_time:
+                    raise DeadlineError(
+                        f"{remaining + reserve:.0f}s left of the deadline, "
+                        f"{name} and later transfer methods skipped")
+                self.bound_reads(ch, reserve)
+            logger.debug(f"{self.host} trying {name}")
+            try:
+                result = transfer(ch, fti)
+            except (FileTransferError, NetmikoBaseException) as e:
+                logger.info(f"{self.host} {name} failed: {e}")
+                reset_channel(ch)
+                continue
+            if result is not None:
+                self.transfer_method = name
+                if fti.save_deferred:
+                    self.save_if_changed(ch, fti, result)
+                return result
+            # method not applicable, e.g. no destination for its proto
         logger.warning('Could not obtain configuration')
+        if fti.save_deferred:
+            self.save_if_changed(ch, fti, None)
         return None
 
+    def locate_persisted_configuration(self, fti: FileTransferInfo) -> None:
+        """ Set src_volume and src_file of the copy persist_configuration makes """
+        ...
+
     def persist_configuration(
             self,
             ch: ConnectHandler,
@@ -126,6 +580,87 @@ class PlatformHandler:
     ) -> None:
         ...
 
+    def write_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        """ Save the running configuration as the startup configuration """
+        ...
+
+    def startup_matches_running(self, ch: ConnectHandler) -> Optional[bool]:
+        """
+        Cheap check whether the startup configuration equals the running
+        one, None when the platform cannot tell.
+        """
+        return None
+
+    def config_file_digest(self, config_file: str) -> str:
+        """ Digest of a retrieved configuration, without its volatile lines """
+        def is_ignored(line: str) -> bool:
+            if self.scraper is not None and self.scraper.is_ignored_line(line):
+                return True
+            return any(
+                re.search(pattern, line) for pattern in self.volatile_patterns)
+
+        with open(config_file, errors='replace') as f:
+            return config_digest(f.read(), is_ignored)
+
+    def save_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> bool:
+        """
+        Save the running configuration, in persist-if-needed mode only when
+        it differs from the startup configuration.
+
+        Platforms without a cheap check fall back to the digest of the
+        configuration kopimiko retrieved when it saved last, when
+        persist_digests are kept: the save is left to save_if_changed, once
+        the configuration is retrieved. That only notices changes made
+        since kopimiko saved, and is not done when the transfers read the
+        saved configuration.
+
+        :param ch: opened netmiko ConnectHandler
+        :param fti: file transfer information
+        :return: True when write_configuration has been called
+        """
+        if self.persist_if_needed:
+            matches = self.startup_matches_running(ch)
+            if matches is None and self.persist_digests is not None and (
+                    not self.saved_configuration_retrieved):
+                fti.save_deferred = True
+                return False
+            if matches:
+                logger.info(f"{self.host} startup configuration is current")
+                return False
+        self.write_configuration(ch, fti)
+        return True
+
+    def save_if_changed(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo,
+            config_file: Optional[str],
+    ) -> bool:
+        """
+        Save the configuration save_configuration left unsaved, unless the
+        configuration retrieved is the one retrieved when it was saved last
+
+        :param config_file: retrieved configuration, None when it was not
+        :return: True when write_configuration has been called
+        """
+        fti.save_deferred = False
+        digest = config_file and self.config_file_digest(config_file)
+        if digest and digest == self.persist_digests.get(self.host):
+            logger.info(f"{self.host} startup configuration is current")
+            return False
+        self.write_configuration(ch, fti)
+        if digest:
+            self.persist_digests[self.host] = digest
+        return True
+
     def remove_persisted_configuration(
             self,
             ch: ConnectHandler,
@@ -133,44 +668,292 @@ class PlatformHandler:
     ) -> None:
         ...
 
-    @contextmanager
-    def get_configuration(self) -> Iterator[str]:
-        fti = self.fti_class()
-        fti.prepare_destination(self.netmiko_kw)
+    def diff_configuration(
+            self,
+            config_file: str,
+            previous: str,
+            **kwargs
+    ) -> Optional[ConfigDiff]:
+        """
+        Summarize the changes of a retrieved configuration against the
+        previous backup, leaving out the lines the scraper ignores.
+
+        :param config_file: newly retrieved configuration
+        :param previous: previously stored configuration
+        :param kwargs: passed on to diff_config_files (context, max_lines)
+        :return: ConfigDiff, None when there is no previous backup
+        """
+        if not os.path.isfile(previous):
+            return None
+        is_ignored = self.scraper.is_ignored_line if self.scraper else None
+        return diff_config_files(previous, config_file, is_ignored, **kwargs)
+
+    def cleanup_persisted_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> bool:
+        try:
+            self.remove_persisted_configuration(ch, fti)
+        except Exception as e:
+            logger.warning(f"cleanup on {self.host} failed: {e}")
+            return False
+        if self.journal and self.leaves_persisted_configuration:
+            self.journal.cleaned(self.host, fti.src_file)
+        return True
+
+    def remove_stale_configuration(self, fti_fields: dict[str, Any]) -> bool:
+        """
+        Remove a configuration copy persisted by an interrupted run.
+
+        :param fti_fields: file transfer information of the interrupted run
+        :return: True when the copy has been removed
+        """
+        fti = self.fti_class(**fti_fields)
         with self.get_ssh_handler() as ch:
-            config_file = self.file_transfer(ch, fti)
+            return self.cleanup_persisted_configuration(ch, fti)
+
+    def fingerprint(self, ch: ConnectHandler) -> Optional[str]:
+        """ Digest of the fingerprint_command output, None without one """
+        if self.fingerprint_command is None:
+            return None
+        output = ch.send_command(self.fingerprint_command)
+        output = '\n'.join(
+            line for line in output.splitlines()
+            if line.strip() and not any(
+                re.search(p, line) for p in self.fingerprint_ignore_patterns)
+        )
+        if not output or re_command_error.search(output):
+            logger.warning(f"{self.host} has no fingerprint: {output}")
+            return None
+        return config_digest(output)
+
+    def collect_artifacts(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo,
+            bundle: ArtifactBundle,
+            names: Optional[Collection[str]] = None,
+    ) -> None:
+        """
+        Add the artifacts of the collection to the bundle, next to the
+        running configuration; artifacts equal to the persisted copy of
+        the running configuration are copied from it instead of read.
+
+        :param ch: opened netmiko ConnectHandler
+        :param fti: file transfer information of the running configuration
+        :param bundle: bundle holding the running configuration, if any
+        :param names: artifacts to collect, all of the collection if None
+        """
+        running = bundle.files.get(RUNNING_CONFIG)
+        scrapers = {}
+        for name, scraper in self.collection.items():
+            if names is not None and name not in names:
+                continue
+            local_file = f"{fti.destination_filename}.{name}"
+            if running and fti.persisted and name in self.persisted_artifacts:
+                shutil.copyfile(running, local_file)
+                bundle.files[name] = local_file
+            else:
+                scrapers[name] = scraper
+        if not scrapers:
+            return
+        from netmiko import NetmikoBaseException
+
+        commands = [scraper.command for scraper in scrapers.values()]
+        outputs = self.exec_commands(ch, commands)
+        try:
+            for (name, scraper), (_, output) in zip(scrapers.items(), outputs):
+                local_file = f"{fti.destination_filename}.{name}"
+                scraper.save_filtered_config(local_file, output)
+                bundle.files[name] = local_file
+        except (NetmikoBaseException, OSError) as e:
+            for name in scrapers:
+                if name not in bundle.files:
+                    bundle.errors[name] = f"{type(e).__name__}: {e}"
+            logger.warning(f"collecting artifacts failed: {e}")
+
+    @contextmanager
+    def collect(
+            self,
+            names: Optional[Collection[str]] = None,
+            deadline: Optional[float] = None,
+    ) -> Iterator[ArtifactBundle]:
+        """
+        Retrieve the running configuration and the artifacts of the
+        platform collection over one session. The files are removed when
+        the context is left.
+
+        With fingerprints kept, the running configuration is not retrieved
+        when the fingerprint of the device is the one stored for it, the
+        bundle is marked unchanged instead. The fingerprint is stored once
+        the context is left without an error.
+
+        With a deadline, the connection, every command and the transfer
+        methods are bounded by the time remaining; transfer methods the
+        remaining time cannot cover are skipped, failing with DeadlineError.
+        Removing a persisted copy is given cleanup_time in any case.
+
+        :param names: artifacts to collect besides the running configuration,
+            all of the platform collection if None
+        :param deadline: seconds the retrieval may take in total
+        """
+        fti = self.transfer_info()
+        bundle = ArtifactBundle()
+        with (
+            self.budget(deadline),
+            payload_logging(self.payload_log_limit),
+            self.get_ssh_handler(recorded={
+                'dst_file': fti.dst_file, 'dst_directory': fti.dst_directory,
+            }) as ch,
+        ):
             try:
-                yield config_file
+                if self.fingerprints is not None:
+                    bundle.fingerprint = self.fingerprint(ch)
+                    previous = self.fingerprints.get(self.host)
+                    bundle.unchanged = bool(bundle.fingerprint) and (
+                        bundle.fingerprint == previous)
+                if bundle.unchanged:
+                    logger.info(f"{self.host} unchanged since last backup")
+                else:
+                    config_file = self.file_transfer(ch, fti)
+                    if config_file is not None:
+                        bundle.files[RUNNING_CONFIG] = config_file
+                        bundle.transfer_method = self.transfer_method
+                if names is None or names:
+                    self.bound_reads(ch)
+                    self.collect_artifacts(ch, fti, bundle, names)
+                yield bundle
+                if bundle.fingerprint and RUNNING_CONFIG in bundle.files:
+                    self.fingerprints[self.host] = bundle.fingerprint
             finally:
                 if fti.persisted:
+                    self.bound_reads(ch, floor=self.cleanup_time)
+                    self.cleanup_persisted_configuration(ch, fti)
+                for local_file in bundle.files.values():
                     with suppress(Exception):
-                        self.remove_persisted_configuration(ch, fti)
-                if config_file is not None and os.path.exists(config_file):
-                    with suppress(Exception):
-                        os.unlink(config_file)
+                        os.unlink(local_file)
+
+    def transfer_info(self) -> FileTransferInfo:
+        """
+        File transfer information of a retrieval with a fresh destination,
+        in the directory of the destination layout on transfer destinations,
+        or in a replay the one recorded, as the recorded commands name it
+        """
+        fti = self.fti_class()
+        fti.prepare_destination(self.netmiko_kw)
+        recorded = recording_header(self.replay) if self.replay else {}
+        if recorded.get('dst_file'):
+            fti.dst_file = recorded['dst_file']
+            fti.dst_directory = recorded.get('dst_directory')
+        elif self.destination_layout is not None:
+            fti.dst_directory = self.destination_layout.directory(
+                self.host or '')
+        return fti
+
+    @contextmanager
+    def get_configuration(
+            self,
+            deadline: Optional[float] = None,
+    ) -> Iterator[str]:
+        """ :param deadline: seconds the retrieval may take in total """
+        with self.collect(names=(), deadline=deadline) as bundle:
+            yield bundle.files.get(RUNNING_CONFIG)
 
 
 def is_platform_class(obj):
     return (
-        inspect.isclass(obj)
+        isinstance(obj, type)
         and issubclass(obj, PlatformHandler)
         and obj is not PlatformHandler
     )
 
 
-PlatformClasses = list[Tuple[str, Type[PlatformHandler]]]
+ENTRY_POINT_GROUP = 'kopimiko.platforms'
+
+# platform name -> `module:Class`, modules relative to this package
+PLATFORMS = {
+    'aruba_os': 'aruba_os:ArubaOSPlatform',
+    'ciena_saos': 'ciena_saos:CienaSAOSPlatform',
+    'cisco_ios': 'cisco_ios:CiscoPlatform',
+    'cisco_nxos': 'cisco_nxos:CiscoNxos',
+    'cisco_xr': 'cisco_xr:CiscoPlatform',
+    'hp_comware': 'hp_comware:HpComWarePlatform',
+    'juniper_junos': 'juniper_junos:CiscoPlatform',
+}
+
+PlatformRef = Union[str, 'EntryPoint', Type['PlatformHandler']]
+
+
+class PlatformRegistry:
+    """
+    Maps platform names to handler classes.
+
+    Handler modules are only imported when a platform is first looked up,
+    third-party handlers are picked up from the `kopimiko.platforms` entry
+    point group, e.g. in pyproject.toml:
+
+        [tool.poetry.plugins."kopimiko.platforms"]
+        "acme_os" = "acme_kopimiko.acme:AcmePlatform"
+    """
+    def __init__(self, platforms: dict[str, PlatformRef], group: str = None):
+        self.refs: dict[str, PlatformRef] = dict(platforms)
+        self.group = group
+        self.entry_points_loaded = group is None
+        self._resolved: dict[str, Type[PlatformHandler]] = {}
+
+    def register(self, platform: str, handler: PlatformRef):
+        self.load_entry_points()
+        self.refs[platform] = handler
+        self._resolved.pop(platform, None)
+
+    def load_entry_points(self):
+        if self.entry_points_loaded:
+            return
+        from importlib.metadata import entry_points
+
+        self.entry_points_loaded = True
+        for ep in entry_points(group=self.group):
+            self.refs.setdefault(ep.name, ep)
+
+    @staticmethod
+    def _load(ref: PlatformRef) -> Any:
+        if isinstance(ref, str):
+            module_name, _, class_name = ref.partition(':')
+            module = importlib.import_module(f".{module_name}", __name__)
+            return getattr(module, class_name)
+        if isinstance(ref, type):
+            return ref
+        return ref.load()
+
+    def _resolve(self, platform: str) -> Type[PlatformHandler]:
+        self.load_entry_points()
+        ref = self.refs.get(platform)
+        handler = None
+        if ref is not None:
+            try:
+                handler = self._load(ref)
+            except (ImportError, AttributeError) as e:
+                logger.warning(f"platform `{platform}` cannot be loaded: {e}")
+        if handler is None or not is_platform_class(handler):
+            logger.warning(
+                f"platform `{platform}` not found, falling back to generic")
+            handler = PlatformHandler
+        return handler
+
+    def __getitem__(self, platform: str) -> Type[PlatformHandler]:
+        handler = self._resolved.get(platform)
+        if handler is None:
+            handler = self._resolved[platform] = self._resolve(platform)
+        return handler
+
+    def __contains__(self, platform: str) -> bool:
+        self.load_entry_points()
+        return platform in self.refs
+
+
+platform_registry = PlatformRegistry(PLATFORMS, ENTRY_POINT_GROUP)
 
 
 def get_platform_handler_class(platform: str) -> Type[PlatformHandler]:
-    module_name = f"{__name__}.{platform}"
-    try:
-        mod = importlib.import_module(module_name)
-    except ModuleNotFoundError:
-        classes = None
-    else:
-        platform_classes = inspect.getmembers(mod, is_platform_class)
-        classes = cast(PlatformClasses, platform_classes)
-    if classes:
-        return classes[-1][-1]
-    logger.warning(f"platform `{platform}` not found, falling back to generic")
-    return PlatformHandler
+    return platform_registry[platform]
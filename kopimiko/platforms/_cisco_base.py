@@ -1,9 +1,56 @@
 import re
 
 from kopimiko.comm import ScrapeCommand
+from kopimiko.redact import RedactionRule, Redactor
 
 
 scraper = ScrapeCommand(
     command='show running-config',
     ignore_patterns=[re.compile(r'Building\sconfiguration')]
 )
+
+# timestamps of `show running-config` (IOS, NX-OS)
+volatile_patterns = (
+    re.compile(r'^!\s?Time:'),
+    re.compile(r'^! (Last configuration change|NVRAM config last updated)'),
+)
+
+# IOS, NX-OS and IOS-XR
+redactor = Redactor([
+    RedactionRule(
+        r'(\s*(?:enable |username \S+ (?:.* )?)?(?:secret|password)'
+        r'(?: level \d+)?(?: \d+| encrypted| clear)?) \S+',
+        keywords=('secret', 'password')),
+    # BGP, `neighbor 10.0.0.1 password 7 ...`
+    RedactionRule(
+        r'(\s*neighbor \S+ password(?: \d)?) \S+', keywords=('password',)),
+    RedactionRule(
+        r'(\s*ip ospf message-digest-key \d+ md5(?: \d)?) \S+',
+        keywords=('key',)),
+    RedactionRule(
+        r'(\s*ip ospf authentication-key(?: \d)?) \S+',
+        keywords=('key',)),
+    # SNMPv3 users, `snmp-server user u g v3 auth sha ... priv aes 128 ...`
+    RedactionRule(
+        r'(\s*snmp-server user .* auth (?:md5|sha\S*)) \S+',
+        keywords=('snmp-server user',)),
+    RedactionRule(
+        r'(\s*snmp-server user .* priv(?: (?:des|3des|aes(?:[- ]\d+)?))?) \S+',
+        keywords=('snmp-server user',)),
+    RedactionRule(
+        r'(\s*snmp-server community) \S+', keywords=('community',)),
+    RedactionRule(r'(\s*crypto isakmp key(?: \d)?) \S+', keywords=('key',)),
+    RedactionRule(
+        r'(\s*pre-shared-key(?: local| remote)?(?: \d)?) \S+',
+        keywords=('key',)),
+    RedactionRule(
+        r'(\s*(?:tacacs|radius)-server (?:.* )?key(?: \d)?) \S+',
+        keywords=('key',)),
+    RedactionRule(r'(\s*key(?: \d)?) (?!\d+$)\S+$', keywords=('key',)),
+    RedactionRule(r'(\s*key-string(?: \d)?) \S+', keywords=('key',)),
+])
+
+collection = {
+    'version': ScrapeCommand(command='show version'),
+    'inventory': ScrapeCommand(command='show inventory'),
+}
@@ -1,14 +1,49 @@
+from __future__ import annotations
+
 from functools import partial
-from typing import cast
+from typing import TYPE_CHECKING, Optional, cast
 
 from loguru import logger
-from netmiko import ConnectHandler
 
 from . import FileTransferInfo, PlatformHandler, TransferMethods
 from ..comm import ScrapeCommand, TransferCommand
+from ..redact import RedactionRule, Redactor
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
 
 scraper = ScrapeCommand(command='show config')
 
+redactor = Redactor([
+    RedactionRule(
+        r'(\s*snmp-server community) \S+', keywords=('community',)),
+    RedactionRule(
+        r'(\s*(?:tacacs|radius)-server (?:.* )?key) \S+', keywords=('key',)),
+    RedactionRule(
+        r'(\s*password \S+ user-name \S+ \S+) \S+',
+        keywords=('password',)),
+])
+
+collection = {
+    'startup': ScrapeCommand(command='show startup-config'),
+    'version': ScrapeCommand(command='show version'),
+    'inventory': ScrapeCommand(command='show inventory'),
+}
+
+
+# `show config status`: running configuration is the same as / has been
+# changed and needs to be saved / differs from the startup configuration
+config_status_cmd = 'show config status'
+
+
+def startup_is_current(output: str) -> Optional[bool]:
+    output = output.lower()
+    if 'same as' in output:
+        return True
+    if 'changed' in output or 'differ' in output:
+        return False
+    return None
+
 
 def validate_response(fti: FileTransferInfo, output: str):
     # TODO in both cases you do not get any response,
@@ -18,12 +53,12 @@ def validate_response(fti: FileTransferInfo, output: str):
     fti.fail('Transfer failed')
 
 
-# its first dst_file, then dst_path (if applicable) with ftp
+# the copy persisted on flash, then its destination
 
 transfer_prompts = {'Password': '{password}'}
 transfer_cmd = [
     TransferCommand(
-        command='copy flash: {dst_file} scp: {dst_ip} {username} {dst_file}',
+        command='copy flash: {src_file} scp: {dst_ip} {username} {dst_file}',
         prompts=transfer_prompts,
         proto='scp'
     ),
@@ -41,6 +76,11 @@ transfer_cmd = [
 
 
 class ArubaOSPlatform(PlatformHandler):
+    scraper = scraper
+    collection = collection
+    redactor = redactor
+    persisted_artifacts = ('startup',)
+
     def transfer_methods(self, _: FileTransferInfo) -> TransferMethods:
         methods = [
             *(partial(self.command_transfer, cmd=tc) for tc in transfer_cmd),
@@ -48,18 +88,31 @@ class ArubaOSPlatform(PlatformHandler):
         ]
         return cast(TransferMethods, methods)
 
+    def locate_persisted_configuration(self, fti: FileTransferInfo) -> None:
+        fti.src_file = fti.dst_name
+
     def persist_configuration(
             self,
             ch: ConnectHandler,
             fti: FileTransferInfo
     ) -> None:
-        ch.send_command_timing("write memory")
-        logger.info("Saved running-config to startup-config.")
-        fti.src_file = fti.dst_file
+        self.save_configuration(ch, fti)
+        self.locate_persisted_configuration(fti)
         command = f"copy running-config flash: {fti.src_file}"
         ch.send_command_timing(command)
         logger.info(f"Copied running-config to flash:/{fti.src_file}")
 
+    def write_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        ch.send_command_timing("write memory")
+        logger.info("Saved running-config to startup-config.")
+
+    def startup_matches_running(self, ch: ConnectHandler) -> Optional[bool]:
+        return startup_is_current(ch.send_command(config_status_cmd))
+
     def remove_persisted_configuration(
             self,
             ch: ConnectHandler,
@@ -1,16 +1,25 @@
+from __future__ import annotations
+
 from functools import partial
-from typing import cast
+from typing import TYPE_CHECKING, cast
 
 from loguru import logger
-from netmiko import ConnectHandler
 
 from . import (
     FileTransferInfo, PlatformHandler, TransferCommand,
     FileTransferError, TransferMethods, ScrapeCommand,
 )
 
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
+
 scraper = ScrapeCommand(command='configuration show')
 
+collection = {
+    'version': ScrapeCommand(command='software show'),
+    'inventory': ScrapeCommand(command='chassis show'),
+}
+
 errors_replies = dict.fromkeys({
     'ERROR:.*',
 }, FileTransferError)
@@ -34,6 +43,11 @@ transfer_cmd = [
 
 
 class CienaSAOSPlatform(PlatformHandler):
+    scraper = scraper
+    collection = collection
+    # the transfers copy config/startup-config
+    saved_configuration_retrieved = True
+
     def transfer_methods(self, _: FileTransferInfo) -> TransferMethods:
         methods = [
             *(partial(self.command_transfer, cmd=tc) for tc in transfer_cmd),
@@ -46,5 +60,14 @@ class CienaSAOSPlatform(PlatformHandler):
             ch: ConnectHandler,
             fti: FileTransferInfo
     ) -> None:
+        self.save_configuration(ch, fti)
+
+    def write_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        # SAOS has no cheap check and its transfers read the saved
+        # configuration, it is saved every time
         ch.send_command_timing('configuration save')
         logger.info("Saved configuration")
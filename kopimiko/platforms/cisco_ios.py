@@ -1,13 +1,21 @@
+from __future__ import annotations
+
+import re
+from datetime import datetime
 from functools import partial
-from typing import cast
+from typing import TYPE_CHECKING, Optional, cast
 
 from loguru import logger
-from netmiko import ConnectHandler
 
 from . import FileTransferInfo, PlatformHandler, TransferMethods
-from ._cisco_base import scraper
+from ._cisco_base import (
+    collection, redactor, scraper, volatile_patterns
+)
 from .. import FileTransferError
-from ..comm import TransferCommand
+from ..comm import ScrapeCommand, TransferCommand
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
 
 errors_replies = dict.fromkeys({
     '%Error.*',
@@ -31,6 +39,56 @@ transfer_prompts = errors_replies | {
     'Destination ': '',
 }
 
+# `show running-config` header lines telling whether the startup is current
+config_status_cmd = (
+    'show running-config | include '
+    '^! (Last configuration change|NVRAM config last updated|No configuration)'
+)
+# the header lines changing with the configuration only, unlike the NVRAM
+# line changing with every save, e.g. the one persisting it for a transfer
+config_change_cmd = (
+    'show running-config | include '
+    '^! (Last configuration change|No configuration change)'
+)
+re_last_change = re.compile(
+    r'^! Last configuration change at (?P<at>.+?)(?: by .*)?$', re.M)
+re_nvram_updated = re.compile(
+    r'^! NVRAM config last updated at (?P<at>.+?)(?: by .*)?$', re.M)
+
+
+def parse_config_time(value: str) -> Optional[datetime]:
+    """ `10:11:12.345 UTC Mon Jan 1 2024`, the time zone is left out """
+    parts = value.split()
+    if len(parts) < 5:
+        return None
+    clock = parts[0].split('.')[0]
+    try:
+        return datetime.strptime(
+            f"{clock} {' '.join(parts[-3:])}", '%H:%M:%S %b %d %Y')
+    except ValueError:
+        return None
+
+
+def startup_is_current(output: str) -> Optional[bool]:
+    """
+    Whether the configuration was saved after its last change, according to
+    the header of `show running-config`; None when it does not tell.
+    """
+    if 'No configuration change since last restart' in output:
+        return True
+    change = re_last_change.search(output)
+    if change is None:
+        return None
+    nvram = re_nvram_updated.search(output)
+    if nvram is None:
+        return False
+    saved_at = parse_config_time(nvram['at'])
+    changed_at = parse_config_time(change['at'])
+    if saved_at is None or changed_at is None:
+        return None
+    return saved_at >= changed_at
+
+
 transfer_cmd = [
     TransferCommand(
         command='copy flash:/{src_file} '
@@ -54,6 +112,18 @@ transfer_cmd = [
 
 
 class CiscoPlatform(PlatformHandler):
+    scraper = scraper
+    pipeline_depth = 8
+    collection = collection | {
+        'startup': ScrapeCommand(command='show startup-config'),
+    }
+    persisted_artifacts = ('startup',)
+    redactor = redactor
+    volatile_patterns = volatile_patterns
+    # the last change, `show archive` only changes when archiving is set up
+    # and the configuration saved
+    fingerprint_command = config_change_cmd
+
     def transfer_methods(self, _: FileTransferInfo) -> TransferMethods:
         methods = [
             *(partial(self.command_transfer, cmd=tc) for tc in transfer_cmd),
@@ -68,5 +138,15 @@ class CiscoPlatform(PlatformHandler):
     ) -> None:
         fti.src_volume = 'flash:'
         fti.src_file = 'startup-config'
+        self.save_configuration(ch, fti)
+
+    def write_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
         ch.send_command_timing('write memory')
         logger.info("Saved running-config to startup-config.")
+
+    def startup_matches_running(self, ch: ConnectHandler) -> Optional[bool]:
+        return startup_is_current(ch.send_command(config_status_cmd))
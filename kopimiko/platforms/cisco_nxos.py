@@ -1,5 +1,60 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from functools import partial
+from typing import TYPE_CHECKING, cast
+
+from loguru import logger
+
+from . import FileTransferInfo, TransferMethods
 from .cisco_ios import CiscoPlatform
+from .cisco_ios import transfer_cmd as ios_transfer_cmd
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
+
+# the IOS commands, copying the persisted copy from bootflash
+transfer_cmd = [
+    replace(tc, command=tc.command.replace('flash:/', '{src_volume}'))
+    for tc in ios_transfer_cmd
+]
 
 
 class CiscoNxos(CiscoPlatform):
-    pass
+    # the persisted copy, on the SFTP server of NX-OS (feature sftp-server)
+    pull_path = 'bootflash:{src_file}'
+    # NX-OS has none of the IOS header lines, but the time of the last change
+    fingerprint_command = (
+        'show running-config | include "^!Running configuration last done"')
+
+    def transfer_methods(self, _: FileTransferInfo) -> TransferMethods:
+        methods = [
+            self.pull_transfer,
+            *(partial(self.command_transfer, cmd=tc) for tc in transfer_cmd),
+            self.scraper.transfer,
+        ]
+        return cast(TransferMethods, methods)
+
+    def locate_persisted_configuration(self, fti: FileTransferInfo) -> None:
+        fti.src_volume = 'bootflash:'
+        fti.src_file = fti.dst_name
+
+    def persist_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        self.save_configuration(ch, fti)
+        self.locate_persisted_configuration(fti)
+        ch.send_command_timing(
+            fti.format('copy running-config {src_volume}{src_file}'))
+        logger.info(f"Copied running-config to bootflash:{fti.src_file}")
+
+    def remove_persisted_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        ch.send_command_timing(
+            fti.format('delete {src_volume}{src_file} no-prompt'))
+        logger.info("Cleaned temp file from networkdevice storage.")
@@ -1,16 +1,36 @@
+from __future__ import annotations
+
 from functools import partial
-from typing import cast
+from typing import TYPE_CHECKING, cast
 
 from loguru import logger
-from netmiko import ConnectHandler
 
 from . import (
-    FileTransferInfo, PlatformHandler, PromptCommand,
+    ChunkedScrapeCommand, FileTransferInfo, PlatformHandler, PromptCommand,
     TransferCommand, TransferMethods,
 )
-from ._cisco_base import scraper
+from ._cisco_base import collection, redactor, scraper
 
 import re
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
+
+# XR starts the output of show commands with the time of day
+re_timestamp = re.compile(r'^\w{3} \w{3} +\d+ \d\d:\d\d:\d\d(\.\d+)? \S+$')
+
+# every top-level line is a section, read in the order of the configuration:
+# the lines of a keyword are not together, e.g. `logging`, so reading them by
+# keyword would reorder them; the closing `end` is no section,
+# `show running-config end` is invalid
+chunked_scraper = ChunkedScrapeCommand(
+    command=scraper.command,
+    ignore_patterns=[*scraper.ignore_patterns, re_timestamp],
+    sections_command='show running-config | include "^[a-z]"',
+    section_pattern=re.compile(r'^(?P<section>(?!end\s*$)[a-z].*?)\s*$'),
+    trailer='end\n',
+)
+
 dest_file = {re.compile(r'Destination file\s??name'): ''}
 
 remote_addr = {'Address or name of remote host ': ''}
@@ -60,19 +80,34 @@ transfer_cmd = [
 
 
 class CiscoPlatform(PlatformHandler):
+    scraper = scraper
+    pipeline_depth = 8
+    collection = collection
+    redactor = redactor
+    chunked_scraper = chunked_scraper
+    # the last commit
+    fingerprint_command = 'show configuration commit list 1'
+    fingerprint_ignore_patterns = (re_timestamp,)
+    # the persisted copy, on the SFTP server of XR
+    pull_path = '/disk0:/{src_file}'
+
     def transfer_methods(self, _: FileTransferInfo) -> TransferMethods:
         methods = [
+            self.pull_transfer,
             *(partial(self.command_transfer, cmd=tc) for tc in transfer_cmd),
-            scraper.transfer,
+            self.scrape_transfer(),
         ]
         return cast(TransferMethods, methods)
 
+    def locate_persisted_configuration(self, fti: FileTransferInfo) -> None:
+        fti.src_file = fti.dst_name
+
     def persist_configuration(
             self,
             ch: ConnectHandler,
             fti: FileTransferInfo
     ) -> None:
-        fti.src_file = fti.dst_file
+        self.locate_persisted_configuration(fti)
         command = 'copy running-config disk0:/{src_file}'
         PromptCommand.exec(ch, fti, command, dest_file)
         logger.info("Copied running-config to flash.")
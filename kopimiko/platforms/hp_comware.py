@@ -1,21 +1,51 @@
+from __future__ import annotations
+
 import re
 
 from functools import partial
-from typing import cast
-
-from netmiko import ConnectHandler
+from typing import TYPE_CHECKING, Optional, cast
 
 from . import (
     FileTransferInfo, PlatformHandler, PromptCommand, TransferMethods
 )
 from .. import FileTransferError
 from ..comm import ScrapeCommand, TransferCommand
+from ..redact import RedactionRule, Redactor
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
 
 saved = r"\sNext\smain\sstartup\ssaved-configuration\sfile:\s(?P<filename>.+)$"
 re_saved = re.compile(saved, re.MULTILINE)
 
+# Comware 7 prints nothing when the configurations are equal
+config_diff_cmd = 'display diff current-configuration startup-configuration'
+re_diff_error = re.compile(r'^\s*(%|\^)', re.M)
+
 scraper = ScrapeCommand(command='display current-configuration')
 
+redactor = Redactor([
+    RedactionRule(
+        r'(\s*(?:super )?password(?: role \S+)?(?: simple| cipher| hash)?)'
+        r' \S+',
+        keywords=('password',)),
+    RedactionRule(
+        r'(\s*snmp-agent community(?: read| write)?(?: simple| cipher)?) \S+',
+        keywords=('community',)),
+    RedactionRule(
+        r'(\s*pre-shared-key(?: simple| cipher)?) \S+', keywords=('key',)),
+    RedactionRule(
+        r'(\s*key (?:authentication|authorization|accounting)'
+        r'(?: simple| cipher)?) \S+',
+        keywords=('key',)),
+])
+
+collection = {
+    'startup': ScrapeCommand(command='display saved-configuration'),
+    'version': ScrapeCommand(command='display version'),
+    'inventory': ScrapeCommand(command='display device manuinfo'),
+}
+
 transfer_cmd = [
     TransferCommand(
         command='scp {dst_ip} put {src_file} {dst_file}',
@@ -49,21 +79,40 @@ transfer_cmd = [
 
 
 class HpComWarePlatform(PlatformHandler):
+    scraper = scraper
+    collection = collection
+    redactor = redactor
+    persisted_artifacts = ('startup',)
+
     def persist_configuration(
             self,
             ch: ConnectHandler,
             fti: FileTransferInfo
     ) -> None:
-        # the destination file name has to be extracted implicitly
-        prompts = {'[Y/N]': 'Y', 'unchanged': ''}
-        PromptCommand.exec(ch, fti, 'save main', prompts=prompts)
+        self.save_configuration(ch, fti)
 
+        # the destination file name has to be extracted implicitly
         output = ch.send_command_timing('display startup')
         match = re.search(re_saved, output)
         if match is None:
             raise FileTransferError('cannot determine src_file')
         fti.src_file = match.groupdict()['filename']
 
+    def write_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        prompts = {'[Y/N]': 'Y', 'unchanged': ''}
+        PromptCommand.exec(ch, fti, 'save main', prompts=prompts)
+
+    def startup_matches_running(self, ch: ConnectHandler) -> Optional[bool]:
+        output = ch.send_command(config_diff_cmd)
+        if re_diff_error.search(output):
+            # not supported, e.g. Comware 5
+            return None
+        return not output.strip()
+
     def transfer_methods(self, _: FileTransferInfo) -> TransferMethods:
         methods = [
             *(partial(self.command_transfer, cmd=tc) for tc in transfer_cmd),
@@ -1,17 +1,101 @@
-from typing import cast
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, cast
+
+from loguru import logger
 
 from kopimiko import FileTransferInfo
-from kopimiko.comm import ScrapeCommand
+from kopimiko.comm import ChunkedScrapeCommand, ScrapeCommand
 from kopimiko.platforms import PlatformHandler, TransferMethods
+from kopimiko.redact import REDACTED, RedactionRule, Redactor
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
 
 
 scraper = ScrapeCommand(command='show configuration')
 
+# tags of a deactivated or protected block, `inactive: snmp {`
+re_block_tags = re.compile(r'^(?:(?:inactive|protect): )+')
+
+
+class JunosChunkedScrapeCommand(ChunkedScrapeCommand):
+    """
+    `show configuration system` shows what is inside `system { ... }`,
+    the enclosing block is added back, with its tags like `inactive:`;
+    top-level statements are taken as they are from the list of sections.
+    """
+    def read_section(self, ch, section: str) -> str:
+        if section.endswith(';'):
+            return f"{section}\n"
+        output = super().read_section(ch, re_block_tags.sub('', section))
+        body = ''.join(
+            f"    {line}\n" if line.strip() else '\n'
+            for line in output.splitlines()
+        )
+        return f"{section} {{\n{body}}}\n"
+
+
+chunked_scraper = JunosChunkedScrapeCommand(
+    command=scraper.command,
+    sections_command='show configuration | match "^[a-z]"',
+    section_pattern=(
+        r'^(?P<section>(?:(?:inactive|protect): )*[a-z][\w-]*(?= \{$)'
+        r'|[a-z].*;$)'),
+)
+
+# Junos marks its secrets, the SNMP communities are left
+redactor = Redactor([
+    RedactionRule(
+        r'(.*) "[^"]*"(; ## SECRET-DATA)$', rf'\1 "{REDACTED}"\2',
+        keywords=('SECRET-DATA',)),
+    RedactionRule(r'(\s*community) \S+', keywords=('community',)),
+])
+
+collection = {
+    'version': ScrapeCommand(command='show version'),
+    'inventory': ScrapeCommand(command='show chassis hardware'),
+}
+
 
 class CiscoPlatform(PlatformHandler):
+    scraper = scraper
+    collection = collection
+    redactor = redactor
+    chunked_scraper = chunked_scraper
+    # the last commit
+    fingerprint_command = 'show system commit | match "^0 "'
+    pull_path = '{src_volume}/{src_file}'
+
     def transfer_methods(self, _: FileTransferInfo) -> TransferMethods:
         methods = [
+            self.pull_transfer,
             # TODO: *(partial(self.command_transfer, cmd=tc) for tc in transfer_cmd),
-            scraper.transfer,
+            self.scrape_transfer(),
         ]
         return cast(TransferMethods, methods)
+
+    def locate_persisted_configuration(self, fti: FileTransferInfo) -> None:
+        fti.src_volume = '/var/tmp'
+        fti.src_file = fti.dst_name
+
+    def persist_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        self.locate_persisted_configuration(fti)
+        output = ch.send_command(
+            fti.format('show configuration | save {src_volume}/{src_file}'))
+        if 'Wrote' not in output:
+            fti.fail(f"Saving the configuration failed: {output}")
+        logger.info(f"Saved the configuration to {fti.src_file}")
+
+    def remove_persisted_configuration(
+            self,
+            ch: ConnectHandler,
+            fti: FileTransferInfo
+    ) -> None:
+        ch.send_command(fti.format('file delete {src_volume}/{src_file}'))
+        logger.info("Cleaned temp file from networkdevice storage.")
@@ -0,0 +1,221 @@
+import asyncio
+import errno
+import ipaddress
+import socket
+import threading
+import time
+from contextlib import suppress
+from itertools import islice
+from typing import (
+    Any, Callable, Iterable, Iterator, MutableMapping, Optional
+)
+
+from loguru import logger
+
+from .inventory import DeviceSpec, device_host
+
+# connects in flight at once, each takes a file descriptor, bounded by
+# half the descriptors the process may open, see probe_concurrency
+PREFLIGHT_CONCURRENCY = 1000
+# hostnames resolved at once, by the threads of the default executor; the
+# resolution of a hostname is timed once it has started, not while queued
+RESOLVE_CONCURRENCY = 16
+# devices read ahead from the inventory and probed together
+PREFLIGHT_BATCH = 10_000
+# seconds a probe result is reused, for retries right after a run
+PREFLIGHT_TTL = 120
+# device spec keys of devices reached through something else than a TCP
+# connection of ours, not probed
+INDIRECT_KEYS = ('bastion', 'sock', 'ssh_config_file', 'replay')
+# connect failures telling about this host rather than the device, the
+# device is not known to be unreachable
+INCONCLUSIVE_ERRNOS = frozenset(
+    (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM))
+
+
+class UnreachableError(Exception):
+    pass
+
+
+def probe_concurrency(concurrency: int = PREFLIGHT_CONCURRENCY) -> int:
+    """ concurrency bounded by half the file descriptors of the process """
+    try:
+        import resource
+    except ImportError:
+        return concurrency
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return concurrency
+    return max(min(concurrency, soft // 2), 1)
+
+
+def probe_target(spec: DeviceSpec) -> Optional[tuple[str, int]]:
+    """ host and port connected to for a device, None when not probed """
+    host = device_host(spec)
+    if not host or any(spec.get(key) for key in INDIRECT_KEYS):
+        return None
+    port = spec.get('port')
+    if port is None:
+        device_type = spec.get('device_type') or ''
+        port = 23 if device_type.endswith('_telnet') else 22
+    return host, int(port)
+
+
+class ReachabilityCache:
+    """
+    Probe results per `host:port`, an error or None, reused for ttl seconds.
+    Results are kept in store, e.g. a JsonCache, to be reused by a run
+    retried right after.
+    """
+    def __init__(
+            self,
+            ttl: float = PREFLIGHT_TTL,
+            store: Optional[MutableMapping[str, dict]] = None,
+            clock: Callable[[], float] = time.time,
+    ):
+        self.ttl = ttl
+        self.store = {} if store is None else store
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(target: tuple[str, int]) -> str:
+        return '{}:{}'.format(*target)
+
+    def get(self, target: tuple[str, int]) -> tuple[bool, Optional[str]]:
+        """ :return: whether target is cached, and its error """
+        entry = self.store.get(self.key(target))
+        if entry is None or self.clock() - entry['t'] > self.ttl:
+            return False, None
+        return True, entry['error']
+
+    def set(self, target: tuple[str, int], error: Optional[str]):
+        with self._lock:
+            self.store[self.key(target)] = {'t': self.clock(), 'error': error}
+
+    def expire(self):
+        """ Forget the results older than ttl """
+        now = self.clock()
+        with self._lock:
+            for key in [k for k, v in self.store.items() if now - v['t'] > self.ttl]:
+                del self.store[key]
+
+
+async def resolve(host: str, port: int) -> str:
+    """ First address of host, the one open_connection would connect to """
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return infos[0][4][0]
+
+
+async def probe(
+        host: str,
+        port: int,
+        timeout: float,
+        resolving: Optional[asyncio.Semaphore] = None,
+) -> Optional[str]:
+    """
+    :param resolving: bounds the hostnames resolved at once
+    :return: why a TCP connection to host:port failed, None if it did not
+    :raise OSError: of INCONCLUSIVE_ERRNOS, out of descriptors or buffers,
+        or a resolution that timed out or failed temporarily
+    """
+    address = host
+    with suppress(ValueError):
+        ipaddress.ip_address(host)
+        resolving = None
+    if resolving is not None:
+        async with resolving:
+            try:
+                address = await asyncio.wait_for(resolve(host, port), timeout)
+            except (asyncio.TimeoutError, TimeoutError):
+                raise OSError(
+                    errno.ETIMEDOUT, f"resolving {host} took over {timeout}s")
+            except socket.gaierror as e:
+                if e.errno == socket.EAI_AGAIN:
+                    raise
+                return f"{host}:{port} {type(e).__name__}: {e}"
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(address, port), timeout)
+    # asyncio.TimeoutError is not the builtin one before Python 3.11
+    except (asyncio.TimeoutError, TimeoutError):
+        return f"no answer from {host}:{port} in {timeout}s"
+    except OSError as e:
+        if e.errno in INCONCLUSIVE_ERRNOS:
+            raise
+        return f"{host}:{port} {type(e).__name__}: {e}"
+    writer.close()
+    with suppress(OSError):
+        await writer.wait_closed()
+    return None
+
+
+async def probe_all(
+        targets: Iterable[tuple[str, int]],
+        timeout: float,
+        concurrency: int = PREFLIGHT_CONCURRENCY,
+) -> dict[tuple[str, int], Optional[str]]:
+    """
+    Probe the targets concurrently, up to concurrency at once. Targets
+    probed inconclusively, e.g. out of file descriptors or with a
+    resolution timing out, are left out.
+    """
+    semaphore = asyncio.Semaphore(probe_concurrency(concurrency))
+    resolving = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+    inconclusive = object()
+
+    async def bounded(target: tuple[str, int]) -> Any:
+        async with semaphore:
+            try:
+                return await probe(*target, timeout, resolving)
+            except OSError as e:
+                logger.debug(f"probe of {target[0]} inconclusive: {e}")
+                return inconclusive
+
+    targets = list(dict.fromkeys(targets))
+    errors = await asyncio.gather(*(bounded(target) for target in targets))
+    return {
+        target: error for target, error in zip(targets, errors)
+        if error is not inconclusive
+    }
+
+
+def probe_specs(
+        specs: Iterable[DeviceSpec],
+        timeout: float,
+        cache: Optional[ReachabilityCache] = None,
+        concurrency: int = PREFLIGHT_CONCURRENCY,
+        batch: int = PREFLIGHT_BATCH,
+) -> Iterator[tuple[DeviceSpec, Optional[str]]]:
+    """
+    Devices with the error of a TCP connection to their SSH or telnet port,
+    None for the reachable ones, those reached through a bastion and those
+    probed inconclusively, which are not cached. The devices are probed
+    batch by batch, all of a batch at once, with results of the cache
+    reused and fresh ones stored in it.
+
+    :param timeout: seconds a connection may take
+    """
+    specs = iter(specs)
+    while chunk := list(islice(specs, batch)):
+        targets = [probe_target(spec) for spec in chunk]
+        errors: dict[tuple[str, int], Optional[str]] = {}
+        for target in filter(None, targets):
+            cached, error = cache.get(target) if cache else (False, None)
+            if cached:
+                errors[target] = error
+        probed = [t for t in targets if t is not None and t not in errors]
+        if probed:
+            start = time.monotonic()
+            fresh = asyncio.run(probe_all(probed, timeout, concurrency))
+            down = sum(error is not None for error in fresh.values())
+            logger.info(
+                f"probed {len(fresh)} devices in "
+                f"{time.monotonic() - start:.1f}s, {down} unreachable")
+            if cache is not None:
+                for target, error in fresh.items():
+                    cache.set(target, error)
+            errors.update(fresh)
+        for spec, target in zip(chunk, targets):
+            yield spec, errors.get(target) if target else None
@@ -0,0 +1,219 @@
+import json
+import time
+import weakref
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Optional, TextIO
+
+from loguru import logger
+
+from .redact import Redactor
+from .utils.logs import secret_keeper
+
+if TYPE_CHECKING:
+    from netmiko import ConnectHandler
+    from netmiko.channel import Channel
+
+
+class ReplayError(Exception):
+    pass
+
+
+class SessionRecorder:
+    """
+    JSON Lines recording of the traffic of a netmiko session: a header with
+    the host, device type and base prompt of the session, and the dst_file
+    of a retrieval, reused when replayed, then an event
+    per write and non-empty read with its time since the recording started,
+    e.g. `{"t": 0.52, "op": "read", "data": "r1#"}`.
+
+    The secrets known to secret_keeper are obfuscated; events are flushed
+    as they come, so a hanging session is recorded up to the hang.
+
+    With a redactor, the device output is redacted too. As a secret may
+    span reads, reads are then recorded by whole lines, the rest of a line
+    once the next write comes, e.g. a prompt.
+    """
+    def __init__(
+            self,
+            path: str,
+            redactor: Optional[Redactor] = None,
+            **header: Any
+    ):
+        self.path = path
+        self.redactor = redactor
+        self.start = time.monotonic()
+        self._partial = ''
+        self._file: Optional[TextIO] = open(path, 'w', buffering=1)
+        self._write(header)
+
+    def _write(self, event: dict[str, Any]):
+        if self._file is not None:
+            self._file.write(json.dumps(event) + '\n')
+
+    def _event(self, op: str, data: str):
+        if op == 'read' and self.redactor is not None:
+            data, _ = self.redactor.redact(data)
+        t = round(time.monotonic() - self.start, 3)
+        self._write({'t': t, 'op': op, 'data': secret_keeper.filter_string(data)})
+
+    def _flush_partial(self):
+        if self._partial:
+            self._event('read', self._partial)
+            self._partial = ''
+
+    def record(self, op: str, data: str):
+        if self.redactor is None:
+            self._event(op, data)
+        elif op == 'read':
+            lines, newline, self._partial = (self._partial + data).rpartition('\n')
+            if newline:
+                self._event(op, lines + newline)
+        else:
+            self._flush_partial()
+            self._event(op, data)
+
+    def close(self):
+        if self._file is not None:
+            self._flush_partial()
+            self._file.close()
+            self._file = None
+
+
+class RecordingChannel:
+    """ netmiko channel passing its traffic on to a SessionRecorder """
+    def __init__(self, channel: 'Channel', recorder: SessionRecorder):
+        self.channel = channel
+        self.recorder = recorder
+
+    def read_channel(self) -> str:
+        data = self.channel.read_channel()
+        if data:
+            self.recorder.record('read', data)
+        return data
+
+    def write_channel(self, out_data: str) -> None:
+        self.recorder.record('write', out_data)
+        self.channel.write_channel(out_data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.channel, name)
+
+
+def record_session(
+        ch: 'ConnectHandler',
+        path: str,
+        redactor: Optional[Redactor] = None,
+        **header: Any
+) -> SessionRecorder:
+    """
+    Record the traffic of the open session of ch to path from now on, the
+    recording is closed with ch or by SessionRecorder.close
+
+    :param redactor: redacts the device output recorded
+    :param header: recorded in the header besides the session details,
+        e.g. the file names the commands of the session hold
+    """
+    recorder = SessionRecorder(
+        path, redactor, host=ch.host, device_type=ch.device_type,
+        base_prompt=getattr(ch, 'base_prompt', None), **header)
+    ch.channel = RecordingChannel(ch.channel, recorder)
+    weakref.finalize(ch, recorder.close)
+    return recorder
+
+
+def recording_header(path: str) -> dict[str, Any]:
+    """ Header of a recording, without reading its events """
+    with open(path) as f:
+        line = f.readline()
+    if not line.strip():
+        raise ReplayError(f"{path} is empty")
+    return json.loads(line)
+
+
+def load_recording(path: str) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    """ Header and events of a recording """
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines:
+        raise ReplayError(f"{path} is empty")
+    return lines[0], lines[1:]
+
+
+class ReplayChannel:
+    """
+    netmiko channel replaying the events of a recording. Every write is
+    matched against the next recorded write, obfuscated the same way; the
+    reads recorded after it are returned once their time has come, at
+    speed times the recorded pace, or at once with a speed of 0.
+
+    Recorded reads not read before the next write are returned with the
+    first read after it, as they would have been waiting in the buffer.
+    """
+    def __init__(
+            self,
+            events: list[dict[str, Any]],
+            speed: float = 1.0,
+            strict: bool = True,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.events = deque(events)
+        self.speed = speed
+        self.strict = strict
+        self.clock = clock
+        self.buffer = ''
+        # replay time and recorded time of the last write
+        self._anchor = (clock(), 0.0)
+
+    def _due(self, event: dict[str, Any]) -> bool:
+        if self.speed <= 0:
+            return True
+        now, recorded = self._anchor
+        return self.clock() >= now + (event['t'] - recorded) / self.speed
+
+    def read_channel(self) -> str:
+        while (
+            self.events and self.events[0]['op'] == 'read'
+            and self._due(self.events[0])
+        ):
+            self.buffer += self.events.popleft()['data']
+        data, self.buffer = self.buffer, ''
+        return data
+
+    read_buffer = read_channel
+
+    def write_channel(self, out_data: str) -> None:
+        while self.events and self.events[0]['op'] == 'read':
+            self.buffer += self.events.popleft()['data']
+        if not self.events:
+            raise ReplayError(f"recording ended before writing {out_data!r}")
+        event = self.events.popleft()
+        written = secret_keeper.filter_string(out_data)
+        if written != event['data']:
+            message = f"wrote {written!r}, recorded {event['data']!r}"
+            if self.strict:
+                raise ReplayError(message)
+            logger.warning(f"replay diverges: {message}")
+        self._anchor = (self.clock(), event['t'])
+
+
+def replay_connection(
+        path: str,
+        speed: float = 1.0,
+        strict: bool = True,
+        **kwargs
+) -> 'ConnectHandler':
+    """
+    netmiko connection replaying the recording at path instead of opening a
+    session, see ReplayChannel
+
+    :param kwargs: netmiko connection arguments besides those recorded
+    """
+    from netmiko import ConnectHandler
+
+    header, events = load_recording(path)
+    kwargs.setdefault('device_type', header['device_type'])
+    kwargs.setdefault('host', header['host'])
+    ch = ConnectHandler(auto_connect=False, **kwargs)
+    ch.channel = ReplayChannel(events, speed, strict)
+    ch.base_prompt = header.get('base_prompt')
+    return ch
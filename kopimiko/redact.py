@@ -0,0 +1,111 @@
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional, TextIO
+
+REDACTED = '<removed>'
+
+
+@dataclass(frozen=True)
+class RedactionRule:
+    r"""
+    Pattern matched at the start of a configuration line, the matched part
+    is replaced, e.g. `(\s*snmp-server community) \S+` -> `\1 <removed>`.
+
+    Lines are only matched against the rule when they contain one of its
+    keywords, or all lines when it has none.
+    """
+    pattern: str
+    replacement: str = rf'\1 {REDACTED}'
+    keywords: tuple[str, ...] = ()
+
+
+class Redactor:
+    """
+    Removes secrets from configurations while they are copied.
+
+    The rules are compiled once. The copy is done in blocks of lines, the
+    few lines holding a keyword of the rules are found by substring search
+    and only those are matched against the rules.
+    """
+    block_size = 1 << 20
+
+    def __init__(self, rules: Iterable[RedactionRule]):
+        self.rules = tuple(rules)
+        self._compiled = [
+            (re.compile(f"^(?:{rule.pattern})"), rule.replacement)
+            for rule in self.rules
+        ]
+        self._every_rule = (1 << len(self.rules)) - 1
+        # keyword -> bit mask of its rules, None when a rule has no keywords
+        self._by_keyword: Optional[dict[str, int]] = {}
+        for index, rule in enumerate(self.rules):
+            if not rule.keywords:
+                self._by_keyword = None
+                break
+            for keyword in rule.keywords:
+                mask = self._by_keyword.get(keyword, 0)
+                self._by_keyword[keyword] = mask | 1 << index
+
+    def _apply(self, line: str, rules: int) -> str:
+        for pattern, replacement in self._compiled:
+            if rules & 1 and pattern.match(line):
+                line = pattern.sub(replacement, line, count=1)
+            rules >>= 1
+        return line
+
+    def redact_line(self, line: str) -> str:
+        return self._apply(line, self._every_rule)
+
+    def _candidate_lines(self, text: str) -> dict[tuple[int, int], int]:
+        """ (start, end) of the lines of text holding a keyword -> rules """
+        lines = {}
+        if self._by_keyword is None:
+            start = 0
+            for line in text.splitlines(keepends=True):
+                lines[start, start + len(line)] = self._every_rule
+                start += len(line)
+            return lines
+        for keyword, rules in self._by_keyword.items():
+            found = text.find(keyword)
+            while found >= 0:
+                start = text.rfind('\n', 0, found) + 1
+                end = text.find('\n', found) + 1 or len(text)
+                lines[start, end] = lines.get((start, end), 0) | rules
+                found = text.find(keyword, end)
+        return lines
+
+    def redact(self, text: str) -> tuple[str, int]:
+        """ Redacted text and the number of lines changed """
+        parts, redacted, position = [], 0, 0
+        for (start, end), rules in sorted(self._candidate_lines(text).items()):
+            line = text[start:end]
+            result = self._apply(line, rules)
+            if result != line:
+                parts += (text[position:start], result)
+                position = end
+                redacted += 1
+        if not redacted:
+            return text, 0
+        parts.append(text[position:])
+        return ''.join(parts), redacted
+
+    def copy(self, source: TextIO, dest: TextIO) -> int:
+        """ Copy source to dest redacted, return the number of lines changed """
+        redacted = 0
+        tail = ''
+        while data := source.read(self.block_size):
+            data = tail + data
+            cut = data.rfind('\n') + 1
+            data, tail = data[:cut], data[cut:]
+            text, count = self.redact(data)
+            dest.write(text)
+            redacted += count
+        text, count = self.redact(tail)
+        dest.write(text)
+        return redacted + count
+
+    def copy_file(self, source: str, dest: str) -> int:
+        # line endings and undecodable bytes, e.g. in banners, are kept
+        kwargs = dict(newline='', errors='surrogateescape')
+        with open(source, **kwargs) as src, open(dest, 'w', **kwargs) as dst:
+            return self.copy(src, dst)
@@ -0,0 +1,148 @@
+import csv
+import json
+import math
+import threading
+from array import array
+from collections import defaultdict
+from typing import Any, Iterator, Optional, TextIO
+
+from .runner import BackupResult
+
+FIELDS = (
+    'host', 'platform', 'ok', 'unchanged', 'method', 'size', 'duration',
+    'error_class',
+)
+# columns of strings repeating across devices, stored as codes of a table
+INTERNED = ('platform', 'method', 'error_class')
+
+
+class StringTable:
+    """ Interned strings and their codes, None is code 0 """
+    def __init__(self):
+        self.strings: list[Optional[str]] = [None]
+        self.codes: dict[Optional[str], int] = {None: 0}
+
+    def code(self, string: Optional[str]) -> int:
+        code = self.codes.get(string)
+        if code is None:
+            code = self.codes[string] = len(self.strings)
+            self.strings.append(string)
+        return code
+
+    def __getitem__(self, code: int) -> Optional[str]:
+        return self.strings[code]
+
+
+def error_class(error: Optional[str]) -> Optional[str]:
+    """ Exception class name of a BackupResult error, `Class: message` """
+    if not error:
+        return None
+    name, sep, _ = error.partition(':')
+    return name if sep and name.isidentifier() else 'Error'
+
+
+class RunReport:
+    """
+    Outcome of every device of a run, in columns rather than one object
+    per device: numbers in typed arrays, repeating strings as codes of a
+    StringTable, so a 100k device run takes a few MB. Results can be
+    added from several threads.
+
+        report = RunReport()
+        for result in run_backups(...):
+            report.add(result)
+        report.success_rate('platform')
+        report.percentile(95, by='method')
+    """
+    def __init__(self):
+        self.hosts: list[str] = []
+        self.ok = array('b')
+        self.unchanged = array('b')
+        self.size = array('q')
+        self.duration = array('f')
+        self.tables = {name: StringTable() for name in INTERNED}
+        # codes of the interned columns, up to 65535 strings each
+        self.columns = {name: array('H') for name in INTERNED}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def add(self, result: BackupResult):
+        values = {
+            'platform': result.platform or None,
+            'method': result.method,
+            'error_class': error_class(result.error),
+        }
+        with self._lock:
+            self.hosts.append(result.host)
+            self.ok.append(result.ok)
+            self.unchanged.append(result.unchanged)
+            self.size.append(result.size)
+            self.duration.append(result.duration)
+            for name, value in values.items():
+                self.columns[name].append(self.tables[name].code(value))
+
+    def _groups(self, by: str) -> dict[Optional[str], list[int]]:
+        """ label of the by column -> row indexes """
+        codes: dict[int, list[int]] = defaultdict(list)
+        for index, code in enumerate(self.columns[by]):
+            codes[code].append(index)
+        table = self.tables[by]
+        return {table[code]: rows for code, rows in codes.items()}
+
+    def success_rate(self, by: str = 'platform') -> dict[Optional[str], float]:
+        """ Share of devices backed up, per value of an interned column """
+        ok = self.ok
+        return {
+            label: sum(ok[i] for i in rows) / len(rows)
+            for label, rows in self._groups(by).items()
+        }
+
+    def percentile(
+            self,
+            q: float,
+            column: str = 'duration',
+            by: str = 'method',
+    ) -> dict[Optional[str], float]:
+        """ q-th percentile, nearest rank, of a numeric column per group """
+        values = getattr(self, column)
+        result = {}
+        for label, rows in self._groups(by).items():
+            ordered = sorted(values[i] for i in rows)
+            rank = max(math.ceil(q / 100 * len(ordered)), 1)
+            result[label] = ordered[rank - 1]
+        return result
+
+    def rows(self) -> Iterator[dict[str, Any]]:
+        """ Rows as dicts, built one at a time """
+        tables, columns = self.tables, self.columns
+        for index in range(len(self)):
+            yield {
+                'host': self.hosts[index],
+                'platform': tables['platform'][columns['platform'][index]],
+                'ok': bool(self.ok[index]),
+                'unchanged': bool(self.unchanged[index]),
+                'method': tables['method'][columns['method'][index]],
+                'size': self.size[index],
+                'duration': round(self.duration[index], 3),
+                'error_class': (
+                    tables['error_class'][columns['error_class'][index]]),
+            }
+
+    def write_csv(self, stream: TextIO):
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        writer.writerows(self.rows())
+
+    def write_jsonl(self, stream: TextIO):
+        for row in self.rows():
+            stream.write(json.dumps(row) + '\n')
+
+    def write(self, path: str):
+        """ Write to path, as JSON Lines for `.jsonl`, otherwise CSV """
+        with open(path, 'w', newline='') as f:
+            if path.endswith('.jsonl'):
+                self.write_jsonl(f)
+            else:
+                self.write_csv(f)
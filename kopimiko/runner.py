@@ -0,0 +1,421 @@
+import contextvars
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import (
+    Any, Callable, Collection, Iterable, Iterator, MutableMapping, Optional,
+    TypeVar
+)
+
+from loguru import logger
+
+from .bastion import Bastion
+from .diff import ConfigDiff
+from .file_transfer import (
+    DestinationLayout, FileTransferError, ProtoTransferSpec
+)
+from .inventory import DeviceSpec, device_host, resolve_credentials
+from .journal import RunJournal
+from .platforms import (
+    RUNNING_CONFIG, PlatformHandler, get_platform_handler_class
+)
+from .preflight import ReachabilityCache, UnreachableError, probe_specs
+from .redact import Redactor
+from .utils.logs import capturing_logs, secret_keeper
+
+# netmiko arguments bounded by the per device timeout
+TIMEOUT_KWARGS = ('conn_timeout', 'auth_timeout', 'banner_timeout', 'timeout')
+
+T = TypeVar('T')
+
+
+@dataclass
+class BackupResult:
+    host: str
+    platform: str
+    ok: bool = False
+    method: Optional[str] = None
+    path: Optional[str] = None
+    error: Optional[str] = None
+    duration: float = 0.0
+    diff: Optional[ConfigDiff] = None
+    artifacts: dict[str, str] = field(default_factory=dict)
+    # fingerprint unchanged, path is the previous backup
+    unchanged: bool = False
+    # last log messages of the backup, on failure or when asked for
+    log: Optional[list[str]] = None
+    # bytes of the configuration stored
+    size: int = 0
+
+
+def backup_filename(
+        output_dir: str,
+        host: str,
+        artifact: Optional[str] = None,
+) -> str:
+    name = host.replace(os.sep, '_').replace(':', '_')
+    suffix = f"{artifact}.txt" if artifact else 'cfg'
+    return os.path.join(output_dir, f"{name}.{suffix}")
+
+
+def link_file(source: str, link: str) -> bool:
+    """
+    Hard link source at link, replacing it, when source is a file of ours
+    not linked elsewhere: a file written by a transfer server keeps its
+    owner and mode, the backup is not to share them.
+
+    :return: False when source is to be copied instead
+    """
+    try:
+        stat = os.stat(source)
+        owner = os.geteuid() if hasattr(os, 'geteuid') else stat.st_uid
+        if stat.st_nlink != 1 or stat.st_uid != owner:
+            return False
+        if os.path.lexists(link):
+            os.unlink(link)
+        os.link(source, link)
+    except OSError as e:
+        # other filesystem, or no hard links on it
+        logger.debug(f"copying {source}, not linked: {e}")
+        return False
+    return True
+
+
+def write_partial(
+        local_file: str,
+        target: str,
+        redactor: Optional[Redactor] = None,
+        link: bool = False,
+) -> str:
+    """
+    Copy of local_file next to target, redacted on the way.
+
+    :param link: hard link local_file rather than copying it when there is
+        nothing to redact, for a local_file removed, not rewritten, after
+    """
+    partial_file = f"{target}.part"
+    if redactor is None:
+        if not (link and link_file(local_file, partial_file)):
+            shutil.copyfile(local_file, partial_file)
+    else:
+        redacted = redactor.copy_file(local_file, partial_file)
+        logger.info(f"{redacted} lines redacted in {target}")
+    return partial_file
+
+
+def store_file(
+        local_file: str,
+        target: str,
+        redactor: Optional[Redactor] = None,
+        link: bool = False,
+) -> str:
+    os.replace(write_partial(local_file, target, redactor, link), target)
+    return target
+
+
+def store_backup(
+        handler: PlatformHandler,
+        config_file: str,
+        target: str,
+        result: BackupResult,
+        diff: bool = False,
+        redactor: Optional[Redactor] = None,
+        link: bool = False,
+) -> None:
+    partial_file = write_partial(config_file, target, redactor, link)
+    if diff:
+        # the previous backup is redacted too
+        result.diff = handler.diff_configuration(partial_file, target)
+    os.replace(partial_file, target)
+    result.path = target
+    result.size = os.path.getsize(target)
+
+
+def device_handler(
+        platform: str,
+        kwargs: dict[str, Any],
+        **handler_kwargs
+) -> PlatformHandler:
+    kwargs = resolve_credentials(kwargs)
+    if 'payload_log_limit' in kwargs:
+        limit = kwargs.pop('payload_log_limit')
+        handler_kwargs['payload_log_limit'] = int(limit)
+    if 'site' in kwargs:
+        handler_kwargs['site'] = kwargs.pop('site')
+    bastion = kwargs.pop('bastion', None)
+    if bastion is not None and not isinstance(bastion, Bastion):
+        if isinstance(bastion, dict):
+            bastion = resolve_credentials(bastion)
+        bastion = Bastion.from_spec(bastion)
+    handler_class = get_platform_handler_class(platform)
+    return handler_class(bastion=bastion, **handler_kwargs, **kwargs)
+
+
+def split_spec(spec: DeviceSpec) -> tuple[str, dict[str, Any]]:
+    """ kopimiko platform and netmiko connection arguments of a device """
+    kwargs = dict(spec)
+    platform = kwargs.pop('platform', None) or kwargs.get('device_type', '')
+    return platform, kwargs
+
+
+def backup_device(
+        spec: DeviceSpec,
+        output_dir: str,
+        timeout: Optional[float] = None,
+        proto_transfer_spec: Optional[ProtoTransferSpec] = None,
+        diff: bool = False,
+        journal: Optional[RunJournal] = None,
+        artifacts: Optional[Collection[str]] = (),
+        persist_if_needed: bool = False,
+        persist_digests: Optional[MutableMapping[str, str]] = None,
+        fingerprints: Optional[MutableMapping[str, str]] = None,
+        chunked_retrieval: bool = False,
+        redact: bool = False,
+        payload_log_limit: Optional[int] = None,
+        capture_log: int = 0,
+        keep_log: bool = False,
+        destination_layout: Optional[DestinationLayout] = None,
+        deadline: Optional[float] = None,
+        record_dir: Optional[str] = None,
+) -> BackupResult:
+    """
+    Retrieve the configuration of a single device into output_dir.
+
+    :param spec: netmiko connection arguments, with an optional `platform`
+        when the kopimiko platform differs from the netmiko `device_type`;
+        credential references are resolved only here
+    :param output_dir: directory the backup is stored in as `{host}.cfg`
+    :param timeout: netmiko connection and channel timeouts in seconds
+    :param proto_transfer_spec: destinations of the transfer protocols
+    :param diff: compare the configuration with the previous backup
+    :param journal: journal of the run the backup is part of
+    :param artifacts: artifacts collected besides the configuration,
+        stored as `{host}.{artifact}.txt`; all of the platform if None
+    :param persist_if_needed: save the configuration on the device only when
+        it differs from the startup configuration
+    :param persist_digests: digests of the configurations last saved, per
+        host, for platforms without a cheap check
+    :param fingerprints: configuration fingerprints of the previous backups,
+        per host; the configuration is not retrieved while it is unchanged
+    :param chunked_retrieval: scrape large configurations section by
+        section, on the platforms supporting it
+    :param redact: remove secrets from the stored files, by the rules of
+        the platform, and from the device output of the recordings
+    :param payload_log_limit: characters of device output logged per
+        message, 0 leaves it out; devices may set their own
+        `payload_log_limit`; the `site` of a device selects its transfer
+        destinations in pooled transfer specs
+    :param capture_log: log messages of the backup kept, whatever the log
+        level, and attached to the result when it fails; 0 keeps none
+    :param keep_log: attach the captured messages to successful results too
+    :param destination_layout: directories below the transfer volumes the
+        transferred files are spread over, flat when None
+    :param deadline: seconds the retrieval from the device may take in
+        total, over the connection and every transfer method tried
+    :param record_dir: directory the device sessions are recorded in, for
+        replays, see recording
+    :return: BackupResult, failures are reported in it rather than raised
+    """
+    platform, kwargs = split_spec(spec)
+    host = device_host(kwargs)
+    if timeout:
+        for key in TIMEOUT_KWARGS:
+            kwargs.setdefault(key, timeout)
+    result = BackupResult(host=host, platform=platform)
+    start = time.monotonic()
+    handler = None
+    capture = capturing_logs(capture_log) if capture_log else nullcontext()
+    with capture as captured:
+        try:
+            handler = device_handler(
+                platform, kwargs,
+                proto_transfer_spec=proto_transfer_spec, journal=journal,
+                persist_if_needed=persist_if_needed,
+                persist_digests=persist_digests, fingerprints=fingerprints,
+                chunked_retrieval=chunked_retrieval,
+                payload_log_limit=payload_log_limit,
+                destination_layout=destination_layout,
+                record_dir=record_dir, redact_recordings=redact)
+            redactor = handler.redactor if redact else None
+            if redact and redactor is None:
+                logger.warning(
+                    f"no redaction rules for {platform}, {host} kept")
+            target = backup_filename(output_dir, host)
+            if fingerprints is not None and not os.path.isfile(target):
+                fingerprints.pop(host, None)
+            with (
+                handler.budget(deadline),
+                handler.collect(artifacts) as bundle,
+            ):
+                config_file = bundle.files.get(RUNNING_CONFIG)
+                if bundle.unchanged:
+                    result.path, result.unchanged = target, True
+                elif config_file is None:
+                    raise FileTransferError('could not obtain configuration')
+                else:
+                    # the bundle files are removed, stored ones are linked
+                    store_backup(
+                        handler, config_file, target, result, diff, redactor,
+                        link=True)
+                for name, local_file in bundle.files.items():
+                    if name != RUNNING_CONFIG:
+                        target = backup_filename(output_dir, host, name)
+                        result.artifacts[name] = store_file(
+                            local_file, target, redactor, link=True)
+            for name, error in bundle.errors.items():
+                logger.warning(f"{name} of {host} not collected: {error}")
+            result.method = bundle.transfer_method
+            result.ok = True
+        except Exception as e:
+            error = secret_keeper.filter_string(f"{type(e).__name__}: {e}")
+            result.error = error
+            logger.warning(f"backup of {host} failed: {error}")
+        finally:
+            if handler is not None:
+                handler.release_secrets()
+        if captured is not None and (keep_log or not result.ok):
+            result.log = captured.lines()
+    result.duration = time.monotonic() - start
+    if journal:
+        journal.done(
+            host, result.ok, method=result.method, error=result.error)
+    return result
+
+
+def cleanup_device(spec: DeviceSpec, journal: RunJournal) -> bool:
+    """ Remove the configuration copies interrupted runs left on a device """
+    platform, kwargs = split_spec(spec)
+    host = device_host(kwargs)
+    handler = None
+    try:
+        handler = device_handler(platform, kwargs, journal=journal)
+        removed = [
+            handler.remove_stale_configuration(fti_fields)
+            for fti_fields in list(journal.pending_cleanup.get(host, ()))
+        ]
+        return all(removed)
+    except Exception as e:
+        error = secret_keeper.filter_string(f"{type(e).__name__}: {e}")
+        logger.warning(f"cleanup of {host} failed: {error}")
+        return False
+    finally:
+        if handler is not None:
+            handler.release_secrets()
+
+
+def bounded_map(
+        func: Callable[..., T],
+        items: Iterable[Any],
+        jobs: int,
+        **kwargs
+) -> Iterator[T]:
+    """
+    Apply func to the items in a thread pool, yielding results as they
+    complete. Items are consumed as workers become available, so they are
+    never read ahead by more than a couple per job. Each call runs in a
+    copy of the context of the caller.
+    """
+    pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix='backup')
+    pending = set()
+    try:
+        for item in items:
+            # the workers see the context of the caller, e.g. logfuscator
+            context = contextvars.copy_context()
+            pending.add(pool.submit(context.run, func, item, **kwargs))
+            if len(pending) >= 2 * jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from (future.result() for future in done)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def cleanup_stale(
+        specs: Iterable[DeviceSpec],
+        journal: RunJournal,
+        jobs: int = 10,
+) -> int:
+    """
+    Remove the configuration copies left on devices by an interrupted run.
+
+    :return: number of devices still needing a cleanup
+    """
+    if journal.pending_cleanup:
+        stale = (
+            spec for spec in specs
+            if device_host(spec) in journal.pending_cleanup
+        )
+        for _ in bounded_map(cleanup_device, stale, jobs, journal=journal):
+            pass
+    return len(journal.pending_cleanup)
+
+
+def unreachable_result(
+        spec: DeviceSpec,
+        error: str,
+        journal: Optional[RunJournal] = None,
+) -> BackupResult:
+    """ Failed result of a device the preflight could not reach """
+    platform, kwargs = split_spec(spec)
+    host = device_host(kwargs)
+    result = BackupResult(
+        host=host, platform=platform,
+        error=f"{UnreachableError.__name__}: {error}")
+    logger.warning(f"backup of {host} failed: {result.error}")
+    if journal:
+        journal.done(host, False, error=result.error)
+    return result
+
+
+def run_backups(
+        specs: Iterable[DeviceSpec],
+        jobs: int = 10,
+        journal: Optional[RunJournal] = None,
+        preflight: Optional[float] = None,
+        reachability: Optional[ReachabilityCache] = None,
+        **kwargs
+) -> Iterator[BackupResult]:
+    """
+    Back up devices concurrently, yielding results as they complete.
+
+    :param specs: device specs, see backup_device
+    :param jobs: number of devices backed up in parallel
+    :param journal: journal of the run, devices it lists as finished
+        are skipped
+    :param preflight: probe the TCP port of the devices first, with
+        connections of this many seconds; unreachable devices fail with
+        UnreachableError without taking a worker
+    :param reachability: probe results reused and stored by the preflight
+    :param kwargs: passed on to backup_device
+    """
+    if journal:
+        specs = (
+            spec for spec in specs
+            if not journal.is_finished(device_host(spec))
+        )
+    unreachable: deque[BackupResult] = deque()
+    if preflight:
+        probed = probe_specs(specs, preflight, reachability)
+
+        def reachable_specs() -> Iterator[DeviceSpec]:
+            for spec, error in probed:
+                if error is None:
+                    yield spec
+                else:
+                    unreachable.append(
+                        unreachable_result(spec, error, journal))
+
+        specs = reachable_specs()
+    for result in bounded_map(
+            backup_device, specs, jobs, journal=journal, **kwargs):
+        while unreachable:
+            yield unreachable.popleft()
+        yield result
+    while unreachable:
+        yield unreachable.popleft()
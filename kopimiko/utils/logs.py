@@ -1,7 +1,13 @@
+import asyncio
+import functools
 import logging
-from collections import OrderedDict
+import queue
+import sys
+import threading
+from collections import Counter, OrderedDict, deque
 from contextlib import contextmanager
-from typing import Mapping, Optional, Union
+from contextvars import ContextVar
+from typing import Any, Callable, Mapping, Optional, TextIO, Union
 
 from loguru import logger, _logger
 from loguru._better_exceptions import ExceptionFormatter
@@ -10,6 +16,11 @@ from loguru._better_exceptions import ExceptionFormatter
 SHORT_PWD_LEN = 8
 INDICATOR_LEN = 2
 
+# characters of device output in a log message, 0 leaves the output out
+DEFAULT_PAYLOAD_LIMIT = 2000
+payload_limit: ContextVar[int] = ContextVar(
+    'payload_limit', default=DEFAULT_PAYLOAD_LIMIT)
+
 
 def obfuscate(s: str) -> str:
     if s is not None:
@@ -24,6 +35,38 @@ def obfuscate(s: str) -> str:
     return s
 
 
+@contextmanager
+def payload_logging(limit: Optional[int]):
+    """
+    Limit the device output logged within the context, e.g. of one device;
+    None keeps the limit of the enclosing context.
+    """
+    if limit is None:
+        yield
+        return
+    token = payload_limit.set(limit)
+    try:
+        yield
+    finally:
+        payload_limit.reset(token)
+
+
+def payload(output: Optional[str]) -> str:
+    """
+    repr of device output for a log message, truncated to the payload limit;
+    meant for lazy messages, `logger.opt(lazy=True)`, so it is only built
+    when the message is logged.
+    """
+    if output is None:
+        return repr(output)
+    limit = payload_limit.get()
+    if limit <= 0:
+        return f"<{len(output)} chars>"
+    if len(output) > limit:
+        return f"{output[:limit]!r}... <{len(output)} chars>"
+    return repr(output)
+
+
 class SecretsFilter(logging.Filter):
     def __init__(
             self,
@@ -37,20 +80,55 @@ class SecretsFilter(logging.Filter):
             self._secrets = {secret: obfuscate(secret) for secret in secrets}
         else:
             self._secrets = dict()
+        self._refs = Counter(dict.fromkeys(self._secrets, 1))
+        self._lock = threading.Lock()
         self.order()
 
+    @staticmethod
+    def _ordered(secrets: Mapping[str, str]) -> OrderedDict:
+        keys = sorted(secrets, key=lambda s: -len(s))
+        return OrderedDict((k, secrets[k]) for k in keys)
+
     def order(self):
-        keys = sorted(self._secrets, key=lambda s: -len(s))
-        self._secrets = OrderedDict((k, self._secrets[k]) for k in keys)
+        self._secrets = self._ordered(self._secrets)
 
+    # the secrets mapping is replaced rather than updated, so filter_string
+    # can iterate it from other threads without locking
     def add_secret(self, secret: str, public: Optional[str] = None):
         if secret:
             public = public or obfuscate(secret)
-            self._secrets[secret] = public
-            self.order()
+            with self._lock:
+                self._refs[secret] += 1
+                if self._secrets.get(secret) != public:
+                    secrets = dict(self._secrets)
+                    secrets[secret] = public
+                    self._secrets = self._ordered(secrets)
+
+    def remove_secret(self, secret: str):
+        """ Forget a secret once every add_secret of it has been undone """
+        if secret:
+            with self._lock:
+                self._refs[secret] -= 1
+                if self._refs[secret] > 0:
+                    return
+                del self._refs[secret]
+                secrets = self._secrets.copy()
+                secrets.pop(secret, None)
+                self._secrets = secrets
+
+    @contextmanager
+    def keep(self, *secrets: str):
+        for secret in secrets:
+            self.add_secret(secret)
+        try:
+            yield
+        finally:
+            for secret in secrets:
+                self.remove_secret(secret)
 
     def filter_string(self, s: str) -> str:
-        for secret, public in self._secrets.items():
+        secrets = self._secrets
+        for secret, public in secrets.items():
             s = s.replace(secret, public)
         return s
 
@@ -64,6 +142,15 @@ class SecretsFilter(logging.Filter):
 
 
 secret_keeper = SecretsFilter()
+# netmiko logs to the `netmiko` logger, guard it without importing netmiko
+logging.getLogger('netmiko').addFilter(secret_keeper)
+
+
+# obfuscation is switched on per context, i.e. per thread or asyncio task,
+# by logfuscator; the hooks doing it are installed into loguru only once
+obfuscating: ContextVar[bool] = ContextVar('obfuscating', default=False)
+_install_lock = threading.Lock()
+_installed = False
 
 
 class SecretExceptionFormatter(ExceptionFormatter):
@@ -75,7 +162,11 @@ class SecretExceptionFormatter(ExceptionFormatter):
         return result
 
     def format_exception(self, *args, **kwargs):
-        for line in super().format_exception(*args, **kwargs):
+        lines = super().format_exception(*args, **kwargs)
+        if not obfuscating.get():
+            yield from lines
+            return
+        for line in lines:
             yield secret_keeper.filter_string(line)
 
 
@@ -91,38 +182,247 @@ class InterceptHandler(logging.Handler):
             level = record.levelno
 
         # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
+        frame, depth = sys._getframe(1), 1
+        while frame and frame.f_code.co_filename == logging.__file__:
             frame = frame.f_back
             depth += 1
 
         opter = logger.opt(depth=depth, exception=record.exc_info)
-        opter.log(level, record.getMessage())
+        opter.log(level, secret_keeper.filter_string(record.getMessage()))
+
+
+# stdlib loggers of the libraries driving the device sessions
+LIBRARY_LOGGERS = ('netmiko', 'paramiko')
+
+
+@contextmanager
+def intercepting(*names: str):
+    """
+    Hand the records of the stdlib loggers names, LIBRARY_LOGGERS by
+    default, to loguru and its sinks while in the context
+    """
+    handler = InterceptHandler()
+    loggers = [logging.getLogger(name) for name in names or LIBRARY_LOGGERS]
+    for stdlib_logger in loggers:
+        stdlib_logger.addHandler(handler)
+    try:
+        yield handler
+    finally:
+        for stdlib_logger in loggers:
+            stdlib_logger.removeHandler(handler)
+
+
+class AsyncSink:
+    """
+    loguru sink handing the messages to a writer thread through a bounded
+    queue, so the backup workers do not wait on slow log I/O.
+
+    Messages are formatted, and their secrets obfuscated, in the thread
+    logging them; only their text is queued. When the queue is full,
+    messages below block_level are dropped, the others wait for room.
+    Both are counted. close() writes out what is queued.
+
+        sink = AsyncSink(sys.stderr)
+        logger.add(sink)
+    """
+    def __init__(
+            self,
+            stream: Union[TextIO, Callable[[str], Any]],
+            maxsize: int = 10_000,
+            block_level: int = logging.WARNING,
+    ):
+        self._write = getattr(stream, 'write', stream)
+        self._flush = getattr(stream, 'flush', None)
+        self.block_level = block_level
+        self.queue: queue.Queue[Optional[str]] = queue.Queue(maxsize)
+        self.dropped = 0
+        self.blocked = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def __call__(self, message: str):
+        text = str(message)
+        try:
+            self.queue.put_nowait(text)
+            return
+        except queue.Full:
+            pass
+        record = getattr(message, 'record', None)
+        if record is not None and record['level'].no < self.block_level:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.blocked += 1
+        self.queue.put(text)
+
+    def _run(self):
+        while True:
+            text = self.queue.get()
+            try:
+                if text is None:
+                    return
+                self._write(text)
+                if self._flush is not None and self.queue.empty():
+                    self._flush()
+            except Exception:
+                self.failed += 1
+            finally:
+                self.queue.task_done()
+
+    def drain(self):
+        """ Wait until the queued messages are written """
+        self.queue.join()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': self.dropped,
+            'blocked': self.blocked,
+            'failed': self.failed,
+        }
+
+    def close(self):
+        """ Write out the queued messages and stop the writer thread """
+        if not self._thread.is_alive():
+            return
+        self.queue.put(None)
+        self._thread.join()
+        if self.dropped:
+            self._write(f"{self.dropped} log messages dropped\n")
+        if self._flush is not None:
+            self._flush()
+
+
+class LogCapture:
+    """
+    Last log messages of a context, e.g. of one device backup, kept in a
+    ring buffer of size messages.
+    """
+    format = '{time:HH:mm:ss.SSS} | {level: <8} | {message}'
+
+    def __init__(self, size: int = 200, level: Union[int, str] = 'DEBUG'):
+        self.messages: deque[str] = deque(maxlen=size)
+        self.level = logger.level(level).no if isinstance(level, str) else level
+        # messages captured, including those pushed out of the buffer
+        self.count = 0
+
+    def append(self, message: str):
+        self.messages.append(message)
+        self.count += 1
+
+    def lines(self) -> list[str]:
+        lines = list(self.messages)
+        if self.count > len(lines):
+            lines.insert(0, f"... {self.count - len(lines)} earlier messages")
+        return lines
+
+
+log_capture: ContextVar[Optional[LogCapture]] = ContextVar(
+    'log_capture', default=None)
+_capture_handler: Optional[int] = None
+
+
+def _capture_filter(record) -> bool:
+    capture = log_capture.get()
+    return capture is not None and record['level'].no >= capture.level
+
+
+def _capture_sink(message):
+    capture = log_capture.get()
+    if capture is not None:
+        capture.append(str(message).rstrip('\n'))
+
+
+def install_capture():
+    """
+    Add the loguru handler feeding the LogCapture of the current context,
+    unless it is still there; it ignores messages outside capturing_logs.
+    """
+    global _capture_handler
+    with _install_lock:
+        if _capture_handler not in logger._core.handlers:
+            _capture_handler = logger.add(
+                _capture_sink, level='DEBUG', format=LogCapture.format,
+                filter=_capture_filter)
+
+
+@contextmanager
+def capturing_logs(size: int = 200, level: Union[int, str] = 'DEBUG'):
+    """
+    Capture the log messages of the current context, whatever the level of
+    the other handlers; secrets are obfuscated as in the other handlers.
+
+        with capturing_logs() as capture:
+            ...
+        capture.lines()
+    """
+    install_capture()
+    capture = LogCapture(size, level)
+    token = log_capture.set(capture)
+    try:
+        yield capture
+    finally:
+        log_capture.reset(token)
+
+
+def install_obfuscation():
+    """
+    Hook the secrets filter into loguru: a patcher for the messages and an
+    exception formatter for the tracebacks of current and future handlers.
+    Done once, the hooks only obfuscate within logfuscator contexts.
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        core = logger._core
+        previous = core.patcher
+
+        def patcher(record):
+            if previous is not None:
+                previous(record)
+            if obfuscating.get():
+                secret_keeper.loguru_filter(record)
+
+        _logger.ExceptionFormatter = SecretExceptionFormatter
+        with core.lock:
+            core.patcher = patcher
+            for h in core.handlers.values():
+                formatter = h._exception_formatter
+                if not isinstance(formatter, SecretExceptionFormatter):
+                    h._exception_formatter = (
+                        SecretExceptionFormatter.from_exception_formatter(
+                            formatter))
+        _installed = True
 
 
 @contextmanager
 def logfuscator():
-    core = logger._core
-    old_exfmt, _logger.ExceptionFormatter = (
-        _logger.ExceptionFormatter, SecretExceptionFormatter)
-    old_patcher, core.patcher = core.patcher, secret_keeper.loguru_filter
-    patcher = SecretExceptionFormatter.from_exception_formatter
-    with core.lock:
-        for h in core.handlers.copy().values():
-            h._exception_formatter = patcher(h._exception_formatter)
+    """
+    Obfuscate the secrets in the log messages of the current context; threads
+    started within it have to be run in a copy of it, see contextvars.
+    """
+    install_obfuscation()
+    token = obfuscating.set(True)
     try:
         yield
     finally:
-        core.patcher = old_patcher
-        _logger.ExceptionFormatter = old_exfmt
-        with core.lock:
-            for h in core.handlers.copy().values():
-                original = getattr(h, 'original_formatter', None)
-                if original:
-                    h._exception_formatter = original
+        obfuscating.reset(token)
 
 
 def logfuscated(func):
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_inner(*args, **kwargs):
+            with logfuscator():
+                return await func(*args, **kwargs)
+        return async_inner
+
+    @functools.wraps(func)
     def inner(*args, **kwargs):
         with logfuscator():
             return func(*args, **kwargs)
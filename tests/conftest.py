@@ -36,12 +36,34 @@ class MockChannel:
         self.response = response
 
 
+class TypeAheadChannel(MockChannel):
+    """ Queues a reply for every line written, like a type-ahead buffer """
+    def __init__(self, use_echo: bool, dialogue: dict[str, str]):
+        super().__init__(use_echo, dialogue)
+        self.replies = []
+
+    def read_channel(self):
+        result, self.replies = ''.join(self.replies), []
+        return result
+
+    def write_channel(self, data: str):
+        for line in data.splitlines():
+            response = self.dialogue.get(line.rstrip(), 'ERROR')
+            self.replies.append(f"{line}\n{response}\n{self.prompt}")
+
+
 @pytest.fixture
 def connection():
     @contextmanager
-    def inner(responses: dict[str, str], ch: ConnectHandler = None):
+    def inner(
+            responses: dict[str, str],
+            ch: ConnectHandler = None,
+            type_ahead: bool = False,
+    ):
+        channel_class = TypeAheadChannel if type_ahead else MockChannel
+
         def open_channel(self):
-            self.channel = MockChannel(self.global_cmd_verify, responses)
+            self.channel = channel_class(self.global_cmd_verify, responses)
 
         with patch(f"{NBC}._open", open_channel):
             with patch('time.sleep', float):
@@ -1,18 +1,21 @@
+import re
 from functools import partial
+from importlib.metadata import EntryPoint
 from typing import cast
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 
-from kopimiko.comm import TransferCommand
+from kopimiko.comm import ScrapeCommand, TransferCommand
+from kopimiko.deadline import DeadlineError
 from kopimiko.platforms import (
-    PlatformHandler, TransferMethod, TransferMethods,
+    PlatformHandler, PlatformRegistry, TransferMethod, TransferMethods,
     get_platform_handler_class
 )
 
 from kopimiko.file_transfer import (
-    FileTransferError, FileTransferInfo,
-    ProtoTransferParam, SimpleTransferSpec
+    DestinationLayout, FileTransferError, FileTransferInfo, PooledTransferSpec,
+    ProtoTransferParam, SimpleTransferSpec, TransferDestination
 )
 
 
@@ -52,6 +55,26 @@ def test_send_command(platform_handler):
         assert ph.send_command('query') == 'reply'
 
 
+commands_chat = {'show a': 'A', 'show b': 'B1\nB2', 'show c': 'C'}
+
+
+@pytest.mark.parametrize('depth', [1, 2, 8])
+def test_send_commands(platform_handler, depth):
+    ph = PlatformHandler()
+    ph.pipeline_depth = depth
+    with platform_handler(commands_chat, type_ahead=True):
+        commands = ['show a', ('show b', 5), 'show c']
+        assert ph.send_commands(commands) == ['A', 'B1\nB2', 'C']
+
+
+def test_iter_commands_yields_as_read(platform_handler):
+    ph = PlatformHandler()
+    with platform_handler(commands_chat):
+        outputs = ph.iter_commands(['show a', 'show c'])
+        assert next(outputs) == ('show a', 'A')
+        assert next(outputs) == ('show c', 'C')
+
+
 def test_transfer_none(caplog):
     fti = FileTransferInfo()
     PlatformHandler().file_transfer(None, fti)
@@ -147,8 +170,397 @@ def test_command_transfer_calls_persist_config(platform_handler, fti, sts, was_p
             persister.assert_called()
 
 
+def test_command_transfer_pooled_destination(platform_handler, tmp_path):
+    pools = {'scp': [
+        TransferDestination(ProtoTransferParam('10.0.0.1', str(tmp_path))),
+        TransferDestination(
+            ProtoTransferParam('10.0.0.2', str(tmp_path / 'ams')), site='ams'),
+    ]}
+    spec = PooledTransferSpec(pools, max_failures=1)
+    fti = FileTransferInfo(dst_file='r1.cfg')
+    (tmp_path / 'ams').mkdir()
+    (tmp_path / 'ams' / 'r1.cfg').write_text('hostname r1\n')
+    tc = TransferCommand(command='copy', proto='scp')
+    with platform_handler({}):
+        ph = MockHandler(proto_transfer_spec=spec, site='ams')
+        with patch.object(tc, 'exec_prompt_command', return_value=''):
+            assert ph.command_transfer(None, fti, tc) == str(
+                tmp_path / 'ams' / 'r1.cfg')
+            fti.dst_file = 'missing.cfg'
+            with pytest.raises(FileTransferError):
+                ph.command_transfer(None, fti, tc)
+    assert fti.dst_ip == '10.0.0.2'
+    assert [d.in_flight for d in pools['scp']] == [0, 0]
+    # the destination of the site is out after the failure
+    assert spec.pick('scp', site='ams') is pools['scp'][0]
+
+
+def test_command_transfer_device_errors(platform_handler, tmp_path):
+    from netmiko import ReadTimeout
+
+    destination = TransferDestination(ProtoTransferParam('10.0.0.1', str(tmp_path)))
+    spec = PooledTransferSpec({'scp': [destination]}, max_failures=1)
+    fti = FileTransferInfo(dst_file='r1.cfg', src_file='startup-config')
+    tc = TransferCommand(command='copy {src_file}', proto='scp')
+    with platform_handler({}):
+        ph = MockHandler(proto_transfer_spec=spec)
+        # neither a failed save nor the session count against the server
+        with patch.object(ph, 'persist_configuration',
+                          side_effect=FileTransferError('write memory failed')):
+            with pytest.raises(FileTransferError):
+                ph.command_transfer(None, fti, tc)
+        fti.persisted = True
+        with patch.object(tc, 'exec_prompt_command', side_effect=ReadTimeout('no prompt')):
+            with pytest.raises(ReadTimeout):
+                ph.command_transfer(None, fti, tc)
+    assert (destination.failures, destination.down_until) == (0, 0.0)
+    assert destination.in_flight == 0
+
+
+def test_file_transfer_deadline(platform_handler, fti):
+    reads = []
+
+    class SlowHandler(MockHandler):
+        def transfer_methods(self, fti):
+            def slow(ch, fti):
+                reads.append(self.read_timeout_cap())
+                # the method takes 20s of the deadline
+                self.deadline.at -= 20
+                raise FileTransferError('timed out')
+            return slow, slow
+
+    ph = SlowHandler()
+    with platform_handler({}):
+        ch = ph.get_ssh_handler()
+        with ph.budget(30):
+            with pytest.raises(DeadlineError, match='slow and later'):
+                ph.file_transfer(ch, fti)
+    assert len(reads) == 1 and 29 < reads[0] <= 30
+    assert ph.deadline is None
+
+
+def test_file_transfer_deadline_hanging_method(fti):
+    timeouts = []
+
+    class Connection:
+        def send_command(self, command_string, read_timeout=10.0):
+            timeouts.append(read_timeout)
+            if command_string == 'hang':
+                # no reply until the read timeout
+                ph.deadline.at -= read_timeout
+                raise FileTransferError('timed out')
+            return 'config'
+
+        def write_channel(self, data):
+            pass
+
+    class HangingHandler(MockHandler):
+        def transfer_methods(self, fti):
+            return (
+                lambda ch, fti: ch.send_command('hang'),
+                lambda ch, fti: ch.send_command('show', read_timeout=60),
+            )
+
+    ph = HangingHandler()
+    ch = Connection()
+    with patch('time.sleep'), ph.budget(30):
+        ph.bound_reads(ch)
+        assert ph.file_transfer(ch, fti) == 'config'
+    # the hang takes its own timeout, not the deadline
+    assert timeouts[0] == 10.0
+    assert 19 < timeouts[1] <= 20
+
+
+def test_get_ssh_handler_deadline():
+    ph = PlatformHandler(host='r1', device_type='cisco_ios', conn_timeout=30)
+    with patch('netmiko.ConnectHandler') as connect_handler:
+        with ph.budget(600):
+            ph.get_ssh_handler()
+        kwargs = connect_handler.call_args.kwargs
+        # netmiko defaults, shortened only
+        assert (kwargs['conn_timeout'], kwargs['banner_timeout']) == (30, 15)
+        assert kwargs['timeout'] == 100
+        assert 'auth_timeout' not in kwargs
+        with ph.budget(5):
+            ph.get_ssh_handler()
+        kwargs = connect_handler.call_args.kwargs
+        assert all(4 < kwargs[k] <= 5 for k in ('conn_timeout', 'banner_timeout', 'timeout'))
+
+
+def test_pull_transfer(tmp_path):
+    class PullHandler(MockHandler):
+        pull_path = '/disk0:/{src_file}'
+
+        def persist_configuration(self, ch, fti):
+            fti.src_file = fti.dst_name
+
+    class FakeSftp:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            pass
+
+        def get(self, remote, local):
+            pulled.append(remote)
+            with open(local, 'w') as f:
+                f.write('hostname r1\n')
+
+    pulled = []
+    ch = MagicMock()
+    fti = FileTransferInfo(dst_volume=str(tmp_path), dst_file='55/r1.cfg')
+    with patch('paramiko.SFTPClient.from_transport', return_value=FakeSftp()):
+        assert PullHandler().pull_transfer(ch, fti) == str(
+            tmp_path / '55' / 'r1.cfg')
+        assert MockHandler().pull_transfer(ch, FileTransferInfo()) is None
+    assert pulled == ['/disk0:/r1.cfg']
+    assert fti.persisted
+
+
 def test_get_platform_handler_class():
     cisco_ios = get_platform_handler_class('cisco_ios')
     assert issubclass(cisco_ios, PlatformHandler)
 
     assert get_platform_handler_class('no no') is PlatformHandler
+
+
+def test_get_platform_handler_class_alias():
+    from kopimiko.platforms.cisco_nxos import CiscoNxos
+    assert get_platform_handler_class('cisco_nxos') is CiscoNxos
+    assert get_platform_handler_class('cisco_nxos') is CiscoNxos
+
+
+def test_platform_registry_entry_points():
+    ep = EntryPoint(
+        name='mock_os', value=f"{__name__}:MockHandler",
+        group='kopimiko.platforms')
+    registry = PlatformRegistry({}, 'kopimiko.platforms')
+    with patch('importlib.metadata.entry_points', return_value=[ep]) as eps:
+        assert registry['mock_os'] is MockHandler
+        assert registry['other_os'] is PlatformHandler
+    eps.assert_called_once()
+
+
+def test_platform_registry_register():
+    registry = PlatformRegistry({'mock_os': 'cisco_ios:CiscoPlatform'})
+    assert registry['mock_os'] is not MockHandler
+    registry.register('mock_os', MockHandler)
+    assert registry['mock_os'] is MockHandler
+    registry.register('bad_os', 'cisco_ios:NoSuchPlatform')
+    assert registry['bad_os'] is PlatformHandler
+
+
+class PersistedFti(MockFti):
+    def prepare_destination(self, netmiko_kw=None):
+        super().prepare_destination(netmiko_kw)
+        self.persisted = True
+
+
+class CollectingHandler(MockHandler):
+    collection = {
+        'startup': ScrapeCommand(command='show startup'),
+        'version': ScrapeCommand(command='show version'),
+    }
+    persisted_artifacts = ('startup',)
+
+
+def test_collect(platform_handler, sts, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.cfg').write_text('running\n')
+    ph = CollectingHandler(proto_transfer_spec=sts, fti_class=PersistedFti)
+    with platform_handler({'transfer': 'ok', 'show version': 'V1'}):
+        with ph.collect() as bundle:
+            assert bundle.transfer_method == 'scp'
+            assert bundle.files == {
+                'running': 'config.cfg',
+                'startup': 'config.cfg.startup',
+                'version': 'config.cfg.version',
+            }
+            assert (tmp_path / 'config.cfg.startup').read_text() == 'running\n'
+            assert (tmp_path / 'config.cfg.version').read_text() == 'V1'
+    assert list(tmp_path.iterdir()) == []
+
+
+class ScrapingHandler(PlatformHandler):
+    scraper = ScrapeCommand(command='show running')
+
+    def transfer_methods(self, fti):
+        return self.scraper.transfer,
+
+
+def test_collect_layout(platform_handler, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    volume = tmp_path / 'volume'
+    layout = DestinationLayout(date_format='%Y', hash_width=1)
+    scp = ProtoTransferParam(dst_ip='localhost', dst_volume=str(volume))
+    ph = ScrapingHandler(host='r1', destination_layout=layout)
+    with platform_handler({'show running': 'hostname r1'}):
+        with ph.collect(names=()) as bundle:
+            # retrieved locally, out of the layout
+            assert '/' not in bundle.files['running']
+    assert list(tmp_path.iterdir()) == []
+
+    volume.mkdir()
+    ph = MockHandler(
+        host='r1', destination_layout=layout, fti_class=MockFti,
+        proto_transfer_spec=SimpleTransferSpec({'scp': scp}))
+    with platform_handler({'transfer': 'ok'}):
+        with ph.collect(names=()) as bundle:
+            assert bundle.files['running'] == layout.path('r1', 'config.cfg')
+    assert (volume / layout.directory('r1')).is_dir()
+
+
+class SavingHandler(MockHandler):
+    scraper = ScrapeCommand(command='show running', ignore_patterns=['Building'])
+    volatile_patterns = ('^! Time',)
+
+    def __init__(self, matches=None, **kwargs):
+        super().__init__(host='10.0.0.1', **kwargs)
+        self.matches = matches
+        self.saved = 0
+
+    def startup_matches_running(self, ch):
+        return self.matches
+
+    def write_configuration(self, ch, fti):
+        self.saved += 1
+
+
+@pytest.mark.parametrize('persist_if_needed, matches, saved', [
+    (False, True, 1),
+    (True, True, 0),
+    (True, False, 1),
+    (True, None, 1),
+])
+def test_save_configuration(persist_if_needed, matches, saved, fti):
+    ph = SavingHandler(matches, persist_if_needed=persist_if_needed)
+    assert ph.save_configuration(None, fti) is bool(saved)
+    assert ph.saved == saved
+
+
+def test_save_configuration_digests(tmp_path, fti):
+    digests = {}
+    running = ['Building\n! Time 1\nhostname a']
+    config_file = tmp_path / 'running.cfg'
+
+    def transfer(ch, fti):
+        ph.save_configuration(ch, fti)
+        config_file.write_text(running[0])
+        return str(config_file)
+
+    def failing(ch, fti):
+        ph.save_configuration(ch, fti)
+        fti.fail()
+
+    ph = SavingHandler(persist_if_needed=True, persist_digests=digests)
+    # no session: the digest is that of the retrieved configuration
+    with patch.object(ph, 'transfer_methods', return_value=[transfer]):
+        assert ph.file_transfer(None, fti) == str(config_file)
+        assert ph.saved == 1
+        assert list(digests) == ['10.0.0.1']
+        running[0] = 'Building\n! Time 2\nhostname a'
+        ph.file_transfer(None, fti)
+        assert ph.saved == 1
+        running[0] = 'Building\n! Time 3\nhostname b'
+        ph.file_transfer(None, fti)
+        assert ph.saved == 2
+    # saved anyway when nothing is retrieved to tell
+    ch = MagicMock()
+    with patch.object(ph, 'transfer_methods', return_value=[failing]):
+        assert ph.file_transfer(ch, fti) is None
+        assert ph.saved == 3
+    ch.send_command.assert_not_called()
+    # nor when the saved configuration is the one retrieved
+    ph.saved_configuration_retrieved = True
+    assert ph.save_configuration(None, fti)
+    assert ph.saved == 4
+    assert not fti.save_deferred
+
+
+@pytest.mark.parametrize('output, expected', [
+    ('! No configuration change since last restart', True),
+    ('! Last configuration change at 10:11:12 UTC Mon Jan 1 2024 by admin\n'
+     '! NVRAM config last updated at 10:12:00.123 UTC Mon Jan 1 2024 by admin', True),
+    ('! Last configuration change at 10:11:12 CEST Tue Jan 2 2024 by admin\n'
+     '! NVRAM config last updated at 10:12:00 CEST Mon Jan 1 2024 by admin', False),
+    ('! Last configuration change at 10:11:12 UTC Mon Jan 1 2024', False),
+    ('', None),
+])
+def test_cisco_ios_startup_is_current(output, expected):
+    from kopimiko.platforms.cisco_ios import startup_is_current
+    assert startup_is_current(output) is expected
+
+
+class IosHeader(dict):
+    """ Header lines of the running configuration of an IOS device """
+    def __init__(self):
+        super().__init__()
+        self.lines = [
+            '! Last configuration change at 10:11:12 UTC Mon Jan 1 2024 by admin']
+
+    def get(self, command, default=None):
+        if command == 'write memory':
+            self.lines[1:] = [
+                f"! NVRAM config last updated at 10:{len(self.lines)}:00 UTC"
+                f" Mon Jan 1 2024 by kopimiko"]
+            return '[OK]'
+        show, _, pattern = command.partition(' | include ')
+        if show != 'show running-config':
+            return default
+        return '\n'.join(line for line in self.lines if re.search(pattern, line))
+
+
+def test_cisco_ios_fingerprint_persisted(connection, fti):
+    from kopimiko.platforms.cisco_ios import CiscoPlatform
+
+    device = IosHeader()
+    ph = CiscoPlatform(host='10.0.0.1')
+    with connection(device) as ch:
+        first = ph.fingerprint(ch)
+        # the first run saves the configuration for its transfer
+        ph.persist_configuration(ch, fti)
+        assert 'NVRAM' in device.lines[-1]
+        second = ph.fingerprint(ch)
+        ph.persist_configuration(ch, fti)
+        assert first is not None and second == first == ph.fingerprint(ch)
+        device.lines[0] = device.lines[0].replace('10:11:12', '11:11:11')
+        assert ph.fingerprint(ch) != first
+
+
+def test_cisco_nxos_fingerprint(connection):
+    from kopimiko.platforms.cisco_nxos import CiscoNxos
+
+    header = 'show running-config | include "^!Running configuration last done"'
+    ph = CiscoNxos(host='10.0.0.1')
+    dialogue = {header: '!Running configuration last done at: Mon Jan  1 10:11:12 2024'}
+    with connection(dialogue) as ch:
+        assert ph.fingerprint(ch) is not None
+
+
+class FingerprintHandler(MockHandler):
+    fingerprint_command = 'show commit'
+    fingerprint_ignore_patterns = ('^Time',)
+
+
+def test_collect_fingerprint(platform_handler, sts, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'config.cfg').write_text('running\n')
+    dialogue = {'transfer': 'ok', 'show commit': 'Time 1\n1000000001 admin'}
+    fingerprints = {}
+    ph = FingerprintHandler(
+        proto_transfer_spec=sts, fti_class=PersistedFti,
+        fingerprints=fingerprints, host='10.0.0.1')
+    with platform_handler(dialogue):
+        with ph.collect(names=()) as bundle:
+            assert not bundle.unchanged
+            assert list(bundle.files) == ['running']
+        assert fingerprints == {'10.0.0.1': bundle.fingerprint}
+
+        (tmp_path / 'config.cfg').write_text('running\n')
+        dialogue['show commit'] = 'Time 2\n1000000001 admin'
+        with ph.collect(names=()) as bundle:
+            assert bundle.unchanged and bundle.files == {}
+
+        dialogue['show commit'] = '% Invalid input detected'
+        with ph.collect(names=()) as bundle:
+            assert not bundle.unchanged and bundle.fingerprint is None
@@ -0,0 +1,138 @@
+import socket
+import threading
+
+import paramiko
+import pytest
+
+from kopimiko.bastion import Bastion, BastionError, BastionPool, bastion_pool
+from kopimiko.platforms import PlatformHandler
+
+
+class StandInServer(paramiko.ServerInterface):
+    """ Bastion accepting one password, echoing on forwarded channels """
+    def __init__(self, stats):
+        self.stats = stats
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if (username, password) == ('jump', 'Jump-Pa55'):
+            self.stats['logins'] += 1
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        self.stats['destinations'].append(destination)
+        return paramiko.OPEN_SUCCEEDED
+
+
+def echo(channel):
+    with channel:
+        while data := channel.recv(1024):
+            channel.sendall(data)
+
+
+@pytest.fixture(scope='module')
+def host_key():
+    return paramiko.RSAKey.generate(1024)
+
+
+@pytest.fixture
+def bastion_server(host_key):
+    stats = {'logins': 0, 'destinations': []}
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    transports = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transports.append(transport)
+            transport.add_server_key(host_key)
+            transport.start_server(server=StandInServer(stats))
+            while (channel := transport.accept()) is not None:
+                threading.Thread(target=echo, args=(channel,)).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    bastion = Bastion(
+        host='127.0.0.1', port=listener.getsockname()[1],
+        username='jump', password='Jump-Pa55', max_channels=2,
+        channel_timeout=2,
+    )
+    yield bastion, stats
+    listener.close()
+    for transport in transports:
+        transport.close()
+
+
+def test_channels_share_transport(bastion_server):
+    bastion, stats = bastion_server
+    pool = BastionPool()
+    try:
+        first = pool.open_channel(bastion, '10.0.0.1', 22)
+        second = pool.open_channel(bastion, '10.0.0.2', '830')
+        for channel in (first, second):
+            channel.sendall(b'show version')
+            assert channel.recv(1024) == b'show version'
+            channel.close()
+        third = pool.open_channel(bastion, '10.0.0.3')
+        third.close()
+        assert stats['logins'] == 1
+        assert stats['destinations'] == [
+            ('10.0.0.1', 22), ('10.0.0.2', 830), ('10.0.0.3', 22)]
+    finally:
+        pool.close()
+
+
+def test_channel_limit(bastion_server):
+    bastion, _ = bastion_server
+    bastion.channel_timeout = 0.1
+    pool = BastionPool()
+    try:
+        channels = [pool.open_channel(bastion, '10.0.0.1') for _ in range(2)]
+        with pytest.raises(BastionError):
+            pool.open_channel(bastion, '10.0.0.1')
+        channels[0].close()
+        channels[0].close()
+        pool.open_channel(bastion, '10.0.0.1').close()
+        channels[1].close()
+    finally:
+        pool.close()
+
+
+def test_handler_uses_bastion(bastion_server):
+    bastion, stats = bastion_server
+    ph = PlatformHandler(
+        bastion=bastion, device_type='cisco_ios', host='10.0.0.9', port=22,
+        username='usr', password='Device-Pa55', conn_timeout=1,
+        auth_timeout=1, banner_timeout=1,
+    )
+    # the echoing stand-in is no SSH server, but the session has to be
+    # opened through the bastion and its channel slot given back
+    with pytest.raises(Exception):
+        ph.get_ssh_handler()
+    assert stats['destinations'] == [('10.0.0.9', 22)]
+    bastion.channel_timeout = 0.1
+    try:
+        for _ in range(bastion.max_channels):
+            bastion_pool.open_channel(bastion, '10.0.0.9')
+    finally:
+        bastion_pool.close()
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('jump.example.net', ('jump.example.net', 22, None)),
+    ('ops@jump.example.net:2222', ('jump.example.net', 2222, 'ops')),
+    ({'host': 'jump', 'port': '22', 'username': 'ops'}, ('jump', 22, 'ops')),
+])
+def test_bastion_from_spec(spec, expected):
+    assert Bastion.from_spec(spec).key == expected
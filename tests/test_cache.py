@@ -0,0 +1,12 @@
+from kopimiko.cache import JsonCache
+
+
+def test_json_cache(tmp_path):
+    path = tmp_path / 'state' / 'cache.json'
+    cache = JsonCache(path)
+    cache['10.0.0.1'] = 'abc'
+    cache.save()
+    assert JsonCache(path) == {'10.0.0.1': 'abc'}
+
+    path.write_text('{"10.0.0.1": ')
+    assert JsonCache(path) == {}
@@ -0,0 +1,93 @@
+import json
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from kopimiko.cli import (
+    EXIT_FAILED, EXIT_OK, EXIT_PARTIAL, EXIT_USAGE, destination_layout, main,
+    transfer_spec
+)
+from kopimiko.runner import BackupResult
+
+
+def fake_backups(specs, **kwargs):
+    for spec in specs:
+        ok = spec['host'] != 'down'
+        yield BackupResult(
+            host=spec['host'], platform='cisco_ios', ok=ok,
+            method='scp' if ok else None, error=None if ok else 'Timeout')
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    def inner(*hosts):
+        path = tmp_path / 'inventory.jsonl'
+        path.write_text(''.join(
+            json.dumps({'host': host, 'device_type': 'cisco_ios'}) + '\n'
+            for host in hosts
+        ))
+        return str(path)
+    return inner
+
+
+@pytest.mark.parametrize('hosts, expected', [
+    (('r1', 'r2'), EXIT_OK),
+    (('r1', 'down'), EXIT_PARTIAL),
+    (('down',), EXIT_FAILED),
+])
+def test_main_exit_codes(inventory, tmp_path, capsys, hosts, expected):
+    argv = [inventory(*hosts), '-o', str(tmp_path / 'out'), '-q']
+    with patch('kopimiko.cli.run_backups', fake_backups):
+        assert main(argv) == expected
+    summary = capsys.readouterr().out
+    assert f"{len(hosts)} devices" in summary
+    if 'down' in hosts:
+        assert 'FAILED down: Timeout' in summary
+
+
+def test_main_sigterm(inventory, tmp_path):
+    argv = [inventory('r1'), '-o', str(tmp_path / 'out'), '-q']
+    handler = signal.getsignal(signal.SIGTERM)
+    with patch('kopimiko.cli.run_backups', fake_backups):
+        assert main(argv) == EXIT_OK
+        assert signal.getsignal(signal.SIGTERM) is handler
+        # signal handlers are left alone off the main thread
+        with ThreadPoolExecutor(1) as pool:
+            assert pool.submit(main, argv).result() == EXIT_OK
+
+
+def test_main_bad_inventory(tmp_path):
+    assert main([str(tmp_path / 'inventory.txt'), '-q']) == EXIT_USAGE
+    with pytest.raises(SystemExit) as e:
+        main([str(tmp_path / 'inventory.csv'), '--transfer', 'scp'])
+    assert e.value.code == EXIT_USAGE
+
+
+def test_transfer_spec(monkeypatch):
+    monkeypatch.setenv('KOPIMIKO_TRANSFER_PASSWORD', 'pwd')
+    spec = transfer_spec(['scp=10.0.0.1:/srv/backup', 'tftp=10.0.0.2'], 'usr')
+    assert spec('scp').dst_volume == '/srv/backup'
+    assert spec('scp').password == 'pwd'
+    assert spec('tftp').dst_ip == '10.0.0.2'
+    assert spec('ftp') is None
+    assert transfer_spec([], None) is None
+
+
+def test_transfer_spec_pool():
+    spec = transfer_spec(
+        ['scp=10.0.0.1:/srv', 'scp=10.0.1.1:/srv,site=ams,weight=2'], None)
+    pool = spec.pools['scp']
+    assert [(d.param.dst_ip, d.site, d.weight) for d in pool] == [
+        ('10.0.0.1', None, 1.0), ('10.0.1.1', 'ams', 2.0)]
+    for transfer in ('scp=10.0.0.1,weight=0', 'scp=10.0.0.1,zone=a'):
+        with pytest.raises(ValueError):
+            transfer_spec([transfer], None)
+
+
+def test_destination_layout(tmp_path):
+    spec = transfer_spec([f"scp=10.0.0.1:{tmp_path}", 'tftp=10.0.0.2'], None)
+    assert destination_layout('flat', spec) is None
+    layout = destination_layout('date-hash', spec)
+    assert len(list((tmp_path / layout.directory('r1')).parent.iterdir())) == 256
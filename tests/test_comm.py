@@ -5,7 +5,9 @@ from unittest.mock import patch
 import pytest
 
 from kopimiko import FileTransferError, FileTransferInfo
-from kopimiko.comm import PromptCommand, ScrapeCommand, TransferCommand
+from kopimiko.comm import (
+    ChunkedScrapeCommand, PromptCommand, ScrapeCommand, TransferCommand
+)
 
 
 def test_mock_connection(connection):
@@ -68,3 +70,119 @@ def test_scrape_command(connection):
 def test_transfer_command_set_indirect_source():
     assert TransferCommand(command='save some_file').indirect_source is False
     assert TransferCommand(command='save {src_file}').indirect_source is True
+
+
+def test_chunked_scrape_command_resumes(connection, tmp_path):
+    from netmiko import ReadTimeout
+
+    sc = ChunkedScrapeCommand(
+        command='show run',
+        ignore_patterns=['Building'],
+        sections_command='show run | include ^[a-z]',
+        section_pattern=r'^(?P<section>interface \S+|[a-z]+)',
+        chunk_read_timeout=5,
+    )
+    dialogue = {
+        'show run | include ^[a-z]':
+            'hostname r1\ninterface Gi0\ninterface Gi1\nrouter bgp 1',
+        'show run hostname': 'Building\nhostname r1',
+        'show run interface Gi0': 'interface Gi0\n shutdown',
+        'show run interface Gi1': 'interface Gi1\n no shutdown',
+        'show run router': 'router bgp 1',
+    }
+    fti = FileTransferInfo(dst_file=str(tmp_path / 'config'))
+    failures = ['show run interface Gi1']
+    sessions = []
+    with connection(dialogue) as ch:
+        send_command = ch.send_command
+
+        def flaky(command, **kwargs):
+            assert kwargs == {'read_timeout': 5}
+            if command in failures:
+                failures.remove(command)
+                raise ReadTimeout('session lost')
+            return send_command(command, **kwargs)
+
+        with patch.object(ch, 'send_command', flaky):
+            result = sc.transfer(ch, fti, reconnect=sessions.append)
+    assert sessions == [ch]
+    assert open(result).read() == (
+        'hostname r1\ninterface Gi0\n shutdown\n'
+        'interface Gi1\n no shutdown\nrouter bgp 1\n'
+    )
+
+
+def test_chunked_scrape_command_fails_without_reconnect(connection, tmp_path):
+    from netmiko import ReadTimeout
+
+    sc = ChunkedScrapeCommand(command='show run', sections_command='sections')
+    fti = FileTransferInfo(dst_file=str(tmp_path / 'config'))
+    with connection({'sections': 'hostname'}) as ch:
+        send_command = ch.send_command
+
+        def lost(command, **kwargs):
+            if command == 'show run hostname':
+                raise ReadTimeout('session lost')
+            return send_command(command, **kwargs)
+
+        with patch.object(ch, 'send_command', lost):
+            with pytest.raises(ReadTimeout):
+                sc.transfer(ch, fti)
+
+
+def test_chunked_scrape_command_rejected_section(connection, tmp_path):
+    sc = ChunkedScrapeCommand(command='show run', sections_command='sections')
+    fti = FileTransferInfo(dst_file=str(tmp_path / 'config'))
+    dialogue = {
+        'sections': 'hostname r1\nbanner motd',
+        'show run hostname': 'hostname r1',
+        'show run banner': '% Invalid input',
+        'show run': 'hostname r1\nbanner motd ^C hi ^C',
+    }
+    with connection(dialogue) as ch:
+        result = sc.transfer(ch, fti)
+    assert open(result).read() == 'hostname r1\nbanner motd ^C hi ^C'
+
+
+def test_chunked_scrape_xr_end(connection, tmp_path):
+    from kopimiko.platforms.cisco_xr import chunked_scraper
+
+    dialogue = {
+        'show running-config | include "^[a-z]"':
+            'hostname r1\nlogging console\ninterface Gi0/0/0/0\n'
+            'router bgp 1\nlogging 10.0.0.1 vrf mgmt\nend',
+        'show running-config hostname r1': 'hostname r1',
+        'show running-config logging console': 'logging console',
+        'show running-config interface Gi0/0/0/0': 'interface Gi0/0/0/0\n shutdown',
+        'show running-config router bgp 1': 'router bgp 1\n!',
+        'show running-config logging 10.0.0.1 vrf mgmt': 'logging 10.0.0.1 vrf mgmt',
+        'show running-config end': "% Invalid input detected at '^' marker.",
+    }
+    fti = FileTransferInfo(dst_file=str(tmp_path / 'config'))
+    with connection(dialogue) as ch:
+        result = chunked_scraper.transfer(ch, fti)
+    # in the order of the configuration, as a full scrape reads it
+    assert open(result).read() == (
+        'hostname r1\nlogging console\ninterface Gi0/0/0/0\n shutdown\n'
+        'router bgp 1\n!\nlogging 10.0.0.1 vrf mgmt\nend\n')
+
+
+def test_chunked_scrape_junos_tags(connection, tmp_path):
+    from kopimiko.platforms.juniper_junos import chunked_scraper
+
+    dialogue = {
+        'show configuration | match "^[a-z]"':
+            'version 21.4R1;\nsystem {\ninactive: snmp {\nprotect: policy-options {',
+        'show configuration system': 'host-name r1;',
+        'show configuration snmp': 'community public;',
+        'show configuration policy-options': 'prefix-list p1;',
+    }
+    fti = FileTransferInfo(dst_file=str(tmp_path / 'config'))
+    with connection(dialogue) as ch:
+        result = chunked_scraper.transfer(ch, fti)
+    assert open(result).read() == (
+        'version 21.4R1;\n'
+        'system {\n    host-name r1;\n}\n'
+        'inactive: snmp {\n    community public;\n}\n'
+        'protect: policy-options {\n    prefix-list p1;\n}\n'
+    )
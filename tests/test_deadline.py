@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import pytest
+
+from kopimiko.deadline import (
+    MIN_TIMEOUT, Deadline, DeadlineError, cap_read_timeouts
+)
+
+
+def test_deadline():
+    with patch('time.monotonic', return_value=100.0):
+        deadline = Deadline.after(30)
+        assert deadline.remaining() == 30
+        assert deadline.bound() == 30
+        assert deadline.bound(10) == 10
+        assert deadline.bound(60) == 30
+        deadline.check('connecting')
+    with patch('time.monotonic', return_value=140.0):
+        assert deadline.remaining() == 0
+        assert deadline.bound(10) == MIN_TIMEOUT
+        with pytest.raises(DeadlineError, match='before connecting'):
+            deadline.check('connecting')
+
+
+def test_cap_read_timeouts():
+    class Connection:
+        def send_command(self, command_string, expect_string=None, read_timeout=10.0):
+            return read_timeout
+
+        def read_channel_timing(self, last_read=2.0, read_timeout=120.0):
+            return read_timeout
+
+    cap = [30.0]
+    ch = Connection()
+    cap_read_timeouts(ch, lambda: cap[0])
+    cap_read_timeouts(ch, lambda: cap[0])
+    assert ch.send_command('show') == 10.0
+    assert ch.send_command('show', None, 60) == 30.0
+    assert ch.read_channel_timing() == 30.0
+    assert ch.read_channel_timing(read_timeout=0) == 30.0
+    cap[0] = None
+    assert ch.read_channel_timing() == 120.0
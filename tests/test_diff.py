@@ -0,0 +1,87 @@
+import difflib
+import re
+
+import pytest
+
+from kopimiko.comm import ScrapeCommand
+from kopimiko.diff import diff_config_files
+from kopimiko.platforms import get_platform_handler_class
+
+
+previous = """\
+Building configuration...
+hostname r1
+interface Gi0/1
+ description uplink
+ shutdown
+!
+interface Gi0/2
+ shutdown
+!
+end
+"""
+
+current = """\
+Building configuration...
+hostname r1
+interface Gi0/1
+ description core uplink
+ no shutdown
+!
+interface Gi0/2
+ shutdown
+!
+interface Loopback0
+ ip address 10.0.0.1 255.255.255.255
+end
+"""
+
+
+@pytest.fixture
+def configs(tmp_path):
+    def inner(old: str, new: str):
+        old_file, new_file = tmp_path / 'old.cfg', tmp_path / 'new.cfg'
+        old_file.write_text(old)
+        new_file.write_text(new)
+        return str(old_file), str(new_file)
+    return inner
+
+
+def test_diff_unchanged(configs):
+    result = diff_config_files(*configs(previous, previous))
+    assert not result.changed
+    assert result.diff == ''
+
+
+def test_diff_matches_difflib(configs):
+    old, new = configs(previous, current)
+    result = diff_config_files(old, new)
+    assert (result.added, result.removed) == (4, 2)
+    expected = difflib.unified_diff(
+        previous.splitlines(), current.splitlines(), old, new, lineterm='')
+    assert result.diff == '\n'.join(expected) + '\n'
+    assert result.truncated is False
+
+
+def test_diff_ignore_patterns(configs):
+    scraper = ScrapeCommand('show run', [re.compile(r'^! Last change')])
+    old, new = configs(
+        '! Last change at 10:00\nhostname r1\n',
+        '! Last change at 11:00\nhostname r1\n',
+    )
+    assert diff_config_files(old, new).changed
+    assert not diff_config_files(old, new, scraper.is_ignored_line).changed
+
+
+def test_diff_truncated(configs):
+    old, new = configs(previous, current)
+    result = diff_config_files(old, new, context=0, max_lines=3)
+    assert result.truncated
+    assert len(result.diff.splitlines()) == 5
+
+
+def test_handler_diff_configuration(configs):
+    old, new = configs('Building configuration...\n' + previous, previous)
+    ph = get_platform_handler_class('cisco_ios')()
+    assert not ph.diff_configuration(new, old).changed
+    assert ph.diff_configuration(new, old + '.missing') is None
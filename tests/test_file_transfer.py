@@ -1,7 +1,12 @@
+from datetime import datetime
 
 import pytest
 
 from kopimiko import FileTransferError, FileTransferInfo
+from kopimiko.file_transfer import (
+    DestinationLayout, PooledTransferSpec, ProtoTransferParam,
+    TransferDestination
+)
 
 
 @pytest.mark.parametrize('fti, expected', [
@@ -28,3 +33,74 @@ def test_fti(tmp_path_factory):
             fti.check_destination()
         f.write('foo')
     assert fti.check_destination() == fti.destination_filename
+
+
+def test_pooled_transfer_spec():
+    now = [0.0]
+    pool = [
+        TransferDestination(ProtoTransferParam('10.0.0.1')),
+        TransferDestination(ProtoTransferParam('10.0.0.2'), weight=2),
+        TransferDestination(ProtoTransferParam('10.0.1.1'), site='ams'),
+    ]
+    spec = PooledTransferSpec(
+        {'scp': pool}, max_failures=2, retry_after=60, clock=lambda: now[0])
+    assert spec('tftp') is None
+    with spec.lease('scp') as first, spec.lease('scp') as second:
+        with spec.lease('scp') as third:
+            assert [d.in_flight for d in pool] == [1, 1, 1]
+        assert (first.dst_ip, second.dst_ip, third.dst_ip) == (
+            '10.0.0.2', '10.0.0.1', '10.0.1.1')
+        with spec.lease('scp') as fourth:
+            assert fourth.dst_ip == '10.0.0.2'
+    with spec.lease('scp', site='ams') as param:
+        assert param.dst_ip == '10.0.1.1'
+    for _ in range(2):
+        with pytest.raises(FileTransferError):
+            with spec.lease('scp', site='ams'):
+                raise FileTransferError('refused')
+    assert spec.pick('scp', site='ams') is not pool[2]
+    now[0] = 61
+    assert spec.pick('scp', site='ams') is pool[2]
+
+
+@pytest.mark.parametrize('layout, expected', [
+    (dict(), '2026/10/19/55/r1.cfg'),
+    (dict(hash_width=0), '2026/10/19/r1.cfg'),
+    (dict(date_format='', hash_width=1), '5/r1.cfg'),
+    (dict(date_format='', hash_width=0), 'r1.cfg'),
+])
+def test_destination_layout(layout, expected):
+    layout = DestinationLayout(date=datetime(2026, 10, 19), **layout)
+    assert layout.path('r1', 'r1.cfg') == expected
+
+
+def test_destination_layout_create(tmp_path):
+    layout = DestinationLayout(date_format='%Y', hash_width=1)
+    assert layout.create(str(tmp_path)) == 16
+    year = str(datetime.now().year)
+    assert sorted(p.name for p in (tmp_path / year).iterdir())[:3] == [
+        '0', '1', '2']
+    with pytest.raises(ValueError):
+        DestinationLayout(hash_width=4)
+
+
+def test_make_destination_directory(tmp_path):
+    fti = FileTransferInfo(dst_volume=str(tmp_path), dst_file='2026/2a/r1.cfg')
+    fti.make_destination_directory()
+    assert (tmp_path / '2026' / '2a').is_dir()
+    assert fti.dst_name == 'r1.cfg'
+    remote = FileTransferInfo(
+        dst_volume=str(tmp_path / 'remote'), dst_file='2a/r1.cfg')
+    remote.make_destination_directory()
+    assert not (tmp_path / 'remote').exists()
+
+
+def test_set_destination(tmp_path):
+    fti = FileTransferInfo(dst_file='r1.cfg', dst_directory='2026/2a')
+    scp = ProtoTransferParam(dst_ip='localhost', dst_volume=str(tmp_path))
+    fti.set_destination(scp)
+    assert fti.dst_file == '2026/2a/r1.cfg'
+    assert (tmp_path / '2026' / '2a').is_dir()
+    # leased again for the next method, the directory is not repeated
+    fti.set_destination(scp)
+    assert fti.dst_file == '2026/2a/r1.cfg'
@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+import kopimiko
+
+
+def test_public_names():
+    for name in kopimiko.__all__:
+        assert getattr(kopimiko, name)
+
+
+def test_import_does_not_load_netmiko():
+    probe = (
+        "import sys, kopimiko; "
+        "kopimiko.get_platform_handler_class('cisco_ios'); "
+        "print('netmiko' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', probe],
+        check=True, capture_output=True, text=True
+    )
+    assert result.stdout.strip() == 'False'
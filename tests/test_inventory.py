@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from kopimiko.inventory import (
+    InventoryError, apply_defaults, load_groups, read_inventory,
+    resolve_credentials
+)
+
+groups = {
+    'core': {'device_type': 'cisco_xr', 'username': 'core'},
+    'lab': {'username': 'lab', 'port': 2222},
+}
+
+
+def test_read_csv(tmp_path):
+    path = tmp_path / 'devices.csv'
+    path.write_text(
+        'host,device_type,group,password\n'
+        'r1,,core,env:PWD\n'
+        'r2,cisco_ios,"core,lab",\n'
+    )
+    devices = read_inventory(path, groups, {'username': 'admin'})
+    assert next(devices) == {
+        'host': 'r1', 'device_type': 'cisco_xr',
+        'username': 'core', 'password': 'env:PWD',
+    }
+    assert next(devices) == {
+        'host': 'r2', 'device_type': 'cisco_ios', 'username': 'lab',
+        'port': 2222,
+    }
+    with pytest.raises(StopIteration):
+        next(devices)
+
+
+def test_read_jsonl(tmp_path):
+    path = tmp_path / 'devices.jsonl'
+    path.write_text(
+        json.dumps({'host': 'r1', 'groups': ['lab']}) + '\n\n{broken\n')
+    devices = read_inventory(path, groups)
+    assert next(devices)['port'] == 2222
+    with pytest.raises(InventoryError):
+        next(devices)
+
+
+def test_read_yaml(tmp_path):
+    pytest.importorskip('yaml')
+    path = tmp_path / 'devices.yaml'
+    path.write_text(
+        'host: r1\n'
+        '---\n'
+        '- {host: r2, group: lab}\n'
+        '- {ip: 10.0.0.3}\n'
+    )
+    hosts = [d.get('host', d.get('ip')) for d in read_inventory(path, groups)]
+    assert hosts == ['r1', 'r2', '10.0.0.3']
+
+
+def test_read_inventory_errors(tmp_path):
+    with pytest.raises(InventoryError):
+        next(read_inventory(tmp_path / 'devices.txt'))
+    path = tmp_path / 'devices.jsonl'
+    path.write_text(json.dumps({'device_type': 'cisco_ios'}))
+    with pytest.raises(InventoryError):
+        next(read_inventory(path))
+    with pytest.raises(InventoryError):
+        apply_defaults({'host': 'r1', 'group': 'wan'}, groups)
+
+
+def test_load_groups(tmp_path):
+    path = tmp_path / 'groups.json'
+    path.write_text(json.dumps(groups))
+    assert load_groups(path) == groups
+
+
+def test_resolve_credentials(tmp_path, monkeypatch):
+    secret_file = tmp_path / 'secret'
+    secret_file.write_text('from-file\n')
+    monkeypatch.setenv('KOPIMIKO_TEST_PWD', 'from-env')
+    spec = {
+        'host': 'env:host',
+        'password': 'env:KOPIMIKO_TEST_PWD',
+        'secret': f"file:{secret_file}",
+        'passphrase': 'plain',
+    }
+    assert resolve_credentials(spec) == {
+        'host': 'env:host',
+        'password': 'from-env',
+        'secret': 'from-file',
+        'passphrase': 'plain',
+    }
+    with pytest.raises(InventoryError):
+        resolve_credentials({'password': 'env:KOPIMIKO_NOT_SET'})
@@ -0,0 +1,107 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from kopimiko.file_transfer import FileTransferError, FileTransferInfo
+from kopimiko.journal import RunJournal
+from kopimiko.platforms import PlatformHandler
+from kopimiko.runner import cleanup_stale, run_backups
+
+
+class MockHandler(PlatformHandler):
+    removed = []
+
+    def get_ssh_handler(self, enabled=False, **kw):
+        return MagicMock()
+
+    def remove_persisted_configuration(self, ch, fti):
+        self.removed.append((self.host, fti.src_file))
+
+
+def test_journal_replay(tmp_path):
+    with RunJournal(str(tmp_path), 'run') as journal:
+        journal.persisted('r1', {'src_file': 'r1.cfg', 'password': 'x'})
+        journal.persisted('r2', {'src_file': 'r2.cfg'})
+        journal.cleaned('r2')
+        journal.done('r2', True)
+        journal.done('r3', False, error='Timeout')
+    with open(journal.path, 'a') as f:
+        f.write('{"host": "r4", "ev')
+
+    journal = RunJournal(str(tmp_path), 'run')
+    assert journal.finished == {'r2'}
+    assert journal.pending_cleanup == {
+        'r1': [{'src_file': 'r1.cfg', 'src_volume': None, 'dst_file': None}]
+    }
+    journal.close()
+
+
+def test_journal_cleanups_per_copy(tmp_path):
+    with RunJournal(str(tmp_path), 'run') as journal:
+        # the cleanup of a.cfg failed, the next backup left and removed b.cfg
+        journal.persisted('r1', {'src_file': 'a.cfg'})
+        journal.persisted('r1', {'src_file': 'b.cfg'})
+        journal.cleaned('r1', 'b.cfg')
+        journal.persisted('r2', {'src_file': 'c.cfg'})
+        journal.persisted('r2', {'src_file': 'd.cfg'})
+        # journaled by earlier versions, for all the copies of a device
+        journal.cleaned('r2')
+    journal = RunJournal(str(tmp_path), 'run')
+    assert journal.pending_cleanup == {
+        'r1': [{'src_file': 'a.cfg', 'src_volume': None, 'dst_file': None}]
+    }
+    journal.close()
+
+
+class PersistingHandler(MockHandler):
+    def locate_persisted_configuration(self, fti):
+        fti.src_file = fti.dst_name
+
+    def persist_configuration(self, ch, fti):
+        raise self.copy_error
+
+
+@pytest.mark.parametrize('copy_error, pending', [
+    # killed while copying: the copy is journaled already
+    (KeyboardInterrupt(), ['r1-a.cfg']),
+    # failed, possibly after copying: removed right away
+    (FileTransferError('copy failed'), []),
+])
+def test_persist_journaled_first(tmp_path, copy_error, pending):
+    MockHandler.removed = []
+    with RunJournal(str(tmp_path), 'run') as journal:
+        handler = PersistingHandler(host='r1', journal=journal)
+        handler.copy_error = copy_error
+        fti = FileTransferInfo(dst_file='2024/r1-a.cfg')
+        with pytest.raises(type(copy_error)):
+            handler.ensure_persisted(MagicMock(), fti)
+        assert not fti.persisted
+    journal = RunJournal(str(tmp_path), 'run')
+    assert [
+        fti['src_file'] for fti in journal.pending_cleanup.get('r1', ())
+    ] == pending
+    assert MockHandler.removed == ([] if pending else [('r1', 'r1-a.cfg')])
+    journal.close()
+
+
+def test_cleanup_stale(tmp_path):
+    with RunJournal(str(tmp_path), 'run') as journal:
+        journal.persisted('r1', {'src_file': 'r1.cfg'})
+        journal.persisted('r1', {'src_file': 'r1-again.cfg'})
+        specs = [{'host': 'r0'}, {'host': 'r1'}]
+        MockHandler.removed = []
+        with patch('kopimiko.runner.get_platform_handler_class',
+                   return_value=MockHandler):
+            assert cleanup_stale(iter(specs), journal) == 0
+        assert MockHandler.removed == [('r1', 'r1.cfg'), ('r1', 'r1-again.cfg')]
+    assert RunJournal(str(tmp_path), 'run').pending_cleanup == {}
+
+
+def test_run_backups_skips_finished(tmp_path):
+    with RunJournal(str(tmp_path), 'run') as journal:
+        journal.done('r1', True)
+        specs = [{'host': 'r1'}, {'host': 'r2'}]
+        with patch('kopimiko.runner.backup_device') as backup:
+            list(run_backups(iter(specs), journal=journal, output_dir='.'))
+        backup.assert_called_once_with(
+            {'host': 'r2'}, journal=journal, output_dir='.')
@@ -1,9 +1,12 @@
 import logging
+import threading
+
 import pytest
 from loguru import logger
 
 from kopimiko.utils.logs import (
-    InterceptHandler, logfuscator, obfuscate, secret_keeper
+    AsyncSink, InterceptHandler, SecretsFilter, capturing_logs, intercepting, logfuscator, obfuscate,
+    payload, payload_logging, secret_keeper
 )
 
 
@@ -57,8 +60,129 @@ def test_obfuscate_catcher(loguscate, caplog):
     assert 'secret' not in caplog.messages[0]
 
 
-def test_classic_logging(loguscate, caplog):
+def test_classic_logging(loguscate, caplog, monkeypatch):
     root_logger = logging.getLogger("")
-    root_logger.handlers = [InterceptHandler()]
+    monkeypatch.setattr(root_logger, 'handlers', [InterceptHandler()])
     root_logger.error('is this secret or what')
     assert 'secret' not in caplog.messages[0]
+
+
+def test_secrets_refcount():
+    secret_keeper.add_secret('Zq7-shared-Kx9')
+    with secret_keeper.keep('Zq7-shared-Kx9', None):
+        assert secret_keeper.filter_string('Zq7-shared-Kx9') == 'Zq**********x9'
+    assert secret_keeper.filter_string('Zq7-shared-Kx9') == 'Zq**********x9'
+    secret_keeper.remove_secret('Zq7-shared-Kx9')
+    assert secret_keeper.filter_string('Zq7-shared-Kx9') == 'Zq7-shared-Kx9'
+
+
+def test_secrets_refcount_initial():
+    keeper = SecretsFilter(secrets={'abc': 'a*c'})
+    keeper.add_secret('zzz')
+    keeper.add_secret('abc', 'a*c')
+    keeper.remove_secret('abc')
+    assert keeper.filter_string('abc zzz') == 'a*c ***'
+    keeper.remove_secret('abc')
+    keeper.remove_secret('zzz')
+    assert keeper.filter_string('abc zzz') == 'abc zzz'
+
+
+@pytest.mark.parametrize('limit, expected', [
+    (None, "'show run'"),
+    (4, "'show'... <8 chars>"),
+    (0, '<8 chars>'),
+])
+def test_payload(limit, expected):
+    with payload_logging(limit):
+        assert payload('show run') == expected
+    assert payload('show run') == "'show run'"
+
+
+def test_logfuscator_is_context_local(caplog):
+    from kopimiko.runner import bounded_map
+
+    secret_keeper.add_secret('Vw4-context-Rt2')
+    inside, outside = threading.Event(), threading.Event()
+
+    def log_outside():
+        inside.wait()
+        logger.info('plain Vw4-context-Rt2')
+        outside.set()
+
+    def log_inside(n):
+        inside.set()
+        outside.wait()
+        logger.info(f'obfuscated {n} Vw4-context-Rt2')
+        return n
+
+    thread = threading.Thread(target=log_outside)
+    thread.start()
+    with logfuscator():
+        assert list(bounded_map(log_inside, [1], jobs=1)) == [1]
+    thread.join()
+    secret_keeper.remove_secret('Vw4-context-Rt2')
+    assert caplog.messages == [
+        'plain Vw4-context-Rt2', 'obfuscated 1 Vw***********t2']
+
+
+def test_async_sink():
+    written, release = [], threading.Event()
+
+    def slow_write(text):
+        release.wait()
+        written.append(text)
+
+    sink = AsyncSink(slow_write, maxsize=1)
+    handler_id = logger.add(sink, format='{message}', level='DEBUG')
+    secret_keeper.add_secret('Kq7-queued-Zt3')
+    try:
+        with logfuscator():
+            logger.info('first Kq7-queued-Zt3')
+        while not sink.queue.empty():
+            pass
+        logger.info('second')
+        logger.debug('dropped')
+        threading.Timer(0.1, release.set).start()
+        logger.warning('waited')
+    finally:
+        logger.remove(handler_id)
+        secret_keeper.remove_secret('Kq7-queued-Zt3')
+    sink.close()
+    assert written == [
+        'first Kq**********t3\n', 'second\n', 'waited\n',
+        '1 log messages dropped\n']
+    assert sink.stats() == {'queued': 0, 'dropped': 1, 'blocked': 1, 'failed': 0}
+
+
+def test_intercepting():
+    written = []
+    sink = AsyncSink(written.append)
+    handler_id = logger.add(sink, format='{function} {message}', level='DEBUG')
+    secret_keeper.add_secret('Rn2-library-Dw6')
+    try:
+        with intercepting() as handler:
+            logging.getLogger('netmiko').warning('login with %s', 'Rn2-library-Dw6')
+            logging.getLogger('paramiko.transport').error('paramiko Rn2-library-Dw6')
+        logging.getLogger('netmiko').warning('not intercepted')
+    finally:
+        logger.remove(handler_id)
+        secret_keeper.remove_secret('Rn2-library-Dw6')
+    sink.close()
+    assert written == [
+        'test_intercepting login with Rn***********w6\n',
+        'test_intercepting paramiko Rn***********w6\n']
+    assert handler not in logging.getLogger('netmiko').handlers
+
+
+def test_capturing_logs(caplog):
+    secret_keeper.add_secret('Jd5-captured-Wq8')
+    with logfuscator(), capturing_logs(size=2) as capture:
+        logger.info('first')
+        logger.debug('second Jd5-captured-Wq8')
+        logger.opt(lazy=True).debug('third {}', lambda: 'payload')
+    logger.info('not captured')
+    secret_keeper.remove_secret('Jd5-captured-Wq8')
+    lines = capture.lines()
+    assert lines[0] == '... 1 earlier messages'
+    assert lines[1].endswith('| DEBUG    | second Jd************q8')
+    assert lines[2].endswith('| DEBUG    | third payload')
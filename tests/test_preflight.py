@@ -0,0 +1,116 @@
+import asyncio
+import errno
+import socket
+from unittest.mock import patch
+
+import pytest
+
+from kopimiko.preflight import (
+    ReachabilityCache, probe_concurrency, probe_specs, probe_target
+)
+
+
+@pytest.fixture
+def ports():
+    """ A listening port and a closed one on localhost """
+    with socket.socket() as listening, socket.socket() as closed:
+        listening.bind(('127.0.0.1', 0))
+        listening.listen()
+        closed.bind(('127.0.0.1', 0))
+        yield listening.getsockname()[1], closed.getsockname()[1]
+
+
+def test_probe_target():
+    assert probe_target(dict(host='r1')) == ('r1', 22)
+    assert probe_target(dict(ip='r1', port='2222')) == ('r1', 2222)
+    assert probe_target(dict(host='r1', device_type='cisco_ios_telnet')) == ('r1', 23)
+    assert probe_target(dict(host='r1', bastion='jump')) is None
+
+
+def test_probe_specs(ports):
+    up, down = ports
+    specs = [
+        dict(host='127.0.0.1', port=up),
+        dict(host='127.0.0.1', port=down),
+        dict(host='127.0.0.1', port=down, bastion='jump'),
+    ]
+    now = [1000.0]
+    cache = ReachabilityCache(ttl=60, clock=lambda: now[0])
+    results = list(probe_specs(specs, timeout=2, cache=cache, batch=2))
+    assert [spec for spec, _ in results] == specs
+    assert results[0][1] is None
+    assert 'ConnectionRefusedError' in results[1][1]
+    assert results[2][1] is None
+    assert cache.get(('127.0.0.1', down)) == (True, results[1][1])
+
+    with patch('kopimiko.preflight.probe_all') as probe_all:
+        again = list(probe_specs(specs[:2], timeout=2, cache=cache))
+    probe_all.assert_not_called()
+    assert again == results[:2]
+
+    now[0] += 61
+    assert cache.get(('127.0.0.1', down)) == (False, None)
+    cache.expire()
+    assert cache.store == {}
+
+
+def test_probe_specs_timeout_and_inconclusive():
+    async def open_connection(host, port):
+        if host == 'dropping':
+            # SYNs dropped, the connection never completes
+            await asyncio.sleep(3600)
+        raise OSError(errno.EMFILE, 'Too many open files')
+
+    async def resolve(host, port):
+        return host
+
+    specs = [dict(host='dropping'), dict(host='r1')]
+    cache = ReachabilityCache()
+    with (
+        patch('asyncio.open_connection', open_connection),
+        patch('kopimiko.preflight.resolve', resolve),
+    ):
+        results = list(probe_specs(specs, timeout=0.1, cache=cache))
+    assert results[0][1] == 'no answer from dropping:22 in 0.1s'
+    # out of descriptors here says nothing about r1: backed up, not cached
+    assert results[1][1] is None
+    assert cache.get(('r1', 22)) == (False, None)
+    assert cache.get(('dropping', 22))[0]
+
+
+def test_probe_specs_resolution(ports):
+    up, _ = ports
+
+    async def resolve(host, port):
+        if host == 'hanging':
+            await asyncio.sleep(3600)
+        if host == 'unknown':
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        if host == 'flaky':
+            raise socket.gaierror(socket.EAI_AGAIN, 'Temporary failure')
+        # slow, one at a time: queued longer than the timeout, not timed out
+        await asyncio.sleep(0.04)
+        return '127.0.0.1'
+
+    hosts = ['hanging', 'unknown', 'flaky', 'r1', 'r2', 'r3', 'r4']
+    specs = [dict(host=host, port=up) for host in hosts]
+    cache = ReachabilityCache()
+    with (
+        patch('kopimiko.preflight.resolve', resolve),
+        patch('kopimiko.preflight.RESOLVE_CONCURRENCY', 1),
+    ):
+        results = dict(
+            (spec['host'], error)
+            for spec, error in probe_specs(specs, timeout=0.1, cache=cache))
+    assert 'gaierror' in results.pop('unknown')
+    assert set(results.values()) == {None}
+    # resolutions timing out or failing for now say nothing of the device
+    assert cache.get(('hanging', up)) == (False, None)
+    assert cache.get(('flaky', up)) == (False, None)
+    assert cache.get(('r4', up)) == (True, None)
+
+
+def test_probe_concurrency():
+    with patch('resource.getrlimit', return_value=(1024, 4096)):
+        assert probe_concurrency(1000) == 512
+        assert probe_concurrency(100) == 100
@@ -0,0 +1,157 @@
+import json
+from functools import partial
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from kopimiko.comm import TransferCommand
+from kopimiko.file_transfer import ProtoTransferParam, SimpleTransferSpec
+from kopimiko.platforms import PlatformHandler
+from kopimiko.recording import (
+    ReplayChannel, ReplayError, SessionRecorder, load_recording,
+    record_session, recording_header, replay_connection
+)
+from kopimiko.utils.logs import secret_keeper
+
+dialogue = {
+    '': '',
+    'show version': 'Cisco IOS Software, Version 15.2',
+    'copy running-config scp:': 'Password:',
+    'Gz4-replayed-Pk9': '1234 bytes copied',
+}
+
+
+def test_record_and_replay(connection, tmp_path):
+    path = str(tmp_path / 'r1.jsonl')
+    secret_keeper.add_secret('Gz4-replayed-Pk9')
+    try:
+        with connection(dialogue) as ch:
+            recorder = record_session(ch, path)
+            recorded = [
+                ch.send_command('show version'),
+                ch.send_command_timing('copy running-config scp:'),
+                ch.send_command_timing('Gz4-replayed-Pk9'),
+            ]
+            recorder.close()
+        with open(path) as f:
+            assert 'Gz4-replayed-Pk9' not in f.read()
+
+        replay = replay_connection(
+            path, speed=0, device_type='cisco_ios', global_cmd_verify=False)
+        assert replay.send_command('show version') == recorded[0]
+        assert replay.send_command_timing(
+            'copy running-config scp:', last_read=0.1) == recorded[1]
+        assert replay.send_command_timing(
+            'Gz4-replayed-Pk9', last_read=0.1) == recorded[2]
+        with pytest.raises(ReplayError, match='recording ended'):
+            replay.write_channel('show clock\n')
+    finally:
+        secret_keeper.remove_secret('Gz4-replayed-Pk9')
+
+
+def test_replay_channel_timing(tmp_path):
+    now = [0.0]
+    events = [
+        {'t': 1.0, 'op': 'write', 'data': 'show version\n'},
+        {'t': 3.0, 'op': 'read', 'data': 'Version 15.2\n'},
+        {'t': 3.5, 'op': 'read', 'data': 'r1#'},
+    ]
+    channel = ReplayChannel(json.loads(json.dumps(events)), speed=2.0,
+                            clock=lambda: now[0])
+    with pytest.raises(ReplayError, match='recorded'):
+        channel.write_channel('show clock\n')
+    channel = ReplayChannel(events, speed=2.0, clock=lambda: now[0])
+    now[0] = 10.0
+    channel.write_channel('show version\n')
+    assert channel.read_channel() == ''
+    now[0] = 11.0
+    assert channel.read_channel() == 'Version 15.2\n'
+    now[0] = 11.25
+    assert channel.read_channel() == 'r1#'
+
+
+def test_handler_records_and_replays(connection, tmp_path):
+    with connection(dialogue) as ch:
+        ph = PlatformHandler(record_dir=str(tmp_path), host='r1')
+        with patch('netmiko.ConnectHandler', return_value=ch):
+            assert ph.send_command('show version') == dialogue['show version']
+    path, = tmp_path.iterdir()
+    assert path.name.startswith('r1-')
+    ph = PlatformHandler(
+        replay=str(path), replay_speed=0, device_type='cisco_ios',
+        global_cmd_verify=False)
+    assert ph.send_command('show version') == dialogue['show version']
+
+
+class ScpDialogue(dict):
+    """ device copying its configuration into the current directory """
+    def get(self, line, default=None):
+        if line.startswith('copy running-config scp://localhost/'):
+            Path(line.rpartition('/')[2]).write_text('hostname r1\n')
+            return '1234 bytes copied'
+        return super().get(line, default)
+
+
+class TransferHandler(PlatformHandler):
+    cmd = TransferCommand(
+        command='copy running-config scp://{dst_ip}/{dst_file}', proto='scp')
+
+    def transfer_methods(self, fti):
+        return partial(self.command_transfer, cmd=self.cmd),
+
+
+def test_handler_replays_transfer(connection, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sts = SimpleTransferSpec({'scp': ProtoTransferParam(dst_ip='localhost')})
+    with connection(ScpDialogue()) as ch:
+        ph = TransferHandler(
+            record_dir='recorded', host='r1', proto_transfer_spec=sts)
+        with patch('netmiko.ConnectHandler', return_value=ch):
+            with ph.collect(names=()) as bundle:
+                dst_file = bundle.files['running']
+    path, = (tmp_path / 'recorded').iterdir()
+    assert recording_header(str(path))['dst_file'] == dst_file
+
+    # a destination of its own would not be the one the recording names
+    ph = TransferHandler(
+        replay=str(path), replay_speed=0, device_type='cisco_ios', host='r1',
+        global_cmd_verify=False, proto_transfer_spec=sts)
+    # the copy, replayed, only claims to have been made
+    Path(dst_file).write_text('hostname r1\n')
+    with patch('time.sleep', float), ph.collect(names=()) as bundle:
+        assert bundle.files == {'running': dst_file}
+        assert bundle.transfer_method == 'scp'
+
+
+def test_recorder_redacts_by_line(tmp_path):
+    from kopimiko.platforms._cisco_base import redactor
+
+    path = tmp_path / 'r1.jsonl'
+    recorder = SessionRecorder(str(path), redactor, host='r1')
+    recorder.record('write', 'show running-config\n')
+    # the community spans two reads
+    for data in ('hostname r1\nsnmp-server commu', 'nity Qm7-recorded-Vb2 RO\n', 'r1#'):
+        recorder.record('read', data)
+    recorder.record('write', 'exit\n')
+    recorder.close()
+    _, events = load_recording(str(path))
+    assert 'Qm7-recorded-Vb2' not in path.read_text()
+    assert [(e['op'], e['data']) for e in events] == [
+        ('write', 'show running-config\n'),
+        ('read', 'hostname r1\n'),
+        ('read', 'snmp-server community <removed> RO\n'),
+        ('read', 'r1#'),
+        ('write', 'exit\n'),
+    ]
+
+
+def test_replay_reconnect_fails(tmp_path):
+    path = tmp_path / 'r1.jsonl'
+    path.write_text('{"host": "r1", "device_type": "cisco_ios"}\n')
+    ph = PlatformHandler(replay=str(path), replay_speed=0, host='r1')
+    ch = ph.get_ssh_handler()
+    with patch.object(type(ch), '_open') as open_session:
+        with pytest.raises(ReplayError, match='reconnect'):
+            ph.reconnect(ch)
+    open_session.assert_not_called()
@@ -0,0 +1,52 @@
+import pytest
+
+from kopimiko.platforms._cisco_base import redactor as cisco_redactor
+from kopimiko.platforms.juniper_junos import redactor as junos_redactor
+from kopimiko.redact import RedactionRule, Redactor
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('enable secret 5 $1$abc', 'enable secret 5 <removed>'),
+    ('username ops privilege 15 secret 9 $9$x', 'username ops privilege 15 secret 9 <removed>'),
+    (' password 7 0822455D0A16', ' password 7 <removed>'),
+    ('snmp-server community public RO', 'snmp-server community <removed> RO'),
+    ('tacacs-server host 10.0.0.1 key 7 0822', 'tacacs-server host 10.0.0.1 key 7 <removed>'),
+    (' key 1', ' key 1'),
+    ('key chain OSPF', 'key chain OSPF'),
+    (' description password reset', ' description password reset'),
+    (' neighbor 10.0.0.2 password 7 0822455D0A16', ' neighbor 10.0.0.2 password 7 <removed>'),
+    (' neighbor PEERS password s3cret', ' neighbor PEERS password <removed>'),
+    ('  password encrypted 0822455D0A16', '  password encrypted <removed>'),
+    (' ip ospf message-digest-key 1 md5 7 0822455D0A16', ' ip ospf message-digest-key 1 md5 7 <removed>'),
+    (' ip ospf message-digest-key 2 md5 s3cret', ' ip ospf message-digest-key 2 md5 <removed>'),
+    (' ip ospf authentication-key 7 0822455D0A16', ' ip ospf authentication-key 7 <removed>'),
+    ('snmp-server user u1 g1 v3 auth sha Auth-Pass priv aes 128 Priv-Pass',
+     'snmp-server user u1 g1 v3 auth sha <removed> priv aes 128 <removed>'),
+    ('snmp-server user u2 g1 v3 auth md5 Auth-Pass priv des Priv-Pass',
+     'snmp-server user u2 g1 v3 auth md5 <removed> priv des <removed>'),
+    ('snmp-server user admin network-admin auth md5 0x1f2e priv 0x3d4c localizedkey',
+     'snmp-server user admin network-admin auth md5 <removed> priv <removed> localizedkey'),
+])
+def test_cisco_rules(line, expected):
+    assert cisco_redactor.redact_line(line) == expected
+
+
+def test_junos_rules():
+    line = '    encrypted-password "$6$abc"; ## SECRET-DATA\n'
+    expected = '    encrypted-password "<removed>"; ## SECRET-DATA\n'
+    assert junos_redactor.redact_line(line) == expected
+
+
+@pytest.mark.parametrize('keywords', [('community',), ()])
+def test_redactor_copy_file(tmp_path, keywords):
+    redactor = Redactor([
+        RedactionRule(r'(\s*snmp-server community) \S+', keywords=keywords)])
+    redactor.block_size = 16
+    source, dest = tmp_path / 'source', tmp_path / 'dest'
+    source.write_bytes(
+        b'hostname r1\r\nsnmp-server community public RO\r\n'
+        b'banner \xff\r\nsnmp-server community private RW')
+    assert redactor.copy_file(source, dest) == 2
+    assert dest.read_bytes() == (
+        b'hostname r1\r\nsnmp-server community <removed> RO\r\n'
+        b'banner \xff\r\nsnmp-server community <removed> RW')
@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+
+from kopimiko.report import RunReport, error_class
+from kopimiko.runner import BackupResult
+
+
+def results():
+    for n in range(20):
+        ok = n % 4 != 0
+        yield BackupResult(
+            host=f"r{n}", platform='cisco_ios' if n < 10 else 'cisco_xr',
+            ok=ok, method=('scp' if n % 2 else 'scrape') if ok else None,
+            size=1000 + n if ok else 0, duration=float(n),
+            error=None if ok else 'ReadTimeout: Pattern not detected')
+
+
+def test_run_report():
+    report = RunReport()
+    for result in results():
+        report.add(result)
+    assert len(report) == 20
+    assert report.success_rate() == {'cisco_ios': 0.7, 'cisco_xr': 0.8}
+    assert report.percentile(95, by='method') == {
+        'scrape': 18.0, 'scp': 19.0, None: 16.0}
+    assert report.percentile(50, by='platform') == {
+        'cisco_ios': 4.0, 'cisco_xr': 14.0}
+    assert report.tables['error_class'].strings == [None, 'ReadTimeout']
+
+    stream = io.StringIO()
+    report.write_csv(stream)
+    rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+    assert rows[0] == {
+        'host': 'r0', 'platform': 'cisco_ios', 'ok': 'False',
+        'unchanged': 'False', 'method': '', 'size': '0', 'duration': '0.0',
+        'error_class': 'ReadTimeout'}
+    stream = io.StringIO()
+    report.write_jsonl(stream)
+    row = json.loads(stream.getvalue().splitlines()[1])
+    assert row['method'] == 'scp' and row['size'] == 1001 and row['ok']
+
+
+def test_error_class():
+    assert error_class(None) is None
+    assert error_class('OSError: cannot login') == 'OSError'
+    assert error_class('could not obtain configuration') == 'Error'
@@ -0,0 +1,201 @@
+import os
+import shutil
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from kopimiko.platforms import ArtifactBundle, PlatformHandler
+from kopimiko.runner import backup_device, run_backups, store_file
+from kopimiko.utils.logs import secret_keeper
+
+
+class MockHandler(PlatformHandler):
+    @contextmanager
+    def collect(self, names=None):
+        if self.netmiko_kw['host'] == 'down':
+            raise OSError(f"cannot login with {self.netmiko_kw['password']}")
+        # retrieved anew and removed on leaving, as collect does
+        source = self.netmiko_kw['config_file']
+        config_file = shutil.copyfile(source, f"{source}.{self.host}")
+        files = {'running': config_file}
+        files.update((name, config_file) for name in names or ())
+        try:
+            yield ArtifactBundle(files=files, transfer_method='scrape')
+        finally:
+            os.unlink(config_file)
+
+
+def test_backup_device(tmp_path):
+    config_file = tmp_path / 'retrieved'
+    config_file.write_text('hostname r1\n')
+    out = tmp_path / 'out'
+    out.mkdir()
+    spec = dict(host='r1', device_type='cisco_ios', config_file=config_file)
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler) as gphc:
+        result = backup_device(spec, str(out), timeout=5, diff=True)
+    gphc.assert_called_with('cisco_ios')
+    assert result.ok and result.method == 'scrape'
+    assert result.diff is None
+    assert (out / 'r1.cfg').read_text() == 'hostname r1\n'
+
+    config_file.write_text('hostname r2\n')
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler):
+        result = backup_device(spec, str(out), diff=True)
+    assert (result.diff.added, result.diff.removed) == (1, 1)
+
+
+def test_backup_device_artifacts(tmp_path):
+    config_file = tmp_path / 'retrieved'
+    config_file.write_text('hostname r1\n')
+    spec = dict(host='r1', config_file=config_file)
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler):
+        result = backup_device(spec, str(tmp_path), artifacts=['version'])
+    assert result.path == str(tmp_path / 'r1.cfg')
+    assert result.artifacts == {'version': str(tmp_path / 'r1.version.txt')}
+    assert (tmp_path / 'r1.version.txt').read_text() == 'hostname r1\n'
+
+
+def test_store_file_link(tmp_path):
+    local_file = tmp_path / 'retrieved'
+    local_file.write_text('hostname r1\n')
+    target = tmp_path / 'r1.cfg'
+    target.write_text('hostname r0\n')
+    store_file(str(local_file), str(target), link=True)
+    assert os.path.samefile(local_file, target)
+    local_file.unlink()
+    assert target.read_text() == 'hostname r1\n'
+
+    # copied unless asked to link, or when linked elsewhere
+    local_file.write_text('hostname r2\n')
+    store_file(str(local_file), str(target))
+    assert not os.path.samefile(local_file, target)
+    os.link(local_file, tmp_path / 'other')
+    store_file(str(local_file), str(target), link=True)
+    assert not os.path.samefile(local_file, target)
+    assert target.read_text() == 'hostname r2\n'
+
+
+def test_backup_device_failure(tmp_path):
+    spec = dict(host='down', platform='cisco_xr', password='Sup3rS3cret')
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler):
+        result = backup_device(spec, str(tmp_path))
+    assert not result.ok
+    assert result.platform == 'cisco_xr'
+    assert result.error == 'OSError: cannot login with Su*******et'
+    assert secret_keeper.filter_string('Sup3rS3cret') == 'Sup3rS3cret'
+
+
+def test_backup_device_bastion_secret(tmp_path):
+    spec = dict(
+        host='down', platform='cisco_xr', password='Hn6-device-Lp2',
+        bastion=dict(host='jump', password='Bq3-bastion-Mv8'),
+    )
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler):
+        for _ in range(2):
+            result = backup_device(spec, str(tmp_path))
+            assert result.error == 'OSError: cannot login with Hn**********p2'
+    # obfuscated while the device is backed up only
+    for secret in ('Hn6-device-Lp2', 'Bq3-bastion-Mv8'):
+        assert secret_keeper.filter_string(secret) == secret
+
+
+def test_backup_device_log(tmp_path):
+    config_file = tmp_path / 'retrieved'
+    config_file.write_text('hostname r1\n')
+    specs = [
+        dict(host='r1', config_file=config_file),
+        dict(host='down', password='Hn3-device-Lx6'),
+    ]
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler):
+        ok, failed = (
+            backup_device(spec, str(tmp_path), capture_log=10)
+            for spec in specs)
+        kept = backup_device(specs[0], str(tmp_path), capture_log=10,
+                             keep_log=True)
+    assert ok.ok and ok.log is None
+    assert kept.log == []
+    assert failed.log[-1].endswith(
+        'backup of down failed: OSError: cannot login with Hn**********x6')
+
+
+def test_backup_device_resolves_credentials(tmp_path, monkeypatch):
+    monkeypatch.setenv('KOPIMIKO_TEST_PWD', 'Sup3rS3cret')
+    spec = dict(host='down', password='env:KOPIMIKO_TEST_PWD')
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler):
+        result = backup_device(spec, str(tmp_path))
+    assert result.error == 'OSError: cannot login with Su*******et'
+    assert spec['password'] == 'env:KOPIMIKO_TEST_PWD'
+
+
+def test_run_backups(tmp_path):
+    config_file = tmp_path / 'retrieved'
+    config_file.write_text('hostname r1\n')
+    specs = [
+        dict(host=f"r{n}", config_file=config_file) for n in range(25)
+    ] + [dict(host='down')]
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=MockHandler):
+        results = list(run_backups(iter(specs), jobs=3, output_dir=tmp_path))
+    assert len(results) == 26
+    assert sum(r.ok for r in results) == 25
+
+
+def test_run_backups_preflight(tmp_path):
+    config_file = tmp_path / 'retrieved'
+    config_file.write_text('hostname r1\n')
+    specs = [
+        dict(host=f"r{n}", config_file=config_file) for n in range(5)
+    ] + [dict(host='down', platform='cisco_xr')]
+
+    def probe_specs(specs, timeout, cache):
+        for spec in specs:
+            yield spec, 'down:22 ConnectionRefusedError' if spec['host'] == 'down' else None
+
+    with (
+        patch('kopimiko.runner.get_platform_handler_class',
+              return_value=MockHandler) as gphc,
+        patch('kopimiko.runner.probe_specs', probe_specs),
+    ):
+        results = list(run_backups(
+            iter(specs), jobs=2, output_dir=tmp_path, preflight=1))
+    assert sum(r.ok for r in results) == 5
+    down, = (r for r in results if not r.ok)
+    assert (down.host, down.platform) == ('down', 'cisco_xr')
+    assert down.error == 'UnreachableError: down:22 ConnectionRefusedError'
+    assert gphc.call_count == 5
+
+
+class FingerprintHandler(MockHandler):
+    @contextmanager
+    def collect(self, names=None):
+        if self.fingerprints.get(self.host) == 'fp':
+            yield ArtifactBundle(fingerprint='fp', unchanged=True)
+            return
+        with super().collect(names) as bundle:
+            bundle.fingerprint = 'fp'
+            yield bundle
+        self.fingerprints[self.host] = 'fp'
+
+
+def test_backup_device_unchanged(tmp_path):
+    config_file = tmp_path / 'retrieved'
+    config_file.write_text('hostname r1\n')
+    spec = dict(host='r1', config_file=config_file)
+    fingerprints = {}
+    with patch('kopimiko.runner.get_platform_handler_class',
+               return_value=FingerprintHandler):
+        first = backup_device(spec, str(tmp_path), fingerprints=fingerprints)
+        second = backup_device(spec, str(tmp_path), fingerprints=fingerprints)
+        (tmp_path / 'r1.cfg').unlink()
+        third = backup_device(spec, str(tmp_path), fingerprints=fingerprints)
+    assert (first.ok, first.unchanged, first.method) == (True, False, 'scrape')
+    assert (second.ok, second.unchanged) == (True, True)
+    assert second.path == str(tmp_path / 'r1.cfg')
+    assert not third.unchanged
+    assert (tmp_path / 'r1.cfg').read_text() == 'hostname r1\n'